@@ -0,0 +1,202 @@
+# src/kg/bench/fixtures.py
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+import csv
+import random
+import re
+
+import yaml
+
+# Mundo sintético determinista para los benchmarks: responde las mismas formas de
+# consulta que emite el pipeline (truthy, filtro por país, hechos de lugares, etiquetas,
+# muestreo por ocupación) sin tablas grandes: los hechos de cada entidad se derivan
+# de su número de QID.
+
+ENT = "http://www.wikidata.org/entity/"
+WDT = "http://www.wikidata.org/prop/direct/"
+
+SUBJECT_BASE = 10_000_000
+PLACE_BASE = 2_000_000      # lugares (ciudades): P131 → región
+REGION_BASE = 2_100_000     # regiones: P131 → estado
+STATE_BASE = 2_200_000      # estados: P17 → país
+ORG_BASE = 3_000_000        # organizaciones: P159 (sede) → lugar; algunas con P17
+MISC_BASE = 4_000_000       # premios, obras, etc. (sin país)
+
+N_PLACES, N_REGIONS, N_STATES, N_ORGS, N_MISC = 5000, 200, 20, 3000, 2000
+COUNTRIES = ("Q30", "Q183", "Q142", "Q414")
+
+_VALUES_RE = re.compile(r"VALUES \?(\w+) \{([^}]*)\}")
+
+
+def _num(x: str) -> int:
+    return int(x.rsplit(":", 1)[-1].rsplit("/", 1)[-1][1:])
+
+
+def _load_occupations(classes_yml: Path | None) -> dict[str, list[str]]:
+    if classes_yml is None:
+        from kg.pipeline.sample_subjects import CFG_CLASSES
+        classes_yml = CFG_CLASSES
+    data = yaml.safe_load(Path(classes_yml).read_text(encoding="utf-8")) or {}
+    clases = data.get("clases") or data.get("classes") or {}
+    return {k: list(m.get("ocupaciones") or m.get("occupations") or []) for k, m in clases.items()}
+
+
+class SyntheticWorld:
+    """
+    Grafo sintético con `n_subjects` personas (Q10000000…), lugares con jerarquía P131
+    de 3 niveles hasta el país, organizaciones con sede y entidades varias.
+    Todas las respuestas son deterministas para una misma semilla.
+    """
+
+    def __init__(self, n_subjects: int = 1000, seed: int = 0, classes_yml: Path | None = None,
+                 wiki_lang: str = "es", missing_label_every: int = 7):
+        self.n_subjects = n_subjects
+        self.seed = seed
+        self.wiki_lang = wiki_lang
+        self.missing_label_every = missing_label_every
+        self.classes = _load_occupations(classes_yml)
+        self.occupations = sorted({o for occs in self.classes.values() for o in occs}, key=_num)
+
+    # ---- hechos ----
+    def subjects(self) -> list[str]:
+        return [f"Q{SUBJECT_BASE + i}" for i in range(self.n_subjects)]
+
+    def subject_class(self, qid: str) -> str:
+        keys = list(self.classes)
+        return keys[_num(qid) % len(keys)]
+
+    @lru_cache(maxsize=200_000)
+    def facts(self, n: int) -> dict[int, tuple[int, ...]]:
+        """Aristas truthy de la entidad Q`n`: {propiedad: (objetos...)}."""
+        if SUBJECT_BASE <= n < SUBJECT_BASE + self.n_subjects:
+            r = random.Random(self.seed * 1_000_003 + n)
+            occs = self.classes[self.subject_class(f"Q{n}")] or self.occupations
+            country = 30 if r.random() < 0.7 else _num(r.choice(COUNTRIES[1:]))
+            out = {
+                31: (5,),
+                27: (country,),
+                106: tuple(sorted({_num(r.choice(occs)) for _ in range(r.randint(1, 2))})),
+                19: (PLACE_BASE + r.randrange(N_PLACES),),
+                20: (PLACE_BASE + r.randrange(N_PLACES),),
+                69: tuple(sorted({ORG_BASE + r.randrange(N_ORGS) for _ in range(r.randint(0, 3))})),
+                108: tuple(sorted({ORG_BASE + r.randrange(N_ORGS) for _ in range(r.randint(0, 4))})),
+                166: tuple(sorted({MISC_BASE + r.randrange(N_MISC) for _ in range(r.randint(0, 6))})),
+                800: tuple(sorted({MISC_BASE + r.randrange(N_MISC) for _ in range(r.randint(0, 5))})),
+            }
+            return {p: o for p, o in out.items() if o}
+        if PLACE_BASE <= n < PLACE_BASE + N_PLACES:
+            return {31: (515,), 131: (REGION_BASE + (n - PLACE_BASE) % N_REGIONS,)}
+        if REGION_BASE <= n < REGION_BASE + N_REGIONS:
+            return {31: (10864048,), 131: (STATE_BASE + (n - REGION_BASE) % N_STATES,)}
+        if STATE_BASE <= n < STATE_BASE + N_STATES:
+            return {31: (107390,), 17: (_num(COUNTRIES[(n - STATE_BASE) % len(COUNTRIES)]),)}
+        if ORG_BASE <= n < ORG_BASE + N_ORGS:
+            k = n - ORG_BASE
+            out = {31: (43229,), 159: (PLACE_BASE + (k * 7) % N_PLACES,)}
+            if k % 5 == 0:
+                out[17] = (_num(COUNTRIES[k % len(COUNTRIES)]),)
+            if k % 3 == 0:
+                out[276] = (PLACE_BASE + (k * 11) % N_PLACES,)
+            return out
+        return {}
+
+    def targets(self, n: int, p: int) -> tuple[int, ...]:
+        return self.facts(n).get(p, ())
+
+    @lru_cache(maxsize=200_000)
+    def _place_country(self, n: int) -> frozenset[int]:
+        """Países a los que pertenece un lugar (P17 directo o por la cadena P131)."""
+        out = set(self.targets(n, 17))
+        for a in self.targets(n, 131):
+            out |= self._place_country(a)
+        return frozenset(out)
+
+    def in_country(self, n: int, country: int, passes: tuple[int, ...] = (1, 2, 3)) -> bool:
+        if 1 in passes and (country in self.targets(n, 27) or country in self.targets(n, 17)):
+            return True
+        if 2 in passes and any(country in self._place_country(a) for a in self.targets(n, 131)):
+            return True
+        if 3 in passes:
+            return any(country in self._place_country(x)
+                       for p in (159, 276) for x in self.targets(n, p))
+        return False
+
+    def label(self, x: str, lang: str) -> str | None:
+        n = _num(x)
+        if self.missing_label_every and n % self.missing_label_every == 0 and lang != "en":
+            return None
+        return f"{x} [{lang}]"
+
+    @lru_cache(maxsize=None)
+    def _people(self, occ: int, country: int) -> tuple[str, ...]:
+        iris = [ENT + q for q in self.subjects()
+                if occ in self.targets(_num(q), 106) and country in self.targets(_num(q), 27)]
+        return tuple(sorted(iris))
+
+    def write_subjects_csv(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["qid", "wiki_title", "clase"])
+            for q in self.subjects():
+                w.writerow([q, f"Persona_{q}", self.subject_class(q)])
+        return path
+
+    # ---- respuestas SPARQL ----
+    def answer(self, query: str) -> dict | None:
+        """JSON SPARQL para una consulta del pipeline, o None si la forma no se reconoce."""
+        values = {m.group(1): m.group(2).split() for m in _VALUES_RE.finditer(query)}
+        head = query[query.index("SELECT"):query.index("WHERE")] if "SELECT" in query and "WHERE" in query else ""
+        rows: list[dict] = []
+
+        if "?s ?p ?o" in head:                                # truthy por lotes
+            for s in values.get("s", []):
+                for p, os_ in sorted(self.facts(_num(s)).items()):
+                    rows += [{"s": {"value": ENT + s.split(":")[1]}, "p": {"value": f"{WDT}P{p}"},
+                              "o": {"value": f"{ENT}Q{o}"}} for o in os_]
+        elif "?p ?o" in head:                                 # truthy de un sujeto
+            s = values.get("s", [""])[0]
+            for p, os_ in sorted(self.facts(_num(s)).items()):
+                rows += [{"p": {"value": f"{WDT}P{p}"}, "o": {"value": f"{ENT}Q{o}"}} for o in os_]
+        elif "?country" in head:                              # pasada 1 con varios países
+            countries = values.get("country", [])
+            for o in values.get("o", []):
+                for c in countries:
+                    if self.in_country(_num(o), _num(c), (1,)):
+                        rows.append({"o": {"value": ENT + o.split(":")[1]},
+                                     "country": {"value": ENT + c.split(":")[1]}})
+        elif "DISTINCT ?o" in head:                           # pasadas de filter_by_country
+            m = re.search(r"wd:(Q\d+) \.", query)
+            country = _num(m.group(1)) if m else 30
+            passes = (3,) if "wdt:P159" in query else (2,) if "wdt:P131" in query else (1,)
+            for o in values.get("o", []):
+                if self.in_country(_num(o), country, passes):
+                    rows.append({"o": {"value": ENT + o.split(":")[1]}})
+        elif "?x ?p ?y" in head:                              # hechos de lugares
+            props = [_num(p) for p in values.get("p", [])]
+            for x in values.get("x", []):
+                for p in props:
+                    rows += [{"x": {"value": ENT + x.split(":")[1]}, "p": {"value": f"{WDT}P{p}"},
+                              "y": {"value": f"{ENT}Q{y}"}} for y in self.targets(_num(x), p)]
+        elif "?x ?l" in head:                                 # etiquetas
+            langs = re.findall(r'"([\w-]+)"', query.split("LANG(?l)")[-1])
+            for x in values.get("x", []):
+                for lang in langs:
+                    lab = self.label(x.split(":")[1], lang)
+                    if lab is not None:
+                        rows.append({"x": {"value": ENT + x.split(":")[1]},
+                                     "l": {"type": "literal", "value": lab, "xml:lang": lang}})
+        elif "?person ?article" in head:                      # muestreo por ocupación
+            occ = _num(re.search(r"wdt:P106 wd:(Q\d+)", query).group(1))
+            country = _num(re.search(r"wdt:P27 wd:(Q\d+)", query).group(1))
+            after = re.search(r'> "([^"]*)"', query).group(1)
+            limit = int(re.search(r"LIMIT (\d+)", query).group(1))
+            people = [p for p in self._people(occ, country) if p > after][:limit]
+            rows = [{"person": {"value": p},
+                     "article": {"value": f"https://{self.wiki_lang}.wikipedia.org/wiki/Persona_{p.rsplit('/', 1)[1]}"}}
+                    for p in people]
+        else:
+            return None
+        return {"head": {"vars": []}, "results": {"bindings": rows}}
@@ -0,0 +1,241 @@
+# src/kg/bench/runner.py
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from kg.bench.fixtures import SyntheticWorld
+from kg.bench.server import StandInServer
+
+# Benchmarks offline del pipeline contra el endpoint local (kg.bench.server).
+# Cada escenario corre en un subproceso con su propio HFKG_DATA_DIR vacío (cachés y
+# stores en frío) y HFKG_ENDPOINT apuntando al stand-in. Los resultados se escriben
+# como JSON para compararlos entre commits (--compare).
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+RESULTS_DIR = PROJECT_ROOT / "bench" / "results"
+
+SCENARIOS = ("truthy_edges", "truthy_edges_batch", "filter_by_country", "labels",
+             "sample_per_class", "build_degree1_graph", "run_wd")
+
+COUNTRY = "Q30"
+
+
+# --------------------------------------------------------------------------------------
+# Escenarios (se ejecutan en el subproceso; importan el pipeline ya con el entorno listo)
+# --------------------------------------------------------------------------------------
+def _objects(world: SyntheticWorld) -> list[str]:
+    objs = {f"Q{o}" for q in world.subjects() for os_ in world.facts(int(q[1:])).values() for o in os_}
+    return sorted(objs, key=lambda q: int(q[1:]))
+
+
+def _sc_truthy_edges(world, work: Path, extra: list[str]) -> int:
+    from kg.wd.truthy import truthy_edges
+    subs = world.subjects()[:200]      # una consulta por sujeto: se mide sobre una muestra
+    for q in subs:
+        truthy_edges(q)
+    return len(subs)
+
+
+def _sc_truthy_edges_batch(world, work: Path, extra: list[str]) -> int:
+    from kg.wd.truthy import truthy_edges_batch
+    return len(truthy_edges_batch(world.subjects()))
+
+
+def _sc_filter_by_country(world, work: Path, extra: list[str]) -> int:
+    from kg.wd.filter_country import filter_by_country
+    objs = _objects(world)
+    filter_by_country(objs, COUNTRY)
+    return len(objs)
+
+
+def _sc_labels(world, work: Path, extra: list[str]) -> int:
+    from kg.wd.utils import labels
+    objs = world.subjects() + _objects(world)
+    labels(objs, langs="es,en")
+    return len(objs)
+
+
+def _sc_sample_per_class(world, work: Path, extra: list[str]) -> int:
+    from kg.pipeline.sample_subjects import sample_per_class
+    limit = max(50, world.n_subjects // max(1, len(world.classes)))
+    counts = sample_per_class(COUNTRY, out_csv=work / "subjects.csv", limit_per_class=limit, resume=False)
+    return sum(counts.values())
+
+
+def _sc_build_degree1_graph(world, work: Path, extra: list[str]) -> int:
+    from kg.wd.build import build_degree1_graph, save_ttl
+    n = 0
+    for q in world.subjects():
+        edges = [(f"P{p}", f"Q{o}") for p, os_ in sorted(world.facts(int(q[1:])).items()) for o in os_]
+        labels = {x: world.label(x, "en") for x in [q] + [Q for _, Q in edges]}
+        save_ttl(build_degree1_graph(q, edges, labels), work / "ttl" / f"{q}.ttl")
+        n += 1
+    return n
+
+
+def _sc_run_wd(world, work: Path, extra: list[str]) -> int:
+    from kg.pipeline import run_wd
+    csv_path = world.write_subjects_csv(work / "subjects.csv")
+    argv = sys.argv
+    sys.argv = ["run_wd", "--country", COUNTRY, "--subjects-csv", str(csv_path),
+                "--out-dir", str(work / "graphs"), *extra]
+    try:
+        run_wd.main()
+    finally:
+        sys.argv = argv
+    return world.n_subjects
+
+
+def run_scenario(name: str, subjects: int, work: Path, seed: int = 0, extra: list[str] | None = None) -> dict:
+    """Ejecuta un escenario en este proceso y devuelve sus métricas locales."""
+    world = SyntheticWorld(subjects, seed=seed)
+    fn = globals()[f"_sc_{name}"]
+    r0 = resource.getrusage(resource.RUSAGE_SELF)
+    t0 = time.perf_counter()
+    items = fn(world, work, extra or [])
+    wall = time.perf_counter() - t0
+    r1 = resource.getrusage(resource.RUSAGE_SELF)
+    return {"items": items, "wall_s": round(wall, 4),
+            "items_per_s": round(items / wall, 2) if wall > 0 else None,
+            "cpu_s": round((r1.ru_utime - r0.ru_utime) + (r1.ru_stime - r0.ru_stime), 4),
+            "peak_rss_mb": round(r1.ru_maxrss / 1024, 1)}
+
+
+# --------------------------------------------------------------------------------------
+# Orquestación
+# --------------------------------------------------------------------------------------
+def _git_commit() -> tuple[str | None, bool]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return rev, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def _spawn(name: str, subjects: int, url: str, seed: int, extra: list[str], keep: bool) -> dict:
+    src_dir = str(Path(__file__).resolve().parents[2])
+    with tempfile.TemporaryDirectory(prefix=f"hfkg-bench-{name}-") as tmp:
+        tmp = Path(tmp)
+        env = {**os.environ, "HFKG_ENDPOINT": url, "HFKG_DATA_DIR": str(tmp / "data"),
+               "PYTHONPATH": os.pathsep.join(filter(None, [src_dir, os.environ.get("PYTHONPATH")]))}
+        env.pop("HFKG_BACKEND", None)
+        out = tmp / "result.json"
+        cmd = [sys.executable, "-m", "kg.bench.runner", "--scenario", name, "--subjects", str(subjects),
+               "--seed", str(seed), "--work-dir", str(tmp), "--result-file", str(out), "--", *extra]
+        log = tmp / "stdout.log"
+        with log.open("w") as f:
+            proc = subprocess.run(cmd, env=env, stdout=f, stderr=subprocess.STDOUT)
+        if proc.returncode != 0 or not out.exists():
+            tail = log.read_text(errors="replace")[-2000:]
+            return {"error": f"exit {proc.returncode}", "log_tail": tail}
+        if keep:
+            dest = RESULTS_DIR / "work" / f"{name}-{subjects}"
+            dest.mkdir(parents=True, exist_ok=True)
+            (dest / "stdout.log").write_text(log.read_text(errors="replace"))
+        return json.loads(out.read_text())
+
+
+def run_suite(sizes: list[int], scenarios: list[str], server_kw: dict, seed: int = 0,
+              extra: list[str] | None = None, keep: bool = False) -> dict:
+    commit, dirty = _git_commit()
+    results = []
+    for n in sizes:
+        world = SyntheticWorld(n, seed=seed)
+        with StandInServer(world=world, seed=seed, **server_kw) as srv:
+            for name in scenarios:
+                srv.stats.reset()
+                print(f"[bench] {name} × {n:,} ...", flush=True)
+                local = _spawn(name, n, srv.url, seed, extra or [], keep)
+                rec = {"scenario": name, "subjects": n, **local, "server": srv.stats.snapshot()}
+                results.append(rec)
+                if "error" in local:
+                    print(f"  [error] {local['error']}\n{local['log_tail']}")
+                else:
+                    p95 = rec["server"]["latency_ms"]["p95"]
+                    print(f"  {local['items']:,} ítems en {local['wall_s']:.2f}s → {local['items_per_s']:,}/s"
+                          f" | requests={rec['server']['requests']} p95={'-' if p95 is None else f'{p95}ms'}")
+            config = srv.config()
+    return {"meta": {"commit": commit, "dirty": dirty, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "server": {k: v for k, v in config.items() if k != "synthetic_subjects"},
+                     "extra_args": extra or []},
+            "results": results}
+
+
+def compare(base_path: Path, new_path: Path) -> None:
+    """Tabla de diferencias (ítems/s y p95 del servidor) entre dos archivos de resultados."""
+    base, new = (json.loads(Path(p).read_text()) for p in (base_path, new_path))
+    key = lambda r: (r["scenario"], r["subjects"])
+    old = {key(r): r for r in base["results"]}
+    print(f"{'escenario':<22}{'sujetos':>9}{'base/s':>12}{'nuevo/s':>12}{'Δ':>9}{'req base':>10}{'req nuevo':>10}")
+    for r in new["results"]:
+        b = old.get(key(r))
+        if not b or "error" in r or "error" in b:
+            continue
+        delta = (r["items_per_s"] / b["items_per_s"] - 1) * 100 if b["items_per_s"] else float("nan")
+        print(f"{r['scenario']:<22}{r['subjects']:>9,}{b['items_per_s']:>12,.1f}{r['items_per_s']:>12,.1f}"
+              f"{delta:>+8.1f}%{b['server']['requests']:>10}{r['server']['requests']:>10}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks offline del pipeline contra un endpoint SPARQL local.")
+    ap.add_argument("--sizes", default="1000,10000", help="Sujetos sintéticos por corrida, separados por coma (ej. 1000,10000,100000).")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Escenarios a medir (default: todos: {','.join(SCENARIOS)}).")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="Latencia simulada por respuesta.")
+    ap.add_argument("--jitter-ms", type=float, default=10.0)
+    ap.add_argument("--p429", type=float, default=0.0, help="Probabilidad de 429 (Retry-After).")
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    ap.add_argument("--p-timeout", type=float, default=0.0, help="Probabilidad de timeout.")
+    ap.add_argument("--timeout-s", type=float, default=1.0, help="Espera antes de responder un timeout.")
+    ap.add_argument("--timeout-over", type=int, default=0, help="Timeout si un VALUES supera N valores (0 = nunca).")
+    ap.add_argument("--replay", help="Caché grabado a reproducir antes del mundo sintético (data/cache_wd/ o .sqlite).")
+    ap.add_argument("--out", help="Archivo JSON de resultados. Default: bench/results/<fecha>_<commit>.json")
+    ap.add_argument("--keep-logs", action="store_true", help="Guarda la salida de cada escenario en bench/results/work/.")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NUEVO"), help="Compara dos archivos de resultados y termina.")
+    # modo subproceso (interno)
+    ap.add_argument("--scenario", help=argparse.SUPPRESS)
+    ap.add_argument("--subjects", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--work-dir", help=argparse.SUPPRESS)
+    ap.add_argument("--result-file", help=argparse.SUPPRESS)
+    ap.add_argument("extra", nargs="*", help="Argumentos extra para run_wd (tras --), ej: -- --workers 4 --max-rps 0")
+    args = ap.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    if args.scenario:
+        res = run_scenario(args.scenario, args.subjects, Path(args.work_dir), seed=args.seed, extra=args.extra)
+        Path(args.result_file).write_text(json.dumps(res))
+        return
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"[error] Escenarios desconocidos: {sorted(unknown)}")
+    server_kw = dict(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, p429=args.p429,
+                     retry_after_s=args.retry_after, p_timeout=args.p_timeout, timeout_s=args.timeout_s,
+                     timeout_over=args.timeout_over, replay=args.replay)
+    report = run_suite(sizes, scenarios, server_kw, seed=args.seed, extra=args.extra, keep=args.keep_logs)
+
+    commit = report["meta"]["commit"] or "nocommit"
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n✅ Resultados: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# src/kg/bench/server.py
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+
+from kg.bench.fixtures import SyntheticWorld
+
+# Endpoint SPARQL local que imita a WDQS para medir el pipeline sin red:
+#   - reproduce respuestas grabadas (data/cache_wd/ o data/cache_wd.sqlite, por sha1 de la consulta normalizada)
+#   - o las genera con un mundo sintético (kg.bench.fixtures)
+#   - con latencia, 429 (Retry-After) y timeouts estilo WDQS (500 + TimeoutException) configurables.
+# GET /_stats devuelve contadores y percentiles de latencia; POST /_reset los reinicia.
+
+
+def _open_replay(path: Path | str):
+    from kg.wd.cache import FileCache, SQLiteCache
+    path = Path(path)
+    return FileCache(path, mem_items=0) if path.is_dir() else SQLiteCache(path, mem_items=0)
+
+
+class StandInStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.replayed = 0
+            self.synthetic = 0
+            self.unknown = 0
+            self.throttled = 0
+            self.timeouts = 0
+            self.bytes_out = 0
+            self.latencies_ms: list[float] = []
+
+    def add(self, kind: str, ms: float, nbytes: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            setattr(self, kind, getattr(self, kind) + 1)
+            self.bytes_out += nbytes
+            self.latencies_ms.append(ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lat = sorted(self.latencies_ms)
+            pct = (lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 2) if lat else None)
+            return {"requests": self.requests, "replayed": self.replayed, "synthetic": self.synthetic,
+                    "unknown": self.unknown, "throttled": self.throttled, "timeouts": self.timeouts,
+                    "bytes_out": self.bytes_out,
+                    "latency_ms": {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99),
+                                   "max": lat[-1] if lat else None}}
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Servidor HTTP multihilo con la interfaz de WDQS (GET ?query=… o POST form-urlencoded).
+
+    - world / replay: fuentes de respuestas (primero replay, luego el mundo sintético).
+    - latency_ms, jitter_ms: demora añadida a cada respuesta.
+    - p429: probabilidad de responder 429 con `Retry-After: retry_after_s`.
+    - p_timeout: probabilidad de "timeout" (espera `timeout_s` y responde 500 TimeoutException).
+    - timeout_over: consultas con más de N valores en VALUES siempre agotan el tiempo (0 = nunca).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, world: SyntheticWorld | None = None,
+                 replay: Path | str | None = None, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 p429: float = 0.0, retry_after_s: float = 1.0, p_timeout: float = 0.0,
+                 timeout_s: float = 1.0, timeout_over: int = 0, seed: int = 0):
+        super().__init__((host, port), _Handler)
+        self.world = world
+        self.replay = _open_replay(replay) if replay else None
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.p429 = p429
+        self.retry_after_s = retry_after_s
+        self.p_timeout = p_timeout
+        self.timeout_s = timeout_s
+        self.timeout_over = timeout_over
+        self.stats = StandInStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/sparql"
+
+    def config(self) -> dict:
+        return {"latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, "p429": self.p429,
+                "retry_after_s": self.retry_after_s, "p_timeout": self.p_timeout,
+                "timeout_s": self.timeout_s, "timeout_over": self.timeout_over,
+                "replay": bool(self.replay), "synthetic_subjects": self.world.n_subjects if self.world else 0}
+
+    def roll(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def start(self) -> "StandInServer":
+        """Sirve en un hilo de fondo (para usarlo desde el mismo proceso)."""
+        self._thread = threading.Thread(target=self.serve_forever, name="standin-sparql", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def respond(self, query: str) -> tuple[str, bytes | None]:
+        if self.replay is not None:
+            from kg.wd.utils import _cache_key
+            hit = self.replay.get(_cache_key(query)) or self.replay.get(hashlib.sha1(query.encode("utf-8")).hexdigest())
+            if hit is not None:
+                return "replayed", json.dumps(hit, separators=(",", ":")).encode("utf-8")
+        if self.world is not None:
+            res = self.world.answer(query)
+            if res is not None:
+                return "synthetic", json.dumps(res, separators=(",", ":")).encode("utf-8")
+        return "unknown", None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandInServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # silencioso
+        pass
+
+    def _send(self, code: int, body: bytes, ctype: str = "application/sparql-results+json",
+              headers: dict | None = None) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/_stats":
+            return self._send(200, json.dumps(self.server.stats.snapshot()).encode(), "application/json")
+        self._query(parse_qs(url.query).get("query", [""])[0])
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        n = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(n).decode("utf-8") if n else ""
+        if url.path == "/_reset":
+            self.server.stats.reset()
+            return self._send(200, b"{}", "application/json")
+        self._query(parse_qs(body).get("query", [""])[0])
+
+    def _query(self, query: str) -> None:
+        srv = self.server
+        t0 = time.perf_counter()
+        ms = lambda: (time.perf_counter() - t0) * 1000
+
+        if srv.p429 and srv.roll() < srv.p429:
+            srv.stats.add("throttled", ms())
+            return self._send(429, b"Too Many Requests", "text/plain",
+                              {"Retry-After": f"{srv.retry_after_s:g}"})
+
+        n_values = max((len(v.split()) for v in _values_blocks(query)), default=0)
+        if (srv.timeout_over and n_values > srv.timeout_over) or (srv.p_timeout and srv.roll() < srv.p_timeout):
+            time.sleep(srv.timeout_s)
+            srv.stats.add("timeouts", ms())
+            return self._send(500, b"java.util.concurrent.TimeoutException", "text/plain")
+
+        kind, body = srv.respond(query)
+        if srv.latency_ms or srv.jitter_ms:
+            time.sleep((srv.latency_ms + srv.roll() * srv.jitter_ms) / 1000)
+        if body is None:
+            srv.stats.add(kind, ms())
+            return self._send(400, b"stand-in: consulta no reconocida ni grabada", "text/plain")
+        srv.stats.add(kind, ms(), len(body))
+        self._send(200, body)
+
+
+def _values_blocks(query: str) -> list[str]:
+    out, i = [], query.find("VALUES")
+    while i != -1:
+        a, b = query.find("{", i), query.find("}", i)
+        if a == -1 or b == -1:
+            break
+        out.append(query[a + 1:b])
+        i = query.find("VALUES", b)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Endpoint SPARQL local (replay + sintético) para benchmarks.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8899)
+    ap.add_argument("--replay", help="Caché grabado a reproducir: data/cache_wd/ o data/cache_wd.sqlite.")
+    ap.add_argument("--subjects", type=int, default=1000, help="Sujetos del mundo sintético (0 = solo replay).")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--p429", type=float, default=0.0, help="Probabilidad de responder 429.")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After (s) de los 429.")
+    ap.add_argument("--p-timeout", type=float, default=0.0, help="Probabilidad de timeout.")
+    ap.add_argument("--timeout-s", type=float, default=1.0, help="Espera antes de responder un timeout.")
+    ap.add_argument("--timeout-over", type=int, default=0, help="Timeout si un VALUES supera N valores.")
+    args = ap.parse_args()
+
+    world = SyntheticWorld(args.subjects, seed=args.seed) if args.subjects else None
+    srv = StandInServer(args.host, args.port, world=world, replay=args.replay,
+                        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, p429=args.p429,
+                        retry_after_s=args.retry_after, p_timeout=args.p_timeout,
+                        timeout_s=args.timeout_s, timeout_over=args.timeout_over, seed=args.seed)
+    print(f"Stand-in SPARQL en {srv.url}  (HFKG_ENDPOINT={srv.url})")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    main()
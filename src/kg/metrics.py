@@ -0,0 +1,209 @@
+# src/kg/metrics.py
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+import bisect
+import json
+import os
+import threading
+import time
+
+# Métricas en proceso del pipeline (sin dependencias): contadores e histogramas con
+# etiquetas, exportables como reporte JSON y como textfile de Prometheus
+# (node_exporter --collector.textfile). Todas las series llevan el prefijo "hfkg_".
+
+PREFIX = "hfkg_"
+
+# buckets de latencia en segundos (como los de prometheus_client, extendidos hasta 2 min)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+HELP = {
+    "sparql_requests_total": "Consultas SPARQL enviadas al endpoint, por tipo y resultado (ok/timeout/throttled/error/rejected).",
+    "sparql_cache_total": "Búsquedas en el caché de consultas, por tipo (hit/miss).",
+    "sparql_retries_total": "Reintentos de consultas SPARQL, por tipo.",
+    "sparql_throttle_total": "Reducciones del ritmo de requests (AIMD), por señal (throttled/timeout).",
+    "sparql_breaker_open_total": "Aperturas del circuit breaker (endpoint dado por caído).",
+    "sparql_coalesced_total": "Consultas resueltas esperando una idéntica en vuelo, por tipo y alcance (thread/process).",
+    "entity_cache_total": "Entidades buscadas en el caché por entidad, por plantilla (hit/miss).",
+    "sparql_response_bytes_total": "Bytes de respuesta recibidos del endpoint, por tipo.",
+    "sparql_latency_seconds": "Latencia de red de las consultas SPARQL, por tipo.",
+    "stage_seconds": "Duración de cada etapa del pipeline.",
+    "subjects_total": "Sujetos procesados por estado.",
+    "output_bytes_total": "Bytes serializados, por formato.",
+    "expand_nodes_fetched_total": "Nodos cuyas aristas se descargaron en la expansión de grado k.",
+    "expand_edges_total": "Aristas emitidas por la expansión de grado k, por salto.",
+}
+
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.sum += v
+        self.count += 1
+        self.max = max(self.max, v)
+
+    def quantile(self, q: float) -> float | None:
+        """Cuantil aproximado (límite superior del bucket que lo contiene)."""
+        if not self.count:
+            return None
+        target, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class Registry:
+    """Contadores e histogramas etiquetados, thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+
+    def inc(self, name: str, n: float = 1, **labels) -> None:
+        k = _key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[k] = series.get(k, 0) + n
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        k = _key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            h = series.get(k)
+            if h is None:
+                h = series[k] = Histogram()
+            h.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.counters.clear()
+            self.histograms.clear()
+
+    # ---- entre procesos ----
+    def dump(self) -> tuple[list, list]:
+        """Series crudas (serializables con pickle) para sumarlas en otro proceso con `merge`."""
+        with self._lock:
+            counters = [(name, k, v) for name, s in self.counters.items() for k, v in s.items()]
+            hists = [(name, k, h.counts, h.sum, h.count, h.max)
+                     for name, s in self.histograms.items() for k, h in s.items()]
+        return counters, hists
+
+    def merge(self, dumped: tuple[list, list]) -> None:
+        """Suma las series de `dump()` de otro proceso (p. ej. un worker de run_wd)."""
+        counters, hists = dumped
+        with self._lock:
+            for name, k, v in counters:
+                series = self.counters.setdefault(name, {})
+                series[k] = series.get(k, 0) + v
+            for name, k, counts, total, n, mx in hists:
+                series = self.histograms.setdefault(name, {})
+                h = series.get(k)
+                if h is None:
+                    h = series[k] = Histogram()
+                h.counts = [a + b for a, b in zip(h.counts, counts)]
+                h.sum += total
+                h.count += n
+                h.max = max(h.max, mx)
+
+    # ---- exportación ----
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {name: [{"labels": dict(k), "value": v} for k, v in sorted(s.items())]
+                        for name, s in sorted(self.counters.items())}
+            hists = {name: [{"labels": dict(k), "count": h.count, "sum": round(h.sum, 6),
+                             "mean": round(h.sum / h.count, 6) if h.count else None,
+                             "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+                             "max": round(h.max, 6)}
+                            for k, h in sorted(s.items())]
+                     for name, s in sorted(self.histograms.items())}
+        return {"started": self.started, "elapsed_s": round(time.time() - self.started, 3),
+                "counters": counters, "histograms": hists}
+
+    def cache_summary(self) -> dict[str, dict]:
+        """Tasa de aciertos del caché por tipo de consulta."""
+        out: dict[str, dict] = {}
+        with self._lock:
+            for k, v in self.counters.get("sparql_cache_total", {}).items():
+                d = dict(k)
+                rec = out.setdefault(d.get("kind", "other"), {"hit": 0, "miss": 0})
+                rec[d.get("result", "miss")] += int(v)
+        for rec in out.values():
+            total = rec["hit"] + rec["miss"]
+            rec["hit_rate"] = round(rec["hit"] / total, 4) if total else None
+        return out
+
+    def write_json(self, path: Path | str, extra: dict | None = None) -> Path:
+        data = {**(extra or {}), "metrics": self.snapshot(), "cache": self.cache_summary()}
+        return _atomic_write(Path(path), json.dumps(data, indent=2, ensure_ascii=False, default=str))
+
+    def prometheus_text(self) -> str:
+        lines: list[str] = []
+        fmt = lambda k: "{" + ",".join(f'{a}="{_esc(b)}"' for a, b in k) + "}" if k else ""
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                full = PREFIX + name
+                if name in HELP:
+                    lines.append(f"# HELP {full} {HELP[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for k, v in sorted(series.items()):
+                    lines.append(f"{full}{fmt(k)} {v:g}")
+            for name, series in sorted(self.histograms.items()):
+                full = PREFIX + name
+                if name in HELP:
+                    lines.append(f"# HELP {full} {HELP[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for k, h in sorted(series.items()):
+                    acc = 0
+                    for le, c in zip([*BUCKETS, "+Inf"], h.counts):
+                        acc += c
+                        lines.append(f"{full}_bucket{fmt(k + (('le', str(le)),))} {acc}")
+                    lines.append(f"{full}_sum{fmt(k)} {h.sum:.6f}")
+                    lines.append(f"{full}_count{fmt(k)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path | str) -> Path:
+        return _atomic_write(Path(path), self.prometheus_text())
+
+
+def _esc(s: str) -> str:
+    return s.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _atomic_write(path: Path, text: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+# registro del proceso
+METRICS = Registry()
+inc = METRICS.inc
+observe = METRICS.observe
+timer = METRICS.timer
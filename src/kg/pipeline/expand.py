@@ -0,0 +1,150 @@
+# src/kg/pipeline/expand.py
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import time
+
+from tqdm import tqdm
+
+from kg import metrics
+from kg.wd.expand import HUB_PROPS, KHopExpander
+from kg.wd.filter_country import filter_by_country
+from kg.wd.utils import labels, configure_budget
+from kg.wd.writer import StreamWriter, render_triples, subject_graph, write_graph
+from kg.wd.country import resolve_country_id, get_country_from_project
+from kg.wd.dump import DEFAULT_DUMP_DB, use_dump
+from kg.pipeline.run_wd import PROJECT_ROOT, _P_RE, _slugify, _write_reports, load_subjects
+
+# Vecindarios de grado k (2-3 saltos) de los sujetos de un país.
+# El primer salto es el mismo grafo grado-1 de run_wd (filtrado por país); los saltos
+# siguientes recorren las aristas truthy sin filtro, con topes por salto y sin seguir
+# propiedades "hub" (kg.wd.expand.HUB_PROPS).
+
+
+def _expand_window(expander: KHopExpander, rows: list[dict], country_qid: str | None) -> dict[str, list]:
+    roots = [r["qid"] for r in rows]
+    expander.fetch(roots)
+    seeds = {q: [(P, Q) for P, Q in expander.edges.get(q, []) if _P_RE.match(P)] for q in roots}
+    if country_qid:
+        # filtro por país del primer salto: una sola llamada para todos los objetos de la ventana
+        with metrics.timer("stage_seconds", stage="filter"):
+            ok = filter_by_country(list({Q for es in seeds.values() for _, Q in es}), country_qid)
+        seeds = {q: [(P, Q) for P, Q in es if Q in ok] for q, es in seeds.items()}
+    with metrics.timer("stage_seconds", stage="expand"):
+        return expander.expand(roots, seeds)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Vecindarios de grado k (BFS por lotes) desde Wikidata.")
+    ap.add_argument("--country", help="QID, ISO-2/3 o nombre del país (según config/countries.yml).")
+    ap.add_argument("--subjects-csv", help="Ruta al CSV de sujetos. Por defecto usa data/subjects_{country}.csv o data/subjects.csv.")
+    ap.add_argument("--out-dir", help="Directorio base de salida. Por defecto graphs/{country_slug}/")
+    ap.add_argument("--hops", type=int, default=2, help="Saltos desde cada sujeto (default: 2).")
+    ap.add_argument("--per", choices=["subject", "country"], default="subject",
+                    help="subject: un grafo por sujeto en k{hops}/; country: un único grafo para todo el país.")
+    ap.add_argument("--max-nodes-per-hop", type=int, default=500, help="Nodos nuevos por salto y sujeto (default: 500).")
+    ap.add_argument("--max-edges-per-hop", type=int, default=5000, help="Aristas por salto y sujeto (default: 5000).")
+    ap.add_argument("--max-degree", type=int, default=0, help="No expandir nodos con más aristas salientes (0 = sin límite).")
+    ap.add_argument("--exclude-props", help=f"Propiedades hub que no se siguen, separadas por coma (default: {','.join(sorted(HUB_PROPS))}).")
+    ap.add_argument("--no-country-filter", action="store_true", help="No filtrar por país el primer salto.")
+    ap.add_argument("--window", type=int, default=200, help="Sujetos expandidos juntos (comparten las consultas de cada nivel).")
+    ap.add_argument("--label-langs", default="es,en", help='Idiomas de etiquetas (prioridad); "" para omitir etiquetas.')
+    ap.add_argument("--format", choices=["ttl", "nt", "nq"], default="ttl", help="Formato de salida (nq: un grafo nombrado por sujeto, solo con --per country).")
+    ap.add_argument("--gzip", action="store_true", help="Comprime la salida con gzip (determinista).")
+    ap.add_argument("--max-inflight", type=int, default=5, help="Máximo de requests SPARQL simultáneas (default: 5).")
+    ap.add_argument("--max-rps", type=float, default=0.0,
+                    help="Techo de requests SPARQL por segundo (0 = sin techo: el ritmo se ajusta solo ante 429/503/timeouts).")
+    ap.add_argument("--backend", choices=["wdqs", "dump"], help="Origen de datos: WDQS (default) o volcado truthy local indexado.")
+    ap.add_argument("--dump-db", help="SQLite del volcado indexado (kg.wd.dump). Default: data/wd_dump.sqlite.")
+    args = ap.parse_args()
+
+    if args.format == "nq" and args.per != "country":
+        raise SystemExit("[error] --format nq requiere --per country.")
+    if args.backend == "dump":
+        use_dump(args.dump_db or DEFAULT_DUMP_DB)
+
+    if args.country:
+        try:
+            country_qid = resolve_country_id(args.country)
+        except Exception as e:
+            raise SystemExit(f"[error] No fue posible resolver el país '{args.country}': {e}")
+        country_slug = _slugify(args.country) if not args.country.upper().startswith("Q") else country_qid.lower()
+    else:
+        try:
+            country_name, country_qid = get_country_from_project()
+        except Exception as e:
+            raise SystemExit(f"[error] No fue posible leer el país desde config/project.yml: {e}")
+        country_slug = _slugify(country_name)
+    print(f"País objetivo: {country_qid} · {args.hops} saltos · salida por {args.per}")
+
+    if args.subjects_csv:
+        subjects_csv = Path(args.subjects_csv)
+    else:
+        preferred = PROJECT_ROOT / "data" / f"subjects_{country_slug}.csv"
+        subjects_csv = preferred if preferred.exists() else PROJECT_ROOT / "data" / "subjects.csv"
+    subs = load_subjects(subjects_csv)
+    if not subs:
+        raise SystemExit("[error] El CSV de sujetos está vacío.")
+
+    out_base = Path(args.out_dir) if args.out_dir else PROJECT_ROOT / "graphs" / country_slug
+    out_k = out_base / f"k{args.hops}"
+    ext = f".{args.format}" + (".gz" if args.gzip else "")
+
+    configure_budget(max_inflight=args.max_inflight, max_rps=args.max_rps)
+    exclude = [p.strip() for p in args.exclude_props.split(",") if p.strip()] if args.exclude_props is not None else None
+    expander = KHopExpander(args.hops, max_nodes_per_hop=args.max_nodes_per_hop,
+                            max_edges_per_hop=args.max_edges_per_hop, exclude_props=exclude,
+                            max_degree=args.max_degree)
+
+    writer = None
+    if args.per == "country" and args.format != "ttl":
+        writer = StreamWriter(out_base / f"{country_slug}_k{args.hops}{ext}", fmt=args.format, compress=args.gzip)
+    union: set[tuple[str, str, str]] = set()
+    union_labels: dict[str, str] = {}
+    counts = {"ok": 0, "empty": 0}
+    t_start = time.perf_counter()
+    pbar = tqdm(total=len(subs), desc=f"Expansión k={args.hops}")
+    try:
+        for w in range(0, len(subs), max(1, args.window)):
+            rows = subs[w:w + max(1, args.window)]
+            res = _expand_window(expander, rows, None if args.no_country_filter else country_qid)
+            lbl = {}
+            if args.label_langs:
+                nodes = list(dict.fromkeys(x for ts in res.values() for s, _, o in ts for x in (s, o)))
+                with metrics.timer("stage_seconds", stage="labels"):
+                    lbl = labels(nodes, langs=args.label_langs)
+            with metrics.timer("stage_seconds", stage="serialize"):
+                for r in rows:
+                    triples = res[r["qid"]]
+                    counts["ok" if triples else "empty"] += 1
+                    metrics.inc("subjects_total", status="ok" if triples else "empty")
+                    if not triples:
+                        continue
+                    if args.per == "subject":
+                        write_graph(out_k / f"{r['qid']}{ext}", triples, lbl, fmt=args.format, compress=args.gzip)
+                    elif writer:
+                        graph = subject_graph(r["qid"]) if args.format == "nq" else None
+                        writer.write_chunk(render_triples(triples, lbl, fmt=args.format, graph=graph))
+                    else:
+                        union.update(triples)
+                        union_labels.update(lbl)
+            pbar.update(len(rows))
+        if writer:
+            writer.close()
+        elif args.per == "country":
+            write_graph(out_base / f"{country_slug}_k{args.hops}{ext}", list(union), union_labels,
+                        fmt="ttl", compress=args.gzip)
+    except BaseException:
+        if writer:
+            writer.abort()
+        raise
+    finally:
+        pbar.close()
+        _write_reports(out_k, args, country_qid, counts, time.perf_counter() - t_start)
+
+    print(f"\nEstados: ok={counts['ok']}, empty={counts['empty']} · nodos visitados: {len(expander.edges):,}")
+    print(f"✅ Salida: {out_k if args.per == 'subject' else out_base / f'{country_slug}_k{args.hops}{ext}'}")
+
+
+if __name__ == "__main__":
+    main()
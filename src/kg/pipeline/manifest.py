@@ -0,0 +1,142 @@
+# src/kg/pipeline/manifest.py
+from __future__ import annotations
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import time
+
+# estados por sujeto
+OK = "ok"            # grafo escrito
+EMPTY = "empty"      # sin aristas (o ninguna en el país): no hay archivo que escribir
+FAILED = "failed"    # error; se reintenta con --retry-failed
+SKIPPED = "skipped"  # salida vigente según el manifiesto (no se guarda como estado)
+
+
+def input_hash(edges: list[tuple[str, str]], settings: dict) -> str:
+    """Huella de las entradas de un sujeto: aristas truthy + configuración relevante."""
+    h = hashlib.sha1()
+    h.update(json.dumps(settings, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for P, Q in sorted(set(edges)):
+        h.update(f"{P} {Q}\n".encode("ascii"))
+    return h.hexdigest()
+
+
+class RunManifest:
+    """
+    Manifiesto de una corrida de run_wd: estado, huella de entradas y salidas por sujeto.
+
+    Cada `record` agrega una línea JSON a un diario (`manifest.json.journal`), que se vuelca al
+    disco cada `flush_every` registros o `flush_s` segundos: el costo por sujeto no depende del
+    tamaño del manifiesto. `flush()` (al terminar la corrida) y la carga compactan el diario en
+    el JSON completo, con escritura atómica (archivo temporal + os.replace). Thread-safe.
+    Con `path=None` no hay archivo: lo usa un proceso de run_wd con los registros de `view()`.
+    """
+
+    def __init__(self, path: Path | str | None, flush_every: int = 50, flush_s: float = 10.0,
+                 subjects: dict[str, dict] | None = None):
+        self.path = Path(path) if path is not None else None
+        self.journal = self.path.with_name(self.path.name + ".journal") if self.path is not None else None
+        self.flush_every = flush_every
+        self.flush_s = flush_s
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._last_flush = time.monotonic()
+        self._fh = None
+        self.subjects: dict[str, dict] = dict(subjects or {})
+        self.changed: dict[str, dict] = {}   # registros nuevos (solo sin archivo)
+        if self.path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.subjects = data.get("subjects", {})
+        if self.journal.exists():
+            with self.journal.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        qid, rec = json.loads(line)
+                    except ValueError:
+                        break   # última línea a medio escribir (corrida interrumpida)
+                    self.subjects[qid] = rec
+            self._compact_locked()
+
+    # ---- consultas ----
+    def status(self, qid: str) -> str | None:
+        rec = self.subjects.get(qid)
+        return rec["status"] if rec else None
+
+    def is_current(self, qid: str, h: str) -> bool:
+        """True si el sujeto ya se procesó con las mismas entradas y sus salidas existen."""
+        rec = self.subjects.get(qid)
+        if not rec or rec.get("hash") != h or rec["status"] not in (OK, EMPTY):
+            return False
+        return all(Path(p).exists() for p in rec.get("outputs", []))
+
+    def failed(self) -> set[str]:
+        return {q for q, rec in self.subjects.items() if rec["status"] == FAILED}
+
+    def counts(self) -> dict[str, int]:
+        out: dict[str, int] = {}
+        for rec in self.subjects.values():
+            out[rec["status"]] = out.get(rec["status"], 0) + 1
+        return out
+
+    # ---- actualizaciones ----
+    def record(self, qid: str, status: str, h: str | None = None,
+               outputs: list[Path] | None = None, error: str | None = None) -> None:
+        rec = {"status": status, "hash": h, "outputs": [str(p) for p in outputs or []], "updated": time.time()}
+        if error:
+            rec["error"] = error
+        with self._lock:
+            self.subjects[qid] = rec
+            if self.path is None:
+                self.changed[qid] = rec
+                return
+            self._append_locked({qid: rec})
+
+    def view(self, qids) -> dict[str, dict]:
+        """Registros de `qids` para otro proceso: allí `RunManifest(None, subjects=...)`; de vuelta, `apply`."""
+        with self._lock:
+            return {q: self.subjects[q] for q in qids if q in self.subjects}
+
+    def apply(self, changed: dict[str, dict]) -> None:
+        """Incorpora los registros hechos en otro proceso (`.changed` de un manifiesto sin archivo)."""
+        with self._lock:
+            self.subjects.update(changed)
+            if self.path is not None:
+                self._append_locked(changed)
+
+    def flush(self) -> None:
+        """Compacta el diario en el JSON completo (al terminar la corrida)."""
+        if self.path is None:
+            return
+        with self._lock:
+            self._compact_locked()
+
+    def _append_locked(self, recs: dict[str, dict]) -> None:
+        if self._fh is None:
+            self.journal.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.journal.open("a", encoding="utf-8")
+        for qid, rec in recs.items():
+            self._fh.write(json.dumps([qid, rec], ensure_ascii=False) + "\n")
+        self._dirty += len(recs)
+        if self._dirty >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_s:
+            self._fh.flush()
+            self._dirty = 0
+            self._last_flush = time.monotonic()
+
+    def _compact_locked(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        data = {"version": 1, "updated": time.time(), "subjects": self.subjects}
+        tmp.write_text(json.dumps(data, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.journal.unlink(missing_ok=True)   # ya incluido en el JSON
+        self._dirty = 0
+        self._last_flush = time.monotonic()
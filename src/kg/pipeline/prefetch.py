@@ -0,0 +1,215 @@
+# src/kg/pipeline/prefetch.py
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import sys
+import time
+
+from tqdm import tqdm
+
+from kg import metrics
+from kg.wd.batching import save_batch_state
+from kg.wd.country import resolve_country_id, get_country_from_project
+from kg.wd.filter_country import filter_by_countries
+from kg.wd.label_store import get_label_store
+from kg.wd.truthy import TRUTHY_EDGES, truthy_edges_batch
+from kg.wd.utils import DATA_ROOT, configure_budget, get_budget, get_cache
+from kg.wd.verdicts import get_verdict_store
+from kg.pipeline.run_wd import PROJECT_ROOT, _P_RE, _slugify, load_subjects, refresh_stores
+
+# Precalentamiento del caché para una lista de sujetos (la salida de sample_subjects), pensado
+# para horas valle antes de una corrida grande: trae aristas truthy, veredictos por país y
+# etiquetas de todos los sujetos en los lotes más grandes que el batcher adaptativo considera
+# seguros, sin intercalar CPU. Después `run_wd` con los mismos países e idiomas no consulta WDQS.
+#
+# Por capa informa la cobertura antes, la proyectada (lo que cubre el plan si todas las
+# consultas responden) y la lograda, medida de nuevo en los stores al terminar: la diferencia
+# son lotes fallidos, ventanas que no alcanzaron a correr (--max-minutes) o entradas
+# desalojadas por el límite de tamaño del caché.
+
+LAYERS = ("truthy", "verdicts", "labels")
+
+
+def _pct(n: int, total: int) -> float:
+    return round(100.0 * n / total, 2) if total else 100.0
+
+
+def prefetch_subjects(qids: list[str], countries: list[str], label_langs: str = "es,en", *,
+                      window: int = 2000, workers: int = 1, max_minutes: float = 0.0,
+                      progress: bool = True) -> dict:
+    """
+    Llena el caché de consultas, el store de veredictos y el de etiquetas para `qids`.
+    Trabaja por ventanas de `window` sujetos (en `workers` hilos, con el límite de requests
+    global de kg.wd.utils); con `max_minutes` no empieza ventanas nuevas pasado ese tiempo.
+    Devuelve, por capa: needed, before, projected y achieved (conteos y %).
+    """
+    t0 = time.perf_counter()
+    qids = list(dict.fromkeys(qids))
+    countries = list(dict.fromkeys(countries))
+    verdicts, label_store = get_verdict_store(), get_label_store()
+
+    # plan: qué sujetos ya tienen aristas en caché
+    cached_subjects = TRUTHY_EDGES.cached(qids)
+    windows = [qids[i:i + window] for i in range(0, len(qids), max(1, window))]
+    print(f"Plan: {len(qids):,} sujetos en {len(windows)} ventanas · "
+          f"{len(cached_subjects):,} ya en caché, {len(qids) - len(cached_subjects):,} por consultar")
+
+    before = dict.fromkeys(LAYERS, 0)
+    planned = dict.fromkeys(LAYERS, 0)
+    before["truthy"] = planned["truthy"] = len(cached_subjects)
+    objects: set[str] = set()
+    label_ids: set[str] = set()
+    # lo que alguna ventana encontró ya guardado / tuvo que pedir (las ventanas comparten objetos)
+    known: dict[str, set] = {"verdicts": set(), "labels": set()}
+    fetched: dict[str, set] = {"verdicts": set(), "labels": set()}
+    skipped = 0
+
+    def _warm(ids: list[str]) -> tuple[list[str], set[str], set, set[str]] | None:
+        if max_minutes and time.perf_counter() - t0 > max_minutes * 60:
+            return None
+        # 1) aristas truthy: lotes tan grandes como lo permita el batcher (empiezan en el máximo)
+        with metrics.timer("stage_seconds", stage="prefetch_truthy"):
+            edges = truthy_edges_batch(ids, batch_size=400)
+        objs = list(dict.fromkeys(Q for es in edges.values() for P, Q in es
+                                  if _P_RE.match(P) and Q.startswith("Q")))
+        # 2) veredictos por país (pasada 1 en lotes grandes; pasadas 2–3 con el índice de lugares)
+        known_verdicts = {(o, c) for c in countries for o in verdicts.get_many(objs, c)}
+        ok: dict[str, set[str]] = {}
+        try:
+            with metrics.timer("stage_seconds", stage="prefetch_filter"):
+                ok = filter_by_countries(objs, countries, batch_p1=400)
+        except Exception as e:
+            print(f"[warn] filtro por país falló en una ventana: {e}")
+        # 3) etiquetas de los sujetos y de los objetos que quedan en algún país
+        lids = set(ids).union(*ok.values())
+        missing_labels = label_store.missing(lids, label_langs)
+        try:
+            with metrics.timer("stage_seconds", stage="prefetch_labels"):
+                label_store.prefetch(missing_labels, label_langs)
+        except Exception as e:
+            print(f"[warn] etiquetas fallaron en una ventana: {e}")
+        save_batch_state()
+        return objs, lids, known_verdicts, set(missing_labels)
+
+    pbar = tqdm(total=len(qids), desc="Prefetch", disable=not progress)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            for ids, res in zip(windows, ex.map(_warm, windows)):
+                pbar.update(len(ids))
+                if res is None:
+                    skipped += 1
+                    continue
+                objs, lids, known_verdicts, missing_labels = res
+                objects.update(objs)
+                label_ids |= lids
+                planned["truthy"] += sum(1 for q in ids if q not in cached_subjects)
+                known["verdicts"] |= known_verdicts
+                fetched["verdicts"].update((o, c) for c in countries for o in objs if (o, c) not in known_verdicts)
+                known["labels"] |= lids - missing_labels
+                fetched["labels"] |= missing_labels
+    finally:
+        pbar.close()
+    if skipped:
+        print(f"[warn] {skipped} ventanas sin procesar (--max-minutes): quedan fuera de la proyección.")
+    # las capas derivadas se proyectan sobre los objetos descubiertos (todos se piden)
+    needed = {"truthy": len(qids), "verdicts": len(objects) * len(countries), "labels": len(label_ids)}
+    planned["verdicts"], planned["labels"] = needed["verdicts"], needed["labels"]
+    for layer in ("verdicts", "labels"):
+        before[layer] = len(known[layer] - fetched[layer])
+
+    # cobertura lograda: se mide otra vez en los stores (lo que verá el próximo run_wd)
+    achieved = {
+        "truthy": len(TRUTHY_EDGES.cached(qids)),
+        "verdicts": sum(len(verdicts.get_many(list(objects), c)) for c in countries),
+        "labels": len(label_ids) - len(label_store.missing(label_ids, label_langs)),
+    }
+    report = {
+        layer: {"needed": needed[layer],
+                "before": before[layer], "before_pct": _pct(before[layer], needed[layer]),
+                "projected": planned[layer], "projected_pct": _pct(planned[layer], needed[layer]),
+                "achieved": achieved[layer], "achieved_pct": _pct(achieved[layer], needed[layer])}
+        for layer in LAYERS
+    }
+    report.update({"windows": len(windows), "windows_skipped": skipped,
+                   "offline_ready": all(achieved[l] >= needed[l] for l in LAYERS) and not skipped,
+                   "elapsed_s": round(time.perf_counter() - t0, 3)})
+    return report
+
+
+def print_coverage(report: dict) -> None:
+    print(f"{'capa':<10}{'necesarias':>12}{'antes':>10}{'proyectada':>12}{'lograda':>10}")
+    for layer in LAYERS:
+        r = report[layer]
+        print(f"{layer:<10}{r['needed']:>12,}{r['before_pct']:>9.1f}%{r['projected_pct']:>11.1f}%"
+              f"{r['achieved_pct']:>9.1f}%")
+    if report["offline_ready"]:
+        print("✅ Caché completo: run_wd (mismos países e idiomas) no necesita consultar WDQS.")
+    else:
+        print("⚠️  Cobertura incompleta: run_wd consultará WDQS por lo que falta (se puede repetir el prefetch).")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Precalienta el caché SPARQL para una lista de sujetos (antes de run_wd).")
+    ap.add_argument("--country", help="QID, ISO-2/3 o nombre del país (según config/countries.yml).")
+    ap.add_argument("--countries", help="Varios países separados por coma (los mismos que se pasarán a run_wd).")
+    ap.add_argument("--subjects-csv", help="CSV de sujetos (salida de sample_subjects). Default: data/subjects_{country}.csv o data/subjects.csv.")
+    ap.add_argument("--label-langs", default="es,en", help='Idiomas de etiquetas, como en run_wd (default: "es,en").')
+    ap.add_argument("--window", type=int, default=2000, help="Sujetos por ventana de trabajo (default: 2000).")
+    ap.add_argument("--workers", type=int, default=2, help="Ventanas procesadas en paralelo (hilos). Default: 2.")
+    ap.add_argument("--max-inflight", type=int, default=5, help="Máximo de requests SPARQL simultáneas (default: 5).")
+    ap.add_argument("--max-rps", type=float, default=0.0, help="Techo de requests SPARQL por segundo (0 = sin techo).")
+    ap.add_argument("--max-minutes", type=float, default=0.0,
+                    help="No empieza ventanas nuevas pasado este tiempo (fin de la ventana valle). 0 = sin límite.")
+    ap.add_argument("--report", help="Ruta del reporte JSON (default: data/prefetch_report.json).")
+    ap.add_argument("--strict", action="store_true", help="Termina con código 1 si la cobertura lograda no es completa.")
+    ap.add_argument("--refresh", action="store_true", help="Vacía antes los stores persistentes, como en run_wd.")
+    args = ap.parse_args()
+
+    if args.country and args.countries:
+        raise SystemExit("[error] Usa --country o --countries, no ambos.")
+    countries: list[tuple[str, str]] = []   # (QID, slug)
+    for arg in ([c.strip() for c in args.countries.split(",") if c.strip()] if args.countries
+                else [args.country] if args.country else []):
+        try:
+            qid = resolve_country_id(arg)
+        except Exception as e:
+            raise SystemExit(f"[error] No fue posible resolver el país '{arg}': {e}")
+        countries.append((qid, _slugify(arg) if not arg.upper().startswith("Q") else qid.lower()))
+    if not countries:
+        try:
+            country_name, qid = get_country_from_project()
+        except Exception as e:
+            raise SystemExit(f"[error] No fue posible leer el país desde config/project.yml: {e}")
+        countries.append((qid, _slugify(country_name)))
+
+    # sujetos: el CSV compartido o la unión de los CSV por país (igual que run_wd)
+    paths = ([Path(args.subjects_csv)] if args.subjects_csv else
+             [p if p.exists() else PROJECT_ROOT / "data" / "subjects.csv"
+              for p in (PROJECT_ROOT / "data" / f"subjects_{slug}.csv" for _, slug in countries)])
+    qids: list[str] = []
+    for path in dict.fromkeys(paths):
+        print(f"CSV de sujetos: {path}")
+        qids += [r["qid"] for r in load_subjects(path)]
+    if not qids:
+        raise SystemExit("[error] El CSV de sujetos está vacío.")
+
+    configure_budget(max_inflight=args.max_inflight, max_rps=args.max_rps)
+    if args.refresh:
+        refresh_stores(qid for qid, _ in countries)
+    report = prefetch_subjects(qids, [qid for qid, _ in countries], args.label_langs, window=args.window,
+                               workers=args.workers, max_minutes=args.max_minutes)
+    save_batch_state(min_interval_s=0)
+    print_coverage(report)
+
+    report_path = Path(args.report) if args.report else DATA_ROOT / "prefetch_report.json"
+    metrics.METRICS.write_json(report_path, {
+        "countries": [qid for qid, _ in countries], "label_langs": args.label_langs, "argv": sys.argv[1:],
+        "coverage": report, "cache_backend": get_cache().stats(), "throttle": get_budget().stats()})
+    print(f"📋 Reporte: {report_path}")
+    if args.strict and not report["offline_ready"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,28 @@ import argparse
 from tqdm import tqdm
 import re
 import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator
+import cProfile
+import io
+import multiprocessing
+import pstats
+import sys
+import time
+import tracemalloc
 
-from kg.wd.truthy import truthy_edges
-from kg.wd.filter_country import filter_by_country
-from kg.wd.build import build_degree1_graph, save_ttl
-from kg.wd.utils import labels
+from kg.wd.truthy import truthy_edges, truthy_edges_batch
+from kg.wd.filter_country import filter_by_countries
+from kg.wd.writer import StreamWriter, render_ntriples, subject_graph, write_turtle
+from kg.wd.utils import labels, configure_budget, get_budget, get_cache
+from kg import metrics
 from kg.wd.country import resolve_country_id, get_country_from_project
+from kg.wd.dump import DEFAULT_DUMP_DB, use_dump
+from kg.wd.label_store import get_label_store
+from kg.wd.places import get_place_index
+from kg.wd.verdicts import get_verdict_store
+from kg.pipeline.manifest import RunManifest, input_hash, OK, EMPTY, FAILED, SKIPPED
 
 # --------------------------------------------------------------------------------------
 # Utilidades
@@ -27,6 +43,26 @@ def _slugify(s: str) -> str:
         .replace(" ", "-")
     )
 
+def _unique_countries(countries: list[tuple[str, str, str]]) -> list[tuple[str, str, str]]:
+    """(nombre, QID, slug) sin QIDs repetidos, en el orden de su primera aparición."""
+    seen: dict[str, tuple[str, str, str]] = {}
+    for c in countries:
+        seen.setdefault(c[1], c)
+    return list(seen.values())
+
+
+def refresh_stores(country_qids: Iterable[str]) -> None:
+    """
+    --refresh: borra lo guardado para estos países (veredictos, lugares en el país) y lo que no
+    depende del país (etiquetas, hechos de lugares); todo se vuelve a consultar.
+    """
+    verdicts, places = get_verdict_store(), get_place_index()
+    for qid in country_qids:
+        verdicts.clear(qid)
+        places.clear(qid)
+    get_label_store().clear()
+
+
 def find_project_root(start: Path) -> Path:
     cur = start
     for _ in range(6):
@@ -57,8 +93,13 @@ def maybe_load_pool():
         return yaml.safe_load(POOL_YML.read_text(encoding="utf-8"))
     return None
 
-def sample_props(edges: list[tuple[str,str]], clase: str, pool_cfg: dict | None) -> list[tuple[str,str]]:
-    """Muestreo ponderado de propiedades por clase (opcional)."""
+def sample_props(edges: list[tuple[str,str]], clase: str, pool_cfg: dict | None,
+                 rng: random.Random | None = None) -> list[tuple[str,str]]:
+    """
+    Muestreo ponderado de propiedades por clase (opcional).
+    `rng` permite un muestreo reproducible por sujeto (independiente del orden de ejecución).
+    """
+    rng = rng or random
     if not pool_cfg or clase not in pool_cfg:
         return edges  # sin variabilidad
     cfg = pool_cfg[clase]
@@ -77,111 +118,507 @@ def sample_props(edges: list[tuple[str,str]], clase: str, pool_cfg: dict | None)
     picked: list[tuple[str,str]] = []
     for P in candidates:
         # probabilidad de incluir esta propiedad
-        if random.random() <= float(weights.get(P, 0.5)):
+        if rng.random() <= float(weights.get(P, 0.5)):
             picked.extend(byP[P])
         # límite por número de propiedades distintas
         if len({p for p, _ in picked}) >= max_props:
             break
     return picked or edges[:max_props]
 
+# --------------------------------------------------------------------------------------
+# Serialización
+# --------------------------------------------------------------------------------------
+def serialize_subject(root: str, edges: list[tuple[str, str]], lbl: dict[str, str], fmt: str | None,
+                      out_full: Path, out_sampled: Path | None, compress: bool) -> tuple[list[Path], str | None]:
+    """
+    Serializa un sujeto. Con `fmt` ("nt"/"nq", salida consolidada) devuelve el bloque de texto
+    que el llamador escribe en orden; si no, escribe `out_full/{root}.ttl` (y `out_sampled/`
+    si se pasa) y devuelve las rutas escritas.
+    """
+    if fmt:
+        return [], render_ntriples(root, edges, lbl, graph=subject_graph(root) if fmt == "nq" else None)
+    ext = ".ttl.gz" if compress else ".ttl"
+    outputs = [write_turtle(out_full / f"{root}{ext}", root, edges, lbl, compress=compress)]
+    if out_sampled is not None:
+        outputs.append(write_turtle(out_sampled / f"{root}{ext}", root, edges, lbl, compress=compress))
+    return outputs, None
+
+
+# --------------------------------------------------------------------------------------
+# Procesamiento por sujeto
+# --------------------------------------------------------------------------------------
+_P_RE = re.compile(r"^P\d+$")
+
+def process_subject(row: dict, edges: list[tuple[str,str]] | None, *, country_qid: str,
+                    label_langs: str, pool: dict | None, out_full: Path, out_sampled: Path,
+                    manifest: RunManifest | None = None, settings: dict | None = None,
+                    writer: StreamWriter | None = None, compress: bool = False) -> tuple[str, str | None]:
+    """
+    Pipeline completo de un sujeto: aristas truthy → filtro por país → etiquetas → serialización.
+    Si `edges` es None, las aristas se consultan aquí.
+
+    Devuelve (estado, bloque):
+      - estado: OK (grafo escrito), EMPTY (nada que escribir), FAILED o SKIPPED
+        (el manifiesto indica que la salida ya está al día para estas entradas).
+      - bloque: con `writer` (salida consolidada), el texto N-Triples/N-Quads del sujeto,
+        que el llamador escribe en orden; sin `writer` se escribe un Turtle por sujeto y es None.
+    Es seguro llamarla desde varios hilos (cada sujeto escribe su propio archivo).
+    """
+    target = {"country_qid": country_qid, "out_full": out_full, "out_sampled": out_sampled,
+              "manifest": manifest, "settings": settings, "writer": writer}
+    return process_subject_countries(row, edges, targets=[target], label_langs=label_langs,
+                                     pool=pool, compress=compress)[0]
+
+def process_subject_countries(row: dict, edges: list[tuple[str,str]] | None, *, targets: list[dict],
+                              label_langs: str, pool: dict | None,
+                              compress: bool = False) -> list[tuple[str, str | None]]:
+    """
+    Como `process_subject`, para varios países a la vez (`--countries`): las aristas truthy y
+    las etiquetas se obtienen una sola vez por sujeto y el filtro resuelve todos los países
+    juntos (`filter_by_countries`). Cada target es un dict con country_qid, out_full,
+    out_sampled, manifest, settings y writer (o solo fmt, en un proceso de `BuildPool`);
+    devuelve un (estado, bloque) por target.
+    """
+    root = row["qid"]
+    clase = row.get("clase", "default")
+
+    # 1) truthy edges
+    if edges is None:
+        with metrics.timer("stage_seconds", stage="truthy"):
+            edges = truthy_edges(root)
+    edges = [(P, Q) for (P, Q) in edges if _P_RE.match(P) and Q.startswith("Q")]
+
+    results: list[tuple[str, str | None]] = [(SKIPPED, None)] * len(targets)
+    hashes: dict[int, str | None] = {}
+    for i, t in enumerate(targets):
+        m = t.get("manifest")
+        h = input_hash(edges, t.get("settings") or {}) if m else None
+        if not (m and m.is_current(root, h)):
+            hashes[i] = h
+    if not hashes:
+        return results
+
+    def _done(i: int, status: str, outputs: list[Path] | None = None, error: str | None = None,
+              chunk: str | None = None) -> None:
+        m = targets[i].get("manifest")
+        if m:
+            m.record(root, status, h=hashes[i], outputs=outputs, error=error)
+        results[i] = (status, chunk)
+
+    if not edges:
+        for i in hashes:
+            _done(i, EMPTY)
+        return results
+
+    # 2) filtro por país (sobre objetos), todos los países del sujeto en una pasada
+    objs = [q for _, q in edges]
+    countries = list(dict.fromkeys(targets[i]["country_qid"] for i in hashes))
+    try:
+        with metrics.timer("stage_seconds", stage="filter"):
+            ok_by_country = filter_by_countries(objs, countries)
+    except Exception as e:
+        print(f"[warn] filtro por país falló para {root}: {e}")
+        for i in hashes:
+            _done(i, FAILED, error=f"filter_by_country: {e}")
+        return results
+
+    # 3) variabilidad opcional (semilla por sujeto: igual en modo secuencial y concurrente)
+    finals: dict[int, list[tuple[str, str]]] = {}
+    for i in hashes:
+        ok_objs = ok_by_country[targets[i]["country_qid"]]
+        edges_country = [(P, Q) for (P, Q) in edges if Q in ok_objs]
+        if not edges_country:
+            _done(i, EMPTY)
+            continue
+        finals[i] = sample_props(edges_country, clase, pool, rng=random.Random(root)) if pool else edges_country
+    if not finals:
+        return results
+
+    # 4) etiquetas (parametrizable por idioma), una vez para todos los países
+    qids_for_labels = [root] + list({q for ef in finals.values() for _, q in ef})
+    with metrics.timer("stage_seconds", stage="labels"):
+        lbl = labels(qids_for_labels, langs=label_langs)
+
+    # 5) serializar (escritor streaming, sin construir un rdflib.Graph); 6) con muestreo, también sampled
+    for i, edges_final in finals.items():
+        t = targets[i]
+        writer = t.get("writer")
+        fmt = writer.fmt if writer is not None else t.get("fmt")
+        with metrics.timer("stage_seconds", stage="serialize"):
+            outputs, chunk = serialize_subject(root, edges_final, lbl, fmt, t["out_full"],
+                                               t["out_sampled"] if pool else None, compress)
+        _done(i, OK, outputs=outputs, chunk=chunk)
+    return results
+
+
+def prefetch_edges(rows: list[dict]) -> dict[str, list[tuple[str, str]]]:
+    """Precarga de aristas truthy para toda una ventana de sujetos (consultas por lotes)."""
+    try:
+        with metrics.timer("stage_seconds", stage="prefetch"):
+            return truthy_edges_batch([r["qid"] for r in rows])
+    except Exception as e:
+        print(f"[warn] precarga de aristas falló ({e}); se consulta sujeto a sujeto.")
+        return {}
+
+
+def run_row(row: dict, edges: list[tuple[str, str]] | None, row_targets: list[dict], *,
+            label_langs: str, pool: dict | None, compress: bool) -> list[tuple[dict, str, str | None]]:
+    """`process_subject_countries` para un sujeto; un error no detiene la corrida (queda FAILED)."""
+    try:
+        res = process_subject_countries(row, edges, targets=row_targets, label_langs=label_langs,
+                                        pool=pool, compress=compress)
+    except Exception as e:
+        # un sujeto fallido no detiene la corrida; queda para --retry-failed
+        print(f"[warn] sujeto {row['qid']} falló: {e}")
+        for t in row_targets:
+            if t["manifest"]:
+                t["manifest"].record(row["qid"], FAILED, error=str(e))
+        res = [(FAILED, None)] * len(row_targets)
+    return [(t, status, chunk) for t, (status, chunk) in zip(row_targets, res)]
+
+# --------------------------------------------------------------------------------------
+# Construcción en procesos (--build-workers)
+# --------------------------------------------------------------------------------------
+def _init_build_worker(max_inflight: int, max_rps: float, dump_db: str | None) -> None:
+    configure_budget(max_inflight=max_inflight, max_rps=max_rps)
+    if dump_db:
+        use_dump(dump_db)
+
+
+def _build_window(job: dict) -> dict:
+    # en el proceso hijo: una ventana completa (precarga, filtro, etiquetas, serialización);
+    # vuelven los resultados en orden, los registros del manifiesto y las métricas del trabajo
+    metrics.METRICS.reset()
+    rows = job["rows"]
+    manifests = {c: RunManifest(None, subjects=subjects) for c, subjects in job["manifests"].items()}
+    targets = {c: {**spec, "manifest": manifests.get(c), "writer": None} for c, spec in job["targets"].items()}
+    prefetched = prefetch_edges(rows) if job["prefetch"] else {}
+
+    def _run(row: dict) -> list[tuple[str, str, str | None]]:
+        res = run_row(row, prefetched.get(row["qid"]), [targets[c] for c in job["row_countries"][row["qid"]]],
+                      label_langs=job["label_langs"], pool=job["pool"], compress=job["compress"])
+        return [(t["country_qid"], status, chunk) for t, status, chunk in res]
+
+    if job["threads"] > 1:
+        with ThreadPoolExecutor(max_workers=job["threads"]) as ex:
+            results = list(ex.map(_run, rows))
+    else:
+        results = [_run(r) for r in rows]
+    get_cache().flush()   # los hijos del pool no corren los atexit
+    return {"results": results, "manifests": {c: m.changed for c, m in manifests.items()},
+            "metrics": metrics.METRICS.dump()}
+
+
+class BuildPool:
+    """
+    Pool de procesos de `run_wd --build-workers`. Con el caché caliente la corrida queda limitada
+    por CPU (decodificar el caché, filtrar, etiquetar, serializar) y el GIL impide repartirla entre
+    hilos: cada trabajo es una ventana entera de sujetos (`_build_window`), de modo que el IPC es
+    uno por ventana y no por sujeto. El padre solo escribe la salida consolidada en orden, aplica
+    el manifiesto y suma las métricas. El presupuesto de requests se reparte entre los hijos.
+    """
+
+    def __init__(self, workers: int, max_inflight: int = 5, max_rps: float = 0.0, dump_db: str | None = None):
+        methods = multiprocessing.get_all_start_methods()
+        # forkserver: los hijos no heredan locks tomados por los hilos del proceso principal
+        ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.workers = workers
+        self._ex = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_build_worker,
+                                       initargs=(max(1, max_inflight // workers), max_rps / workers, dump_db))
+
+    def map(self, jobs: Iterable[dict]) -> Iterator[dict]:
+        """Resultados de `_build_window` en orden de entrada, con hasta 2 ventanas por proceso en vuelo."""
+        pending = deque()
+        for job in jobs:
+            pending.append(self._ex.submit(_build_window, job))
+            if len(pending) >= self.workers * 2:
+                yield self._collect(pending.popleft().result())
+        while pending:
+            yield self._collect(pending.popleft().result())
+
+    @staticmethod
+    def _collect(res: dict) -> dict:
+        metrics.METRICS.merge(res["metrics"])
+        return res
+
+    def shutdown(self) -> None:
+        self._ex.shutdown(wait=True, cancel_futures=True)
+
+def _write_reports(out_dir: Path, args, country_qid: str, counts: dict[str, int], elapsed: float,
+                   profiler: cProfile.Profile | None = None, mem: bool = False) -> None:
+    """Reporte JSON de la corrida + textfile de Prometheus (+ volcados de perfil si se pidieron)."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    extra = {"country": country_qid, "argv": sys.argv[1:], "elapsed_s": round(elapsed, 3),
+             "subjects": counts, "cache_backend": get_cache().stats(), "throttle": get_budget().stats()}
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(str(out_dir / "profile.pstats"))
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(40)
+        (out_dir / "profile.txt").write_text(buf.getvalue(), encoding="utf-8")
+        extra["profile"] = str(out_dir / "profile.pstats")
+    if mem and tracemalloc.is_tracing():
+        snap = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snap.dump(str(out_dir / "tracemalloc.snap"))
+        extra["memory"] = {"current_mb": round(current / 2**20, 2), "peak_mb": round(peak / 2**20, 2),
+                           "top": [str(s) for s in snap.statistics("lineno")[:20]],
+                           "snapshot": str(out_dir / "tracemalloc.snap")}
+    metrics.METRICS.write_json(out_dir / "run_report.json", extra)
+    metrics.METRICS.write_prometheus(out_dir / "metrics.prom")
+
 # --------------------------------------------------------------------------------------
 # Main
 # --------------------------------------------------------------------------------------
 def main():
     ap = argparse.ArgumentParser(description="Construcción de grafos de conocimiento desde Wikidata.")
     ap.add_argument("--country", help="QID, ISO-2/3 o nombre del país (según config/countries.yml). Ej: Q183, de, germany, alemania.")
+    ap.add_argument("--countries", help="Varios países separados por coma (ej. usa,de,fr): una sola pasada, salida por país en graphs/{pais}/.")
     ap.add_argument("--label-langs", default="es,en", help='Idiomas de etiquetas (prioridad), ej: "es,en" o "fr,en".')
     ap.add_argument("--subjects-csv", help="Ruta al CSV de sujetos. Por defecto usa data/subjects_{country}.csv o data/subjects.csv.")
     ap.add_argument("--out-dir", help="Directorio base de salida. Por defecto graphs/{country_slug}/")
+    ap.add_argument("--prefetch", type=int, default=200, help="Sujetos por ventana de precarga de aristas truthy (0 = una consulta por sujeto).")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Sujetos procesados en paralelo (hilos; por proceso con --build-workers). Default: 1 (secuencial).")
+    ap.add_argument("--build-workers", type=int, default=0,
+                    help="Procesos que procesan ventanas enteras de sujetos (0 = en este proceso). Útil con el caché caliente.")
+    ap.add_argument("--max-inflight", type=int, default=5, help="Máximo de requests SPARQL simultáneas en todo el proceso (default: 5).")
+    ap.add_argument("--max-rps", type=float, default=0.0,
+                    help="Techo de requests SPARQL por segundo (0 = sin techo: el ritmo se ajusta solo ante 429/503/timeouts).")
+    ap.add_argument("--format", choices=["ttl", "nt", "nq"], default="ttl",
+                    help="ttl: un Turtle por sujeto (default); nt/nq: un archivo consolidado por país (N-Quads: un grafo nombrado por sujeto).")
+    ap.add_argument("--gzip", action="store_true", help="Comprime la salida con gzip (determinista).")
+    ap.add_argument("--no-manifest", action="store_true", help="No usar el manifiesto de corrida (reprocesa todo).")
+    ap.add_argument("--refresh", action="store_true",
+                    help="Vacía antes los veredictos de país, las etiquetas y el índice de lugares (si no, vencen con HFKG_STORE_TTL/HFKG_CACHE_TTL).")
+    ap.add_argument("--retry-failed", action="store_true", help="Reprocesa solo los sujetos marcados como fallidos en el manifiesto.")
+    ap.add_argument("--backend", choices=["wdqs", "dump"], help="Origen de datos: WDQS (default) o volcado truthy local indexado.")
+    ap.add_argument("--dump-db", help="SQLite del volcado indexado (kg.wd.dump). Default: data/wd_dump.sqlite.")
+    ap.add_argument("--metrics-dir", help="Dónde escribir un único run_report.json y metrics.prom (default: uno en el directorio de salida de cada país).")
+    ap.add_argument("--validate", nargs="?", const=str(PROJECT_ROOT / "config" / "shapes.ttl"), metavar="SHAPES",
+                    help="Al terminar, valida la salida de cada país con SHACL (default: config/shapes.ttl; "
+                         "una ruta relativa es relativa al directorio actual) → validation_report.json.")
+    ap.add_argument("--profile", choices=["cpu", "mem"],
+                    help="cpu: cProfile del hilo principal (usar con --workers 1 para cubrir todo); mem: tracemalloc.")
     args = ap.parse_args()
 
-    # 1) Resolver país: CLI > project.yml
-    if args.country:
+    if args.backend == "dump":
+        use_dump(args.dump_db or DEFAULT_DUMP_DB)
+
+    # 1) Resolver país(es): CLI > project.yml
+    if args.country and args.countries:
+        raise SystemExit("[error] Usa --country o --countries, no ambos.")
+    countries: list[tuple[str, str, str]] = []   # (nombre para mostrar, QID, slug)
+    for arg in ([c.strip() for c in args.countries.split(",") if c.strip()] if args.countries
+                else [args.country] if args.country else []):
         try:
-            country_qid = resolve_country_id(args.country)
+            qid = resolve_country_id(arg)
         except Exception as e:
-            raise SystemExit(f"[error] No fue posible resolver el país '{args.country}': {e}")
-        country_slug = _slugify(args.country) if not args.country.upper().startswith("Q") else country_qid.lower()
-        country_label_for_print = args.country
-    else:
+            raise SystemExit(f"[error] No fue posible resolver el país '{arg}': {e}")
+        countries.append((arg, qid, _slugify(arg) if not arg.upper().startswith("Q") else qid.lower()))
+    if not countries:
         try:
-            country_name, country_qid = get_country_from_project()
+            country_name, qid = get_country_from_project()
         except Exception as e:
             raise SystemExit(f"[error] No fue posible leer el país desde config/project.yml: {e}")
-        country_slug = _slugify(country_name)
-        country_label_for_print = country_name
+        countries.append((country_name, qid, _slugify(country_name)))
+    countries = _unique_countries(countries)
+    multi = len(countries) > 1
+    if args.refresh:
+        refresh_stores(qid for _, qid, _ in countries)
 
-    print(f"País objetivo: {country_label_for_print} ({country_qid})")
+    print("País objetivo: " + ", ".join(f"{name} ({qid})" for name, qid, _ in countries))
 
-    # 2) Elegir CSV de sujetos
-    if args.subjects_csv:
-        subjects_csv = Path(args.subjects_csv)
-    else:
-        # preferimos data/subjects_{country}.csv; si no existe, usamos data/subjects.csv
-        preferred = PROJECT_ROOT / "data" / f"subjects_{country_slug}.csv"
-        fallback = PROJECT_ROOT / "data" / "subjects.csv"
-        subjects_csv = preferred if preferred.exists() else fallback
-    print(f"CSV de sujetos: {subjects_csv}")
-
-    subs = load_subjects(subjects_csv)
+    # 2) Elegir CSV(s) de sujetos: uno compartido (--subjects-csv) o el de cada país
+    row_countries: dict[str, list[str]] = {}   # QID sujeto → países para los que se construye
+    subs: list[dict] = []
+    csv_by_country = {}
+    for _, qid, slug in countries:
+        if args.subjects_csv:
+            csv_by_country[qid] = Path(args.subjects_csv)
+        else:
+            # preferimos data/subjects_{country}.csv; si no existe, usamos data/subjects.csv
+            preferred = PROJECT_ROOT / "data" / f"subjects_{slug}.csv"
+            fallback = PROJECT_ROOT / "data" / "subjects.csv"
+            csv_by_country[qid] = preferred if preferred.exists() else fallback
+    for path in dict.fromkeys(csv_by_country.values()):
+        print(f"CSV de sujetos: {path}")
+        rows = load_subjects(path)
+        for qid in (c for c, p in csv_by_country.items() if p == path):
+            for r in rows:
+                if r["qid"] not in row_countries:
+                    row_countries[r["qid"]] = []
+                    subs.append(r)
+                if qid not in row_countries[r["qid"]]:
+                    row_countries[r["qid"]].append(qid)
     if not subs:
         raise SystemExit("[error] El CSV de sujetos está vacío.")
+    if multi:
+        print(f"Sujetos únicos: {len(subs)} ({sum(len(v) for v in row_countries.values())} pares sujeto×país)")
 
-    # 3) Directorios de salida
-    if args.out_dir:
-        out_base = Path(args.out_dir)
-    else:
-        out_base = PROJECT_ROOT / "graphs" / country_slug
-    out_full = out_base / "full"
-    out_sampled = out_base / "sampled"
-    out_full.mkdir(parents=True, exist_ok=True)
-    out_sampled.mkdir(parents=True, exist_ok=True)
-
-    # 4) Config de variabilidad (opcional)
-    pool = maybe_load_pool()
-
-    # 5) Procesamiento
-    _P_RE = re.compile(r"^P\d+$")
-
-    for row in tqdm(subs, desc="Wikidata pipeline"):
-        root = row["qid"]
-        clase = row.get("clase", "default")
-
-        # 5.1 truthy edges
-        edges = truthy_edges(root)
-        edges = [(P, Q) for (P, Q) in edges if _P_RE.match(P) and Q.startswith("Q")]
-        if not edges:
-            continue
+    # 3) Directorios de salida (con varios países: un subdirectorio por país)
+    root_out = Path(args.out_dir) if args.out_dir else PROJECT_ROOT / "graphs"
+    pool = maybe_load_pool()   # 4) config de variabilidad (opcional)
+    consolidated = args.format in ("nt", "nq")
+    targets: dict[str, dict] = {}
+    for name, qid, slug in countries:
+        out_base = root_out / slug if (multi or not args.out_dir) else root_out
+        t = {"name": name, "country_qid": qid, "slug": slug, "out_base": out_base,
+             "out_full": out_base / "full", "out_sampled": out_base / "sampled",
+             "settings": {"country": qid, "label_langs": args.label_langs, "pool": pool,
+                          "format": args.format, "gzip": args.gzip},
+             "counts": {}, "writer": None}
+        t["out_full"].mkdir(parents=True, exist_ok=True)
+        t["out_sampled"].mkdir(parents=True, exist_ok=True)
+        # 5) Manifiesto: reanudar / reprocesar solo lo que cambió
+        # (la salida consolidada se reescribe completa en cada corrida: no aplica el manifiesto)
+        t["manifest"] = None if args.no_manifest or consolidated else RunManifest(out_base / "manifest.json")
+        targets[qid] = t
 
-        # 5.2 filtro por país (sobre objetos)
-        objs = [q for _, q in edges]
-        try:
-            ok_objs = filter_by_country(objs, country_qid=country_qid)
-        except Exception as e:
-            print(f"[warn] filtro por país falló para {root}: {e}")
-            continue
-        edges_country = [(P, Q) for (P, Q) in edges if Q in ok_objs]
-        if not edges_country:
-            continue
+    if args.retry_failed:
+        if any(t["manifest"] is None for t in targets.values()):
+            raise SystemExit("[error] --retry-failed requiere el manifiesto (salida ttl, sin --no-manifest).")
+        failed = {c: t["manifest"].failed() for c, t in targets.items()}
+        row_countries = {q: [c for c in cs if q in failed[c]] for q, cs in row_countries.items()}
+        subs = [r for r in subs if row_countries[r["qid"]]]
+        print(f"Reintentando {len(subs)} sujetos fallidos.")
+        if not subs:
+            return
+
+    # 6) Procesamiento
+    configure_budget(max_inflight=args.max_inflight, max_rps=args.max_rps)
+    workers = max(1, args.workers)
+
+    def _prefetch(rows: list[dict]) -> dict[str, list[tuple[str, str]]]:
+        return prefetch_edges(rows) if args.prefetch > 0 else {}
+
+    window = args.prefetch if args.prefetch > 0 else max(workers * 4, 1)
+    windows = [subs[w:w + window] for w in range(0, len(subs), window)]
+    pbar = tqdm(total=len(subs), desc="Wikidata pipeline")
+    published = False
+    if consolidated:
+        suffix = f".{args.format}" + (".gz" if args.gzip else "")
+        for t in targets.values():
+            t["writer"] = StreamWriter(t["out_base"] / f"{t['slug']}{suffix}", fmt=args.format, compress=args.gzip)
+
+    first = next(iter(targets.values()))
+    # reportes: uno por país en su graphs/{pais}/ (o uno combinado en --metrics-dir)
+    metrics_dirs = ([(Path(args.metrics_dir), None)] if args.metrics_dir
+                    else [(t["out_base"], t) for t in targets.values()])
+    profiler = cProfile.Profile() if args.profile == "cpu" else None
+    if args.profile == "mem":
+        tracemalloc.start(25)
+    elif profiler:
+        profiler.enable()
+    t_start = time.perf_counter()
+
+    def _emit(per_country: list[tuple[dict, str, str | None]]) -> None:
+        # en orden de entrada: la salida consolidada es determinista
+        for t, status, chunk in per_country:
+            if chunk:
+                t["writer"].write_chunk(chunk)
+            t["counts"][status] = t["counts"].get(status, 0) + 1
+            metrics.inc("subjects_total", status=status, country=t["country_qid"])
+        pbar.update(1)
+
+    def _jobs() -> Iterator[dict]:
+        # una ventana por trabajo del pool de procesos (los destinos viajan sin writer ni manifiesto)
+        specs = {c: {"country_qid": c, "out_full": t["out_full"], "out_sampled": t["out_sampled"],
+                     "settings": t["settings"], "fmt": args.format if consolidated else None}
+                 for c, t in targets.items()}
+        for rows in windows:
+            qids = [r["qid"] for r in rows]
+            yield {"rows": rows, "row_countries": {q: row_countries[q] for q in qids}, "targets": specs,
+                   "manifests": {c: t["manifest"].view(qids) for c, t in targets.items() if t["manifest"]},
+                   "prefetch": args.prefetch > 0, "threads": workers, "label_langs": args.label_langs,
+                   "pool": pool, "compress": args.gzip}
 
-        # 5.3 variabilidad opcional
-        edges_final = sample_props(edges_country, clase, pool) if pool else edges_country
+    builder = pool_ex = pre_ex = None
+    if args.build_workers > 0:
+        builder = BuildPool(args.build_workers, max_inflight=args.max_inflight, max_rps=args.max_rps,
+                            dump_db=str(args.dump_db or DEFAULT_DUMP_DB) if args.backend == "dump" else None)
+    elif workers > 1:
+        # con workers > 1: la ventana siguiente se precarga mientras se procesa la actual
+        pool_ex = ThreadPoolExecutor(max_workers=workers)
+        pre_ex = ThreadPoolExecutor(max_workers=1)
+    try:
+        if builder:
+            for res in builder.map(_jobs()):
+                for c, changed in res["manifests"].items():
+                    targets[c]["manifest"].apply(changed)
+                for per_country in res["results"]:
+                    _emit([(targets[c], status, chunk) for c, status, chunk in per_country])
+        else:
+            next_pre = pre_ex.submit(_prefetch, windows[0]) if pre_ex else None
+            for k, rows in enumerate(windows):
+                if pre_ex:
+                    prefetched = next_pre.result()
+                    if k + 1 < len(windows):
+                        next_pre = pre_ex.submit(_prefetch, windows[k + 1])
+                else:
+                    prefetched = _prefetch(rows)
 
-        # 5.4 etiquetas (parametrizable por idioma)
-        qids_for_labels = [root] + list({q for _, q in edges_final})
-        lbl = labels(qids_for_labels, langs=args.label_langs)
+                def _run(row: dict) -> list[tuple[dict, str, str | None]]:
+                    return run_row(row, prefetched.get(row["qid"]), [targets[c] for c in row_countries[row["qid"]]],
+                                   label_langs=args.label_langs, pool=pool, compress=args.gzip)
 
-        # 5.5 construir y serializar
-        g = build_degree1_graph(root, edges_final, labels=lbl)
-        save_ttl(g, out_full / f"{root}.ttl")
+                # map() conserva el orden de entrada: la salida consolidada es determinista
+                for per_country in (pool_ex.map(_run, rows) if pool_ex else map(_run, rows)):
+                    _emit(per_country)
+        for t in targets.values():
+            if t["writer"]:
+                t["writer"].close()
+        published = True
 
-        # 5.6 si hay muestreo, guarda también sampled
-        if pool:
-            save_ttl(g, out_sampled / f"{root}.ttl")
+        # 7) Validación SHACL opcional de la salida (kg.pipeline.validate), antes de los reportes
+        #    para que stage_seconds{stage="validate"} quede en run_report.json
+        if args.validate:
+            from kg.pipeline.validate import print_summary, validate_paths
+            for t in targets.values():
+                out = t["writer"].out_path if t["writer"] else t["out_full"]
+                with metrics.timer("stage_seconds", stage="validate"):
+                    t["validation"] = validate_paths([out], Path(args.validate), country_qid=t["country_qid"],
+                                                     report_path=t["out_base"] / "validation_report.json",
+                                                     progress=False)
+    finally:
+        if pool_ex:
+            pool_ex.shutdown(wait=True)
+        if pre_ex:
+            pre_ex.shutdown(wait=True)
+        if builder:
+            builder.shutdown()
+        pbar.close()
+        for t in targets.values():
+            if t["manifest"]:
+                t["manifest"].flush()
+            if t["writer"] and not published:
+                t["writer"].abort()   # corrida interrumpida: no se publica un archivo parcial
+        elapsed = time.perf_counter() - t_start
+        counts = {c: t["counts"] for c, t in targets.items()}
+        for k, (out_dir, t) in enumerate(metrics_dirs):
+            if t is not None:
+                country, subj = t["country_qid"], t["counts"]
+            else:
+                country, subj = ",".join(targets), counts if multi else first["counts"]
+            # el perfil se vuelca una sola vez (en el primer reporte)
+            _write_reports(out_dir, args, country, subj, elapsed, profiler=profiler if k == 0 else None,
+                           mem=args.profile == "mem" and k == 0)
 
-    print(f"\n✅ Salida full:    {out_full}")
-    if pool:
-        print(f"✅ Salida sampled: {out_sampled}")
+    for t in targets.values():
+        print(f"\n[{t['name']}] Estados: " + ", ".join(f"{k}={v}" for k, v in sorted(t["counts"].items()))
+              if multi else "\nEstados: " + ", ".join(f"{k}={v}" for k, v in sorted(t["counts"].items())))
+        if t["writer"]:
+            print(f"✅ Salida consolidada: {t['writer'].out_path} ({t['writer'].subjects} sujetos)")
+        else:
+            print(f"✅ Salida full:    {t['out_full']}")
+        if pool and not t["writer"]:
+            print(f"✅ Salida sampled: {t['out_sampled']}")
+        if t.get("validation"):
+            print(f"[{t['name']}] " if multi else "", end="")
+            print_summary(t["validation"])
+    for out_dir, _ in metrics_dirs:
+        print(f"📊 Métricas: {out_dir / 'run_report.json'} · {out_dir / 'metrics.prom'}")
 
 if __name__ == "__main__":
     main()
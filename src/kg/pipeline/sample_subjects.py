@@ -1,19 +1,21 @@
 # src/kg/pipeline/sample_subjects.py
 from __future__ import annotations
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import csv
+import json
+import os
 import yaml
 import argparse
-from time import time, sleep
-from urllib.error import URLError
+from time import time
 import unicodedata
 
-from SPARQLWrapper import SPARQLWrapper, JSON, POST
-
 # Resolver de país desde el módulo central
 from kg.wd.country import resolve_country_id, get_country_from_project
-
-ENDPOINT = "https://query.wikidata.org/sparql"
+from kg.wd.client import get_client
+from kg.wd.utils import configure_budget, get_budget
+from kg import metrics
+from kg.wd.dump import DEFAULT_DUMP_DB, active_dump, use_dump
 
 # --------------------------------------------------------------------------------------
 # Utilidades
@@ -45,63 +47,38 @@ CFG_CLASSES = PROJECT_ROOT / "config" / "classes.yml"
 
 # --------------------------------------------------------------------------------------
 # SPARQL de muestreo por ocupación + ciudadanía (parametrizado por país e idioma wiki)
+# Una consulta por ocupación, paginada por clave (STR(?person) > último visto, ORDER BY STR(?person);
+# Blazegraph ordena los IRIs wd: por su valor interno, así que filtro y orden usan el mismo texto):
+# cada página es barata, el resultado es reproducible y se puede reanudar desde el cursor.
 # --------------------------------------------------------------------------------------
-SPARQL_TEMPLATE = """
-SELECT ?person ?personLabel ?article WHERE {{
-  VALUES ?occupation {{ {occupations} }}
-  ?person wdt:P31 wd:Q5 ;          # humano
+PAGE_TEMPLATE = """
+SELECT ?person ?article WHERE {{
+  ?person wdt:P106 wd:{occupation} ;
           wdt:P27 wd:{country_qid} ;
-          wdt:P106 ?occupation .
+          wdt:P31 wd:Q5 .          # humano
   ?article schema:about ?person ;
            schema:isPartOf <https://{wiki_lang}.wikipedia.org/> .
-  SERVICE wikibase:label {{ bd:serviceParam wikibase:language "es,en". }}
+  FILTER(STR(?person) > "{after}")
 }}
+ORDER BY STR(?person)
 LIMIT {limit}
 """
 
-def run_sparql(query: str, sleep_s=0.2, timeout_s: int = 130, retries: int = 6):
+def run_sparql(query: str, timeout_s: int = 130, retries: int = 6):
     """
-    Ejecuta una consulta SPARQL con timeout y reintentos.
+    Ejecuta una consulta SPARQL con timeout y la política de reintentos del proceso
+    (kg.wd.throttle: ritmo AIMD, Retry-After, solo errores transitorios, circuit breaker).
     - timeout_s: segundos para abortar la request (tanto conexión como lectura).
     - retries: número total de intentos antes de fallar.
     """
-    import random, socket
-    from urllib.error import URLError, HTTPError
-
-    sparql = SPARQLWrapper(ENDPOINT, agent="kg-country-agnostic/0.1 (mailto:example@example.com)")
-    sparql.setMethod(POST)              # evita URLs largas en GET
-    sparql.setReturnFormat(JSON)
-    sparql.setTimeout(timeout_s)        # <- CLAVE: timeout real
-    sparql.setQuery(query)
-
-    backoff = 1.0
-    last_err = None
-    for attempt in range(1, retries + 1):
-        try:
-            res = sparql.query().convert()
-            if sleep_s > 0:
-                sleep(sleep_s)
-            return res
-        except (HTTPError, URLError, socket.timeout, TimeoutError) as e:
-            last_err = e
-            # reintentos con backoff exponencial + jitter
-            delay = backoff + random.uniform(0, 0.6)
-            print(f"  [warn] intento {attempt}/{retries} falló ({type(e).__name__}: {e}). Reintentando en {delay:.1f}s...")
-            sleep(delay)
-            backoff = min(backoff * 1.8, 8.0)
-        except Exception as e:
-            # otros errores: si menciona rate limit, reintenta; si no, aborta
-            last_err = e
-            msg = str(e).lower()
-            if "rate limit" in msg or "throttl" in msg:
-                delay = backoff + random.uniform(0, 0.6)
-                print(f"  [warn] intento {attempt}/{retries} (rate limit). Reintentando en {delay:.1f}s...")
-                sleep(delay)
-                backoff = min(backoff * 1.8, 8.0)
-                continue
-            raise
-    # si agotó reintentos:
-    raise last_err
+    client = get_client()               # conexiones persistentes; POST si la query es larga
+
+    def attempt() -> dict:
+        res, n = client.query_json(query, timeout=timeout_s)   # <- CLAVE: timeout real
+        metrics.inc("sparql_response_bytes_total", n, kind="sample_page")
+        return res
+
+    return get_budget().call(attempt, kind="sample_page", retries=retries)
 
 def load_classes():
     with CFG_CLASSES.open("r", encoding="utf-8") as f:
@@ -112,76 +89,231 @@ def load_classes():
         raise ValueError(f"No se encontraron clases en {CFG_CLASSES}")
     return clases
 
+class SubjectSink:
+    """
+    Destino de las filas muestreadas: deduplica por QID (gana la primera clase) y escribe
+    cada fila al CSV en cuanto llega. Al reanudar, reabre el CSV en modo append y
+    recupera los QIDs y el conteo por clase de lo ya escrito.
+    """
+
+    HEADER = ["qid", "wiki_title", "clase"]
+
+    def __init__(self, out_csv: Path, resume: bool = False):
+        self.out_csv = Path(out_csv)
+        self.out_csv.parent.mkdir(parents=True, exist_ok=True)
+        self.seen: set[str] = set()
+        self.per_class: dict[str, int] = {}
+        if resume and self.out_csv.exists():
+            with self.out_csv.open("r", newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    self.seen.add(row["qid"])
+                    self.per_class[row["clase"]] = self.per_class.get(row["clase"], 0) + 1
+            self._f = self.out_csv.open("a", newline="", encoding="utf-8")
+            self._w = csv.writer(self._f)
+        else:
+            self._f = self.out_csv.open("w", newline="", encoding="utf-8")
+            self._w = csv.writer(self._f)
+            self._w.writerow(self.HEADER)
+
+    def add(self, qid: str, title: str, clase: str) -> bool:
+        if qid in self.seen:
+            return False
+        self.seen.add(qid)
+        self.per_class[clase] = self.per_class.get(clase, 0) + 1
+        self._w.writerow([qid, title, clase])
+        return True
+
+    def count(self, clase: str) -> int:
+        return self.per_class.get(clase, 0)
+
+    def flush(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class Checkpoint:
+    """
+    Progreso del muestreo junto al CSV (`<csv>.ckpt.json`): cursor de paginación por
+    ocupación y clases terminadas. Solo se reutiliza si los parámetros coinciden.
+    """
+
+    def __init__(self, path: Path, params: dict):
+        self.path = Path(path)
+        self.params = params
+        self.classes: dict[str, dict] = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("params") == params:
+                self.classes = data.get("classes", {})
+
+    @property
+    def resumable(self) -> bool:
+        return bool(self.classes)
+
+    def state(self, clase: str, occs: list[str]) -> dict:
+        st = self.classes.setdefault(clase, {"done": False, "occupations": {}})
+        for o in occs:
+            st["occupations"].setdefault(o, {"after": "", "exhausted": False})
+        return st
+
+    def save(self) -> None:
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        data = {"params": self.params, "classes": self.classes, "updated": time()}
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def _fetch_page(occ: str, after: str, country_qid: str, wiki_lang: str, page_size: int,
+                timeout_s: int, retries: int) -> list[tuple[str, str, str]]:
+    """Una página de (IRI persona, QID, título) para una ocupación, después del cursor `after`."""
+    q = PAGE_TEMPLATE.format(occupation=occ, country_qid=country_qid, wiki_lang=wiki_lang,
+                             after=after, limit=page_size)
+    data = run_sparql(q, timeout_s=timeout_s, retries=retries)
+    out = []
+    for b in data["results"]["bindings"]:
+        iri = b["person"]["value"]
+        art = b.get("article", {}).get("value")
+        out.append((iri, iri.split("/")[-1], art.split("/")[-1] if art else ""))
+    return out
+
+
 def sample_per_class(country_qid: str, wiki_lang: str = "es",
-                     limit_per_class: int = 30, sleep_s: float = 0.2,
-                     timeout_s: int = 90, retries: int = 6):
+                     limit_per_class: int = 30, sleep_s: float | None = None,
+                     timeout_s: int = 90, retries: int = 6, *, out_csv: Path,
+                     workers: int = 4, page_size: int = 1000, resume: bool = True) -> dict[str, int]:
+    """
+    Muestrea sujetos por clase y los escribe a `out_csv` (obligatorio, por nombre) a medida que
+    llegan. Los posicionales conservan el orden de antes; `sleep_s` ya no se usa (el ritmo lo
+    regula kg.wd.throttle).
+
+    Por rondas: en cada ronda se pide en paralelo (hasta `workers`) la siguiente página de
+    cada ocupación activa de la clase y se consumen en el orden de classes.yml hasta
+    llegar a `limit_per_class` sujetos únicos; así el resultado no depende de la
+    velocidad de cada consulta. Tras cada ronda se guarda el checkpoint (`<csv>.ckpt.json`),
+    que permite reanudar una corrida interrumpida; se borra al terminar sin errores.
+    Devuelve el número de sujetos escritos por clase.
+    """
     clases = load_classes()
-    rows = []
+    dump = active_dump()
+    params = {"country": country_qid, "wiki_lang": wiki_lang, "limit_per_class": limit_per_class,
+              "page_size": page_size, "backend": "dump" if dump else "wdqs"}
+    ckpt = Checkpoint(Path(str(out_csv) + ".ckpt.json"), params)
+    resuming = resume and ckpt.resumable
+    if not resuming:
+        # desde cero (--restart o parámetros distintos): el CSV se trunca, así que el
+        # progreso guardado no vale (clases "done" y cursores apuntarían a filas borradas)
+        ckpt.remove()
+        ckpt.classes = {}
+    sink = SubjectSink(out_csv, resume=resuming)
     print("\nMuestreando sujetos por clase...")
     print(f"País objetivo: {country_qid} | Idioma Wikipedia: {wiki_lang}")
     print(f"Clases cargadas: {list(clases.keys())}\n")
+    if resuming:
+        print(f"(reanudando desde {ckpt.path.name}: {len(sink.seen)} sujetos ya escritos)\n")
 
-    for key, meta in clases.items():
-        start = time()
-        print("- Clase:", key)
-        occs = meta.get("ocupaciones") or meta.get("occupations") or []
-        if not occs:
-            print("  (sin ocupaciones definidas)")
-            continue
-
-        occ_str = " ".join(f"wd:{q}" for q in occs)
-        q = SPARQL_TEMPLATE.format(
-            occupations=occ_str,
-            country_qid=country_qid,
-            wiki_lang=wiki_lang,
-            limit=limit_per_class
-        )
-
-        # --- envolvemos la query con try/except por clase ---
-        try:
-            data = run_sparql(q, sleep_s=sleep_s, timeout_s=timeout_s, retries=retries)
-        except Exception as e:
-            print(f"  [error] clase '{key}' falló tras reintentos: {e}")
-            continue
-
-        n_bind = 0
-        for b in data["results"]["bindings"]:
-            qid = b["person"]["value"].split("/")[-1]
-            art = b.get("article", {}).get("value")
-            local_title = ""
-            if art:
-                local_title = art.split("/")[-1]
-            rows.append((qid, local_title, key))
-            n_bind += 1
-
-        elapsed = time() - start
-        print(f"  → Encontrados: {n_bind} (en {elapsed:.1f}s)")
-    return rows
-
-
-def write_csv(rows, out_csv: Path):
-    out_csv.parent.mkdir(parents=True, exist_ok=True)
-    with out_csv.open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["qid", "wiki_title", "clase"])
-        # dedup por qid (si aparece en varias ocupaciones)
-        seen = set()
-        for qid, title, clase in rows:
-            if qid in seen:
+    failed = False
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        for key, meta in clases.items():
+            start = time()
+            print("- Clase:", key)
+            occs = meta.get("ocupaciones") or meta.get("occupations") or []
+            if not occs:
+                print("  (sin ocupaciones definidas)")
+                continue
+            st = ckpt.state(key, occs)
+            if st["done"]:
+                print(f"  → ya completada ({sink.count(key)} sujetos)")
                 continue
-            seen.add(qid)
-            w.writerow([qid, title, clase])
+            before = sink.count(key)
+
+            # backend offline: misma selección resuelta sobre el índice local
+            if dump:
+                for qid, title in dump.sample_subjects(occs, country_qid, wiki_lang, limit_per_class):
+                    if sink.count(key) >= limit_per_class:
+                        break
+                    sink.add(qid, title, key)
+                st["done"] = True
+                sink.flush()
+                ckpt.save()
+                print(f"  → Encontrados: {sink.count(key) - before} (en {time() - start:.1f}s, offline)")
+                continue
+
+            failed_occs: list[str] = []
+            size = min(page_size, max(1, limit_per_class))
+            while sink.count(key) < limit_per_class:
+                active = [o for o in occs if not st["occupations"][o]["exhausted"]]
+                if not active:
+                    break
+                futs = [pool.submit(_fetch_page, o, st["occupations"][o]["after"], country_qid,
+                                    wiki_lang, size, timeout_s, retries) for o in active]
+                for occ, fut in zip(active, futs):
+                    cur = st["occupations"][occ]
+                    try:
+                        page = fut.result()
+                    except Exception as e:
+                        print(f"  [error] ocupación {occ} ('{key}') falló tras reintentos: {e}")
+                        cur["exhausted"] = True
+                        failed_occs.append(occ)
+                        continue
+                    for iri, qid, title in page:
+                        if sink.count(key) >= limit_per_class:
+                            break
+                        sink.add(qid, title, key)
+                        cur["after"] = iri
+                    else:
+                        if len(page) < size:
+                            cur["exhausted"] = True
+                sink.flush()
+                ckpt.save()
+
+            if failed_occs and sink.count(key) < limit_per_class:
+                # se reintentan al reanudar: las ocupaciones fallidas vuelven a quedar activas
+                failed = True
+                for occ in failed_occs:
+                    st["occupations"][occ]["exhausted"] = False
+            else:
+                st["done"] = True
+            ckpt.save()
+            print(f"  → Encontrados: {sink.count(key) - before} (en {time() - start:.1f}s)")
+    finally:
+        pool.shutdown(wait=True)
+        sink.close()
+
+    if failed:
+        print(f"\n[warn] hubo ocupaciones con errores; vuelve a ejecutar para reanudar ({ckpt.path.name}).")
+    else:
+        ckpt.remove()
+    return dict(sink.per_class)
+
 
 def main():
     ap = argparse.ArgumentParser(description="Muestreo de sujetos por clase desde Wikidata.")
     ap.add_argument("--country", help="QID, ISO-2/3 o nombre del país (según config/countries.yml). Ej: Q183, de, germany, alemania.")
     ap.add_argument("--wiki-lang", default="es", help="Idioma del artículo de Wikipedia (default: es).")
     ap.add_argument("--limit-per-class", type=int, default=50, help="Máximo de sujetos por clase (default: 50).")
-    ap.add_argument("--sleep", type=float, default=0.15, help="Sleep entre llamadas SPARQL (default: 0.12s).")
+    ap.add_argument("--sleep", type=float, help=argparse.SUPPRESS)   # obsoleto: el ritmo lo regula kg.wd.throttle
     ap.add_argument("--timeout", type=int, default=100, help="Timeout por request SPARQL en segundos (default: 90).")
     ap.add_argument("--retries", type=int, default=6, help="Reintentos por request (default: 6).")
+    ap.add_argument("--workers", type=int, default=4, help="Consultas por ocupación en paralelo (default: 4).")
+    ap.add_argument("--max-inflight", type=int, default=4, help="Máximo de requests simultáneas a WDQS (default: 4).")
+    ap.add_argument("--max-rps", type=float, default=0.0, help="Techo de requests por segundo (0 = sin techo: el ritmo se ajusta solo).")
+    ap.add_argument("--page-size", type=int, default=1000, help="Filas por página de cada ocupación (default: 1000).")
+    ap.add_argument("--restart", action="store_true", help="Ignora el checkpoint y vuelve a muestrear desde cero.")
+    ap.add_argument("--backend", choices=["wdqs", "dump"], help="Origen de datos: WDQS (default) o volcado truthy local indexado.")
+    ap.add_argument("--dump-db", help="SQLite del volcado indexado (kg.wd.dump). Default: data/wd_dump.sqlite.")
     args = ap.parse_args()
 
+    if args.backend == "dump":
+        use_dump(args.dump_db or DEFAULT_DUMP_DB)
+    configure_budget(max_inflight=args.max_inflight, max_rps=args.max_rps)
+
     # Resolver país: si pasan --country, se respeta; si no, se toma desde project.yml
     if args.country:
         try:
@@ -200,16 +332,18 @@ def main():
 
     out_csv = PROJECT_ROOT / "data" / f"subjects_{country_slug}.csv"
 
-    rows = sample_per_class(
+    counts = sample_per_class(
         country_qid=country_qid,
+        out_csv=out_csv,
         wiki_lang=args.wiki_lang,
         limit_per_class=args.limit_per_class,
-        sleep_s=args.sleep,
         timeout_s=args.timeout,
         retries=args.retries,
+        workers=args.workers,
+        page_size=args.page_size,
+        resume=not args.restart,
     )
-    write_csv(rows, out_csv)
-    print(f"\n✅ Guardado: {out_csv} ({len(rows)} filas antes de eliminar duplicados.)")
+    print(f"\n✅ Guardado: {out_csv} ({sum(counts.values())} sujetos únicos.)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,178 @@
+# src/kg/pipeline/validate.py
+from __future__ import annotations
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import os
+import sys
+import time
+
+from tqdm import tqdm
+
+from kg.wd.reader import graph_files, iter_triples
+from kg.wd.shacl import ShapeSet, TripleIndex, validate_native, validate_pyshacl
+from kg.wd.utils import PROJECT_ROOT
+
+# Validación SHACL masiva de la salida del pipeline (graphs/{pais}/full, archivos consolidados...).
+# Cada proceso del pool compila las shapes una sola vez y valida lotes de archivos; el
+# resultado es un reporte agregado (validation_report.json) con conteos por shape,
+# restricción y severidad, los archivos que no conforman y una muestra de violaciones.
+
+DEFAULT_SHAPES = PROJECT_ROOT / "config" / "shapes.ttl"
+
+_SHAPES: ShapeSet | None = None
+_PYSHACL_ERROR: str | None = None
+
+
+def _init(shapes_path: str, country_qid: str | None = None) -> None:
+    global _SHAPES, _PYSHACL_ERROR
+    _SHAPES = ShapeSet(shapes_path, country_qid=country_qid)
+    _PYSHACL_ERROR = None
+    if _SHAPES.complex_ttl:
+        try:
+            import pyshacl  # noqa: F401
+        except ImportError:
+            _PYSHACL_ERROR = "pyshacl no está instalado: las shapes complejas no se validaron"
+
+
+def _validate_file(path: str) -> dict:
+    shapes = _SHAPES
+    try:
+        idx = TripleIndex(iter_triples(path), preds=shapes.target_preds)
+        n_focus, violations = validate_native(idx, shapes.native)
+        if shapes.complex_ttl and not _PYSHACL_ERROR:
+            violations += validate_pyshacl(path, shapes)
+        return {"file": path, "triples": idx.triples, "focus": n_focus, "violations": violations}
+    except Exception as e:
+        return {"file": path, "triples": 0, "focus": 0, "violations": [], "error": f"{type(e).__name__}: {e}"}
+
+
+def _validate_chunk(paths: list[str]) -> list[dict]:
+    return [_validate_file(p) for p in paths]
+
+
+def validate_paths(paths, shapes_path: Path | str = DEFAULT_SHAPES, *, country_qid: str | None = None,
+                   workers: int = 0, chunk: int = 64, report_path: Path | str | None = None,
+                   samples: int = 200, progress: bool = True) -> dict:
+    """
+    Valida todos los grafos de `paths` (archivos o directorios) y devuelve el reporte agregado;
+    si se pasa `report_path`, lo escribe también como JSON. workers=0 usa un proceso por CPU.
+    `country_qid` es el país de los grafos (reemplaza `ex:TargetCountry` en las shapes).
+    """
+    t0 = time.perf_counter()
+    files = [str(f) for f in graph_files(paths)]
+    workers = workers or os.cpu_count() or 1
+    _init(str(shapes_path), country_qid)   # compila también en el proceso principal (errores de shapes antes del pool)
+    chunks = [files[i:i + chunk] for i in range(0, len(files), max(1, chunk))]
+
+    counts = Counter()
+    by_shape: dict[str, Counter] = {}
+    by_constraint, by_severity = Counter(), Counter()
+    failing, errors, sample = [], [], []
+    pbar = tqdm(total=len(files), desc="Validación SHACL", disable=not progress)
+
+    def _consume(results: list[dict]) -> None:
+        for r in results:
+            counts["files"] += 1
+            counts["triples"] += r["triples"]
+            counts["focus"] += r["focus"]
+            if r.get("error"):
+                errors.append({"file": r["file"], "error": r["error"]})
+            v = r["violations"]
+            if v:
+                failing.append({"file": r["file"], "violations": len(v)})
+            for x in v:
+                counts["violations"] += 1
+                by_shape.setdefault(x["shape"], Counter())[x["severity"]] += 1
+                by_constraint[x["constraint"]] += 1
+                by_severity[x["severity"]] += 1
+                if len(sample) < samples:
+                    sample.append({"file": r["file"], **x})
+        pbar.update(len(results))
+
+    try:
+        if workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init, initargs=(str(shapes_path), country_qid)) as ex:
+                for results in ex.map(_validate_chunk, chunks):
+                    _consume(results)
+        else:
+            for c in chunks:
+                _consume(_validate_chunk(c))
+    finally:
+        pbar.close()
+
+    report = {
+        "shapes": str(shapes_path),
+        "country": country_qid,
+        "conforms": by_severity.get("Violation", 0) == 0 and not errors,
+        "files": counts["files"],
+        "files_failing": len(failing),
+        "triples": counts["triples"],
+        "focus_nodes": counts["focus"],
+        "violations": counts["violations"],
+        "by_severity": dict(by_severity),
+        "by_constraint": dict(by_constraint.most_common()),
+        "by_shape": {k: dict(v) for k, v in sorted(by_shape.items())},
+        "compiled": _SHAPES.summary(),
+        "warnings": _SHAPES.warnings + ([_PYSHACL_ERROR] if _PYSHACL_ERROR else []),
+        "errors": errors,
+        "failing": sorted(failing, key=lambda f: (-f["violations"], f["file"])),
+        "samples": sample,
+        "workers": workers,
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
+    if report_path:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = report_path.with_name(report_path.name + f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(tmp, report_path)
+    return report
+
+
+def print_summary(report: dict) -> None:
+    mark = "✅" if report["conforms"] else "❌"
+    print(f"{mark} {report['files']:,} archivos · {report['triples']:,} tripletas · "
+          f"{report['focus_nodes']:,} nodos foco · {report['violations']:,} violaciones "
+          f"({report['files_failing']:,} archivos) en {report['elapsed_s']:.1f}s")
+    for k, v in report["by_constraint"].items():
+        print(f"   {k}: {v:,}")
+    for w in report["warnings"]:
+        print(f"[warn] {w}")
+    if report["errors"]:
+        print(f"[warn] {len(report['errors'])} archivos no se pudieron leer (ver 'errors' en el reporte).")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Validación SHACL masiva de los grafos generados.")
+    ap.add_argument("paths", nargs="+", help="Archivos .ttl/.nt/.nq (o .gz) o directorios (ej. graphs/usa/full).")
+    ap.add_argument("--shapes", default=str(DEFAULT_SHAPES), help="Archivo de shapes (default: config/shapes.ttl).")
+    ap.add_argument("--country", help="País de los grafos (QID, ISO o nombre): reemplaza ex:TargetCountry en las shapes.")
+    ap.add_argument("--workers", type=int, default=0, help="Procesos del pool (default: uno por CPU).")
+    ap.add_argument("--chunk", type=int, default=64, help="Archivos por tarea del pool (default: 64).")
+    ap.add_argument("--report", help="Ruta del reporte JSON (default: validation_report.json junto al primer path).")
+    ap.add_argument("--samples", type=int, default=200, help="Violaciones de muestra en el reporte (default: 200).")
+    ap.add_argument("--strict", action="store_true", help="Termina con código 1 si el grafo no conforma.")
+    args = ap.parse_args()
+
+    first = Path(args.paths[0])
+    report_path = Path(args.report) if args.report else first.parent / "validation_report.json"
+    country_qid = None
+    if args.country:
+        from kg.wd.country import resolve_country_id
+        try:
+            country_qid = resolve_country_id(args.country)
+        except Exception as e:
+            raise SystemExit(f"[error] No fue posible resolver el país '{args.country}': {e}")
+    report = validate_paths(args.paths, args.shapes, country_qid=country_qid, workers=args.workers,
+                            chunk=args.chunk, report_path=report_path, samples=args.samples)
+    print_summary(report)
+    print(f"📋 Reporte: {report_path}")
+    if args.strict and not report["conforms"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# src/kg/store/csr.py
+from __future__ import annotations
+from pathlib import Path
+from array import array
+from typing import Iterable, Iterator
+import argparse
+import json
+
+import numpy as np
+
+from kg.wd.reader import Lit, graph_files, iter_triples
+from kg.wd.writer import RDFS_LABEL, WD, WDT
+
+# Almacén compacto en memoria para el KG de un país:
+#   - QIDs y PIDs internados como enteros (int32) → índices densos.
+#   - Aristas en CSR (compressed sparse row) salientes y entrantes, ordenadas por propiedad.
+#   - Se guarda como .npy sueltos y se carga con memmap (sin copiar a RAM).
+
+_ARRAYS = ("nodes", "props", "out_indptr", "out_dst", "out_prop", "in_indptr", "in_src", "in_prop")
+
+
+# --------------------------------------------------------------------------------------
+# Lectura de la salida del pipeline
+# --------------------------------------------------------------------------------------
+_ENTITY = WD + "Q"
+_DIRECT = WDT + "P"
+
+
+def _edges(paths: Iterable[Path | str], labels: dict[str, str] | None = None) -> Iterator[tuple[int, int, int]]:
+    """
+    Recorre los archivos con kg.wd.reader.iter_triples y emite las aristas wdt:P entre
+    entidades (Q sujeto, P, Q objeto) como enteros. Si se pasa `labels`, se llena con las
+    rdfs:label encontradas.
+    """
+    for p in paths:
+        for s, pr, o in iter_triples(p):
+            if not isinstance(s, str) or not s.startswith(_ENTITY):
+                continue
+            if pr.startswith(_DIRECT) and isinstance(o, str) and o.startswith(_ENTITY):
+                yield int(s[len(_ENTITY):]), int(pr[len(_DIRECT):]), int(o[len(_ENTITY):])
+            elif labels is not None and pr == RDFS_LABEL and isinstance(o, Lit):
+                labels.setdefault(s[len(WD):], o.value)
+
+
+# --------------------------------------------------------------------------------------
+# Store
+# --------------------------------------------------------------------------------------
+class CSRGraph:
+    """
+    KG con nodos/propiedades internados y adyacencia CSR en ambos sentidos.
+
+    nodes[i]  = número de QID del nodo i          (int32, ordenado)
+    props[j]  = número de PID de la propiedad j   (int32, ordenado)
+    out_indptr[i]:out_indptr[i+1] → out_dst / out_prop de las aristas salientes de i
+    in_indptr[i]:in_indptr[i+1]   → in_src / in_prop de las aristas entrantes a i
+    (dentro de cada nodo, ordenadas por propiedad y luego por vecino)
+    """
+
+    def __init__(self, nodes, props, out_indptr, out_dst, out_prop, in_indptr, in_src, in_prop,
+                 labels: dict[str, str] | None = None):
+        self.nodes, self.props = nodes, props
+        self.out_indptr, self.out_dst, self.out_prop = out_indptr, out_dst, out_prop
+        self.in_indptr, self.in_src, self.in_prop = in_indptr, in_src, in_prop
+        self.labels = labels or {}
+
+    # ---- construcción ----
+    @classmethod
+    def from_edges(cls, src, prop, dst, labels: dict[str, str] | None = None) -> "CSRGraph":
+        """Construye desde arrays (o listas) de números de QID/PID; deduplica aristas."""
+        src = np.asarray(src, dtype=np.int64)
+        prop = np.asarray(prop, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+
+        nodes = np.unique(np.concatenate([src, dst])).astype(np.int32)
+        props = np.unique(prop).astype(np.int32)
+        s = np.searchsorted(nodes, src).astype(np.int32)
+        d = np.searchsorted(nodes, dst).astype(np.int32)
+        p = np.searchsorted(props, prop).astype(np.int32)
+
+        if len(s):
+            # deduplicar (s, p, d) empaquetando en un entero de 64 bits por clave
+            n, k = np.int64(len(nodes)), np.int64(max(len(props), 1))
+            key = np.unique((s.astype(np.int64) * k + p) * n + d)
+            d = (key % n).astype(np.int32)
+            sp = key // n
+            p = (sp % k).astype(np.int32)
+            s = (sp // k).astype(np.int32)
+
+        out_indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(s, minlength=len(nodes)), out=out_indptr[1:])
+        # `key` ya quedó ordenada por (s, p, d)
+        out_dst, out_prop = d, p
+
+        order = np.lexsort((s, p, d))              # por (d, p, s)
+        in_indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(d, minlength=len(nodes)), out=in_indptr[1:])
+        in_src, in_prop = s[order], p[order]
+        return cls(nodes, props, out_indptr, out_dst, out_prop, in_indptr, in_src, in_prop, labels)
+
+    @classmethod
+    def from_files(cls, paths: Iterable[Path | str], with_labels: bool = True) -> "CSRGraph":
+        labels: dict[str, str] | None = {} if with_labels else None
+        flat = array("q")
+        for t in _edges(paths, labels):
+            flat.extend(t)
+        trip = np.frombuffer(flat, dtype=np.int64).reshape(-1, 3)
+        return cls.from_edges(trip[:, 0], trip[:, 1], trip[:, 2], labels)
+
+    @classmethod
+    def from_dir(cls, src: Path | str, with_labels: bool = True) -> "CSRGraph":
+        """Carga graphs/{country}/full/ (TTL por sujeto) o un .nt/.nq consolidado."""
+        return cls.from_files(graph_files(src), with_labels=with_labels)
+
+    # ---- persistencia ----
+    def save(self, out_dir: Path | str) -> Path:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(out_dir / f"{name}.npy", getattr(self, name))
+        if self.labels:
+            (out_dir / "labels.json").write_text(json.dumps(self.labels, ensure_ascii=False), encoding="utf-8")
+        return out_dir
+
+    @classmethod
+    def load(cls, in_dir: Path | str, mmap: bool = True) -> "CSRGraph":
+        in_dir = Path(in_dir)
+        arrs = {n: np.load(in_dir / f"{n}.npy", mmap_mode="r" if mmap else None) for n in _ARRAYS}
+        lp = in_dir / "labels.json"
+        labels = json.loads(lp.read_text(encoding="utf-8")) if lp.exists() else None
+        return cls(**arrs, labels=labels)
+
+    # ---- identificadores ----
+    @property
+    def num_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.out_dst)
+
+    def node_index(self, qids) -> np.ndarray:
+        """QID(s) ("Q42" o 42) → índice(s); -1 si no está en el grafo."""
+        nums = np.asarray([int(str(q).lstrip("Q")) for q in np.atleast_1d(qids)], dtype=np.int64)
+        if not len(self.nodes):
+            return np.full(len(nums), -1, dtype=np.int64)
+        idx = np.clip(np.searchsorted(self.nodes, nums), 0, len(self.nodes) - 1)
+        return np.where(self.nodes[idx] == nums, idx, -1)
+
+    def prop_index(self, pid: str | int) -> int:
+        num = int(str(pid).lstrip("P"))
+        j = int(np.searchsorted(self.props, num))
+        return j if j < len(self.props) and self.props[j] == num else -1
+
+    def qid(self, idx) -> list[str]:
+        return [f"Q{n}" for n in self.nodes[np.atleast_1d(idx)]]
+
+    # ---- consultas ----
+    def neighbors(self, qid: str, direction: str = "out", pid: str | None = None) -> list[str]:
+        """Vecinos salientes ("out") o entrantes ("in") de un nodo, opcionalmente por propiedad."""
+        i = int(self.node_index(qid)[0])
+        if i < 0:
+            return []
+        if direction == "out":
+            a, b = self.out_indptr[i], self.out_indptr[i + 1]
+            other, props = self.out_dst[a:b], self.out_prop[a:b]
+        else:
+            a, b = self.in_indptr[i], self.in_indptr[i + 1]
+            other, props = self.in_src[a:b], self.in_prop[a:b]
+        if pid is not None:
+            j = self.prop_index(pid)
+            other = other[props == j]
+        return self.qid(other)
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.out_indptr)
+
+    def in_degree(self) -> np.ndarray:
+        return np.diff(self.in_indptr)
+
+    def edge_sources(self) -> np.ndarray:
+        """Índice de nodo origen de cada arista (alineado con out_dst/out_prop)."""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), self.out_degree())
+
+    def edges_with_property(self, pid: str | int) -> tuple[np.ndarray, np.ndarray]:
+        """(src, dst) de todas las aristas con la propiedad dada (vectorizado)."""
+        j = self.prop_index(pid)
+        mask = self.out_prop == j
+        return self.edge_sources()[mask], np.asarray(self.out_dst)[mask]
+
+    def property_counts(self) -> dict[str, int]:
+        counts = np.bincount(self.out_prop, minlength=len(self.props))
+        return {f"P{p}": int(c) for p, c in zip(self.props, counts)}
+
+    def top_nodes(self, k: int = 10, direction: str = "in") -> list[tuple[str, int]]:
+        deg = self.in_degree() if direction == "in" else self.out_degree()
+        k = min(k, len(deg))
+        if not k:
+            return []
+        top = np.argpartition(-deg, k - 1)[:k]
+        top = top[np.argsort(-deg[top], kind="stable")]
+        return [(q, int(d)) for q, d in zip(self.qid(top), deg[top])]
+
+    def stats(self) -> dict:
+        out_d, in_d = self.out_degree(), self.in_degree()
+        return {
+            "nodes": self.num_nodes,
+            "edges": self.num_edges,
+            "properties": len(self.props),
+            "subjects": int((out_d > 0).sum()),
+            "max_out_degree": int(out_d.max()) if len(out_d) else 0,
+            "max_in_degree": int(in_d.max()) if len(in_d) else 0,
+            "mean_out_degree_subjects": float(out_d[out_d > 0].mean()) if (out_d > 0).any() else 0.0,
+            "bytes": int(sum(getattr(self, n).nbytes for n in _ARRAYS)),
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Carga el KG de un país en un store CSR compacto.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="Lee TTL/NT/NQ y guarda los arrays .npy.")
+    b.add_argument("--src", required=True, help="graphs/{country}/full/ o un archivo .nt/.nq(.gz) consolidado.")
+    b.add_argument("--out", required=True, help="Directorio de salida (ej. graphs/{country}/csr/).")
+    b.add_argument("--no-labels", action="store_true")
+    s = sub.add_parser("stats", help="Estadísticas de un store ya construido.")
+    s.add_argument("--dir", required=True)
+    s.add_argument("--top", type=int, default=10)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        g = CSRGraph.from_dir(args.src, with_labels=not args.no_labels)
+        g.save(args.out)
+        print(json.dumps(g.stats(), indent=2))
+        print(f"✅ Store CSR: {args.out}")
+    else:
+        g = CSRGraph.load(args.dir)
+        print(json.dumps(g.stats(), indent=2))
+        print("Nodos con más aristas entrantes:")
+        for q, d in g.top_nodes(args.top):
+            print(f"  {q:>12}  {d:>8}  {g.labels.get(q, '')}")
+
+
+if __name__ == "__main__":
+    main()
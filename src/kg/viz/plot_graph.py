@@ -1,77 +1,222 @@
+import hashlib
 import textwrap
+
 import matplotlib.pyplot as plt
 import networkx as nx
-from rdflib import Graph, URIRef, Namespace, RDFS
+import numpy as np
+from matplotlib.collections import LineCollection
+from rdflib import Namespace
+from kg.wd.label_store import resolve_labels
+from kg.wd.reader import Lit, graph_files, iter_triples
+from kg.wd.utils import DATA_ROOT
+from kg.wd.writer import RDFS_LABEL, WD
 
 WDT = Namespace("http://www.wikidata.org/prop/direct/")
 
-def _qid(uri: str) -> str:
-    return uri.rsplit("/", 1)[-1]
+# layouts calculados (uno por grafo y parámetros), para no recalcularlos en cada llamada
+LAYOUT_DIR = DATA_ROOT / "layouts"
+
+def _num(x: str) -> int:
+    return int(x[1:]) if x[1:].isdigit() else -1
+
+# --------------------------------------------------------------------------------------
+# Lectura en una sola pasada (aristas wdt: + índice de etiquetas)
+# --------------------------------------------------------------------------------------
+class GraphData:
+    """
+    Aristas (s, P, o) entre QIDs y etiquetas rdfs:label, con índices enteros en arreglos numpy
+    (src, dst) para calcular grados, muestreos y layouts sin construir un grafo de networkx.
+    """
+
+    def __init__(self, edges: list[tuple[str, str, str]], labels: dict[str, str]):
+        key = lambda t: (_num(t[0]), _num(t[2]), _num(t[1]), t)
+        self.edges = sorted(set(edges), key=key)
+        self.labels = labels
+        self.nodes = sorted({x for s, _, o in self.edges for x in (s, o)}, key=lambda q: (_num(q), q))
+        self.index = {q: i for i, q in enumerate(self.nodes)}
+        self.src = np.fromiter((self.index[s] for s, _, _ in self.edges), dtype=np.int64, count=len(self.edges))
+        self.dst = np.fromiter((self.index[o] for _, _, o in self.edges), dtype=np.int64, count=len(self.edges))
+
+    def degree(self) -> np.ndarray:
+        n = len(self.nodes)
+        return np.bincount(self.src, minlength=n) + np.bincount(self.dst, minlength=n)
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha1()
+        for s, _, o in self.edges:
+            h.update(f"{s} {o}\n".encode())
+        return h.hexdigest()
+
+
+def load_graph(paths) -> GraphData:
+    """
+    Lee uno o varios grafos (archivo, lista o directorio; .ttl/.nt/.nq, opcionalmente .gz)
+    en una sola pasada (kg.wd.reader: parser propio para la salida del pipeline, rdflib
+    para cualquier otro Turtle).
+    """
+    edges: list[tuple[str, str, str]] = []
+    labels: dict[str, str] = {}
+    wdt = str(WDT)
+    for path in graph_files(paths):
+        for s, p, o in iter_triples(path):
+            if not s.startswith(WD):
+                continue
+            if p.startswith(wdt) and isinstance(o, str) and o.startswith(WD + "Q"):
+                edges.append((s[len(WD):], p[len(wdt):], o[len(WD):]))
+            elif p == RDFS_LABEL and isinstance(o, Lit):
+                labels.setdefault(s[len(WD):], o.value)
+    return GraphData(edges, labels)
 
-def _pid(uri: str) -> str:
-    return uri.rsplit("/", 1)[-1]
 
-def plot_graph_degree1_labeled(ttl_path, max_edges=40, figsize=(13, 10), wrap_width=18, fetch_missing_labels=True):
+def downsample(data: GraphData, max_nodes: int | None = None, props=None, keep=()) -> GraphData:
+    """
+    Reduce el grafo para dibujarlo:
+    - props: solo aristas con esas propiedades (p. ej. {"P69", "P108"}).
+    - max_nodes: conserva los nodos de mayor grado (más los de `keep`) y las aristas entre ellos.
+    """
+    if props:
+        props = set(props)
+        data = GraphData([e for e in data.edges if e[1] in props], data.labels)
+    if max_nodes and len(data.nodes) > max_nodes:
+        deg = data.degree()
+        order = np.lexsort((np.arange(len(deg)), -deg))   # grado descendente, estable
+        kept = np.zeros(len(deg), dtype=bool)
+        kept[order[:max_nodes]] = True
+        for q in keep:
+            if q in data.index:
+                kept[data.index[q]] = True
+        mask = kept[data.src] & kept[data.dst]
+        data = GraphData([e for e, k in zip(data.edges, mask) if k], data.labels)
+    return data
+
+# --------------------------------------------------------------------------------------
+# Layout (vectorizado, con caché en disco)
+# --------------------------------------------------------------------------------------
+def _radial_layout(data: GraphData) -> np.ndarray:
+    """Grafo estrella (grado-1): el sujeto al centro y los objetos en círculo, agrupados por propiedad."""
+    pos = np.zeros((len(data.nodes), 2))
+    root = data.src[0]
+    objs = list(dict.fromkeys(int(d) for d in data.dst if d != root))
+    ang = np.linspace(0, 2 * np.pi, len(objs), endpoint=False)
+    pos[objs] = np.c_[np.cos(ang), np.sin(ang)]
+    return pos
+
+
+def _fr_layout(n: int, src: np.ndarray, dst: np.ndarray, iterations: int = 50, seed: int = 42,
+               sample: int = 64, chunk: int = 4096) -> np.ndarray:
+    """
+    Fruchterman–Reingold vectorizado con numpy. La repulsión se calcula contra una muestra
+    de `sample` nodos por iteración (O(n·sample) en lugar de O(n²)) y se escala a n;
+    con grafos pequeños se usan todos los nodos (exacto). La atracción va por las aristas.
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2)) - 0.5
+    if n < 2:
+        return pos
+    k = 1.0 / np.sqrt(n)
+    t = 0.1
+    exact = n - 1 <= sample
+    for _ in range(iterations):
+        disp = np.zeros_like(pos)
+        idx = np.arange(n) if exact else rng.integers(0, n, size=sample)
+        scale = 1.0 if exact else (n - 1) / sample
+        other = pos[idx]
+        for a in range(0, n, chunk):
+            p = pos[a:a + chunk]
+            # Σ_j (p_i - o_j)·w_ij = p_i·Σ_j w_ij - (W @ O)_i, con w_ij = k² / d²_ij
+            w = k * k / ((p[:, :1] - other[:, 0]) ** 2 + (p[:, 1:] - other[:, 1]) ** 2 + 1e-9)
+            disp[a:a + chunk] += (p * w.sum(1)[:, None] - w @ other) * scale
+        delta = pos[src] - pos[dst]
+        f = delta * (np.sqrt((delta ** 2).sum(1)) / k)[:, None]
+        for c in (0, 1):   # bincount con pesos: mucho más rápido que np.add.at
+            disp[:, c] += np.bincount(dst, f[:, c], minlength=n) - np.bincount(src, f[:, c], minlength=n)
+        length = np.sqrt((disp ** 2).sum(1)) + 1e-9
+        pos += disp * (np.minimum(length, t) / length)[:, None]
+        t = max(t - 0.1 / (iterations + 1), 1e-4)
+    pos -= pos.mean(0)
+    return pos / (np.abs(pos).max() or 1.0)
+
+
+def compute_layout(data: GraphData, method: str = "auto", iterations: int = 50, seed: int = 42,
+                   cache: bool = True) -> dict[str, tuple[float, float]]:
+    """
+    Posiciones {QID: (x, y)}. method: "radial" (estrella), "spring" (FR vectorizado) o "auto".
+    Con `cache`, el resultado se guarda en data/layouts/{hash}.npz y se reutiliza.
+    """
+    if not data.nodes:
+        return {}
+    if method == "auto":
+        method = "radial" if len(set(data.src.tolist())) == 1 else "spring"
+    path = None
+    if cache:
+        key = hashlib.sha1(f"{data.fingerprint()}|{method}|{iterations}|{seed}".encode()).hexdigest()
+        path = LAYOUT_DIR / f"{key}.npz"
+        if path.exists():
+            with np.load(path) as z:
+                return dict(zip(z["nodes"].tolist(), map(tuple, z["pos"].tolist())))
+    if method == "radial":
+        pos = _radial_layout(data)
+    else:
+        pos = _fr_layout(len(data.nodes), data.src, data.dst, iterations=iterations, seed=seed)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez_compressed(tmp, nodes=np.array(data.nodes), pos=pos)
+        tmp.replace(path)
+    return dict(zip(data.nodes, map(tuple, pos.tolist())))
+
+# --------------------------------------------------------------------------------------
+# Dibujo
+# --------------------------------------------------------------------------------------
+def _node_labels(qids, known: dict[str, str], fetch: bool, label_langs: str) -> dict[str, str]:
+    out = {q: known[q] for q in qids if q in known}
+    missing = [q for q in qids if q not in out]
+    if fetch and missing:
+        try:
+            out.update(resolve_labels(missing, langs=label_langs))
+        except Exception:
+            pass
+    return out
+
+
+def _prop_labels(pids, fetch: bool, label_langs: str) -> dict[str, str]:
+    # etiquetas de propiedades desde el store persistente (caché SQLite, sin consultas repetidas)
+    pids = set(pids)
+    try:
+        return resolve_labels(pids, langs=label_langs) if fetch else {}
+    except Exception:
+        return {p: p for p in pids}
+
+
+def plot_graph_degree1_labeled(ttl_path, max_edges=40, figsize=(13, 10), wrap_width=18, fetch_missing_labels=True,
+                               label_langs="es,en"):
     """
     Dibuja un grafo RDF grado-1 mostrando nombres de entidades y propiedades.
     - Divide etiquetas largas (wrap_width)
     - Desplaza texto de los nodos hacia abajo para mejorar legibilidad.
+    - Etiquetas de propiedades desde el store persistente (kg.wd.label_store).
     """
-    g = Graph()
-    g.parse(ttl_path, format="turtle")
-
-    # --- Construcción del grafo ---
-    G = nx.DiGraph()
-    node_labels = {}
-    for s, p, o in g.triples((None, None, None)):
-        if isinstance(s, URIRef) and isinstance(o, URIRef):
-            for n in (s, o):
-                lab = g.value(n, RDFS.label)
-                if lab:
-                    node_labels[str(n)] = str(lab)
-            if str(p).startswith(str(WDT)):
-                G.add_edge(str(s), str(o), pid=_pid(str(p)))
-
-    if not G.edges:
+    data = load_graph(ttl_path)
+    if not data.edges:
         raise ValueError("No se encontraron aristas 'wdt:' en el grafo.")
+    sub = GraphData(data.edges[:max_edges], data.labels)
 
-    edges = list(G.edges(data=True))[:max_edges]
+    # --- Construcción del grafo ---
     H = nx.DiGraph()
-    for u, v, d in edges:
-        H.add_edge(u, v, **d)
+    for s, p, o in sub.edges:
+        H.add_edge(s, o, pid=p)
 
     # --- Etiquetas ---
+    node_labels = _node_labels(list(H.nodes()), data.labels, fetch_missing_labels, label_langs)
     final_node_labels = {
-        n: "\n".join(textwrap.wrap(node_labels.get(n, _qid(n)), width=wrap_width))
+        n: "\n".join(textwrap.wrap(node_labels.get(n, n), width=wrap_width))
         for n in H.nodes()
     }
-
-    # Si faltan labels de propiedades
-    pids = {d["pid"] for _, _, d in H.edges(data=True)}
-    try:
-        from SPARQLWrapper import SPARQLWrapper, JSON
-        values = " ".join(f"wd:{p}" for p in pids)
-        query = f"""
-        SELECT ?p ?pLabel WHERE {{
-          VALUES ?p {{ {values} }}
-          SERVICE wikibase:label {{ bd:serviceParam wikibase:language "es,en". }}
-        }}
-        """
-        sp = SPARQLWrapper("https://query.wikidata.org/sparql")
-        sp.setReturnFormat(JSON)
-        sp.setQuery(query)
-        result = sp.query().convert()
-        pid_labels = {
-            b["p"]["value"].split("/")[-1]: b["pLabel"]["value"]
-            for b in result["results"]["bindings"]
-        }
-    except Exception:
-        pid_labels = {p: p for p in pids}
-
+    pid_labels = _prop_labels((d["pid"] for _, _, d in H.edges(data=True)), fetch_missing_labels, label_langs)
     edge_labels = {(u, v): pid_labels.get(d["pid"], d["pid"]) for u, v, d in H.edges(data=True)}
 
     # --- Dibujo ---
-    pos = nx.spring_layout(H, k=0.7, seed=42)
+    pos = compute_layout(sub)
     plt.figure(figsize=figsize)
     nx.draw(
         H, pos,
@@ -90,3 +235,47 @@ def plot_graph_degree1_labeled(ttl_path, max_edges=40, figsize=(13, 10), wrap_wi
     plt.title(f"Grafo RDF (nodos={H.number_of_nodes()}, aristas={H.number_of_edges()})", fontsize=12)
     plt.axis("off")
     plt.show()
+
+
+def plot_graph(paths, max_nodes=5000, props=None, keep=(), max_labels=40, figsize=(14, 12),
+               wrap_width=18, layout="auto", iterations=50, fetch_missing_labels=True,
+               label_langs="es,en", show=True):
+    """
+    Dibuja grafos grandes (un país completo: directorio de .ttl o un .nt/.nq consolidado).
+    - Muestreo por grado (`max_nodes`) y/o por propiedad (`props`).
+    - Layout vectorizado con caché en disco (`compute_layout`).
+    - Aristas como LineCollection y nodos como scatter (tamaño según grado);
+      solo se etiquetan los `max_labels` nodos de mayor grado.
+    Devuelve la figura de matplotlib.
+    """
+    data = downsample(load_graph(paths), max_nodes=max_nodes, props=props, keep=keep)
+    if not data.edges:
+        raise ValueError("No se encontraron aristas 'wdt:' en el grafo.")
+    pos_d = compute_layout(data, method=layout, iterations=iterations)
+    pos = np.array([pos_d[q] for q in data.nodes])
+    deg = data.degree()
+
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.add_collection(LineCollection(np.stack([pos[data.src], pos[data.dst]], axis=1),
+                                     colors="#333333", linewidths=0.3, alpha=0.4))
+    ax.scatter(pos[:, 0], pos[:, 1], s=4 + 40 * np.sqrt(deg / max(deg.max(), 1)),
+               c="#a0cbe2", edgecolors="#4a7fa8", linewidths=0.3, zorder=2)
+
+    top = [data.nodes[i] for i in np.argsort(-deg, kind="stable")[:max_labels]]
+    labels = _node_labels(top, data.labels, fetch_missing_labels, label_langs)
+    for q in top:
+        x, y = pos_d[q]
+        ax.text(x, y - 0.02, "\n".join(textwrap.wrap(labels.get(q, q), width=wrap_width)),
+                fontsize=7, ha="center", va="top", zorder=3)
+    if len(data.edges) <= 60:
+        pid_labels = _prop_labels((p for _, p, _ in data.edges), fetch_missing_labels, label_langs)
+        for (s, p, o), a, b in zip(data.edges, data.src, data.dst):
+            (x1, y1), (x2, y2) = pos[a], pos[b]
+            ax.text((x1 + x2) / 2, (y1 + y2) / 2, pid_labels.get(p, p), fontsize=6, color="#555555")
+
+    ax.set_title(f"Grafo RDF (nodos={len(data.nodes):,}, aristas={len(data.edges):,})", fontsize=12)
+    ax.autoscale()
+    ax.set_axis_off()
+    if show:
+        plt.show()
+    return fig
@@ -0,0 +1,206 @@
+# src/kg/viz/tiles.py
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import gzip
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from kg.viz.plot_graph import GraphData, compute_layout, downsample, load_graph
+
+# Exportación interactiva para grafos de país completos: layout y estadísticas se calculan
+# offline y nodos/aristas se escriben en teselas JSON comprimidas por celda espacial y nivel
+# de detalle (quadtree). El visor estático (tile_viewer.html) carga solo las teselas visibles.
+#
+#   out/index.html
+#   out/manifest.json                 límites, niveles, teselas existentes, propiedades, estadísticas
+#   out/tiles/{z}/{x}_{y}.json.gz     {"nodes": [[qid, x, y, grado, comunidad, etiqueta], ...],
+#                                      "edges": [[x1, y1, x2, y2, i_prop], ...]}
+#
+# Cada nodo se guarda una sola vez, en el nivel z que le corresponde: el nivel 0 tiene los
+# nodos de mayor grado de todo el grafo y cada nivel siguiente agrega, por celda, los
+# siguientes `per_tile` de mayor grado. Una arista va en la tesela de su extremo más profundo.
+
+VIEWER = Path(__file__).with_name("tile_viewer.html")
+
+
+def label_propagation(n: int, src: np.ndarray, dst: np.ndarray, iterations: int = 10) -> np.ndarray:
+    """
+    Comunidades por propagación de etiquetas (vectorizada): cada nodo toma la etiqueta más
+    frecuente entre sus vecinos y la suya (empates → la menor). Devuelve ids 0..k-1 por tamaño.
+    """
+    labels = np.arange(n)
+    if n == 0:
+        return labels
+    a = np.concatenate([src, dst, np.arange(n)])
+    b = np.concatenate([dst, src, np.arange(n)])
+    for _ in range(iterations):
+        keys, counts = np.unique(a * n + labels[b], return_counts=True)
+        node, lab = keys // n, keys % n
+        order = np.lexsort((lab, -counts, node))
+        first = np.r_[True, node[order][1:] != node[order][:-1]]
+        new = labels.copy()
+        new[node[order][first]] = lab[order][first]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    _, inv, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty_like(sizes)
+    rank[np.lexsort((np.arange(len(sizes)), -sizes))] = np.arange(len(sizes))
+    return rank[inv]
+
+
+def assign_levels(pos: np.ndarray, deg: np.ndarray, per_tile: int, max_level: int) -> np.ndarray:
+    """Nivel de detalle de cada nodo: por celda del nivel z, los `per_tile` de mayor grado aún sin nivel."""
+    n = len(deg)
+    level = np.full(n, max_level, dtype=np.int64)
+    left = np.arange(n)
+    for z in range(max_level):
+        if not len(left):
+            break
+        cells = _cells(pos[left], z)
+        order = np.lexsort((left, -deg[left], cells))
+        cs = cells[order]
+        start = np.r_[0, np.flatnonzero(cs[1:] != cs[:-1]) + 1]
+        rank = np.arange(len(cs)) - np.repeat(start, np.diff(np.r_[start, len(cs)]))
+        take = order[rank < per_tile]
+        level[left[take]] = z
+        left = np.setdiff1d(left, left[take], assume_unique=True)
+    return level
+
+
+def _cells(pos: np.ndarray, z: int) -> np.ndarray:
+    """Celda (x + y·2^z) de cada posición en [-1, 1]² para el nivel z."""
+    k = 1 << z
+    ij = np.clip(((pos + 1) / 2 * k).astype(np.int64), 0, k - 1)
+    return ij[:, 0] + ij[:, 1] * k
+
+
+def _write_json_gz(path: Path, obj) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = gzip.compress(json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8"), mtime=0)
+    path.write_bytes(data)
+    return len(data)
+
+
+def export_tiles(data: GraphData, out_dir: Path | str, *, per_tile: int = 1500, max_level: int = 6,
+                 layout: str = "auto", iterations: int = 50, labels: dict[str, str] | None = None,
+                 prop_labels: dict[str, str] | None = None, title: str = "Grafo") -> dict:
+    """Escribe teselas, manifiesto y visor en `out_dir`; devuelve el manifiesto."""
+    out_dir = Path(out_dir)
+    t0 = time.perf_counter()
+    n = len(data.nodes)
+    pos_d = compute_layout(data, method=layout, iterations=iterations)
+    pos = np.array([pos_d[q] for q in data.nodes]).reshape(n, 2)
+    deg = data.degree()
+    comm = label_propagation(n, data.src, data.dst)
+    level = assign_levels(pos, deg, per_tile, max_level)
+    labels = {**data.labels, **(labels or {})}
+
+    props = sorted({p for _, p, _ in data.edges}, key=lambda p: (int(p[1:]) if p[1:].isdigit() else -1, p))
+    prop_ix = {p: i for i, p in enumerate(props)}
+
+    # nodos por tesela
+    tiles: dict[tuple[int, int], dict] = {}
+    node_tile = np.empty(n, dtype=np.int64)
+    for z in range(max_level + 1):
+        ix = np.flatnonzero(level == z)
+        node_tile[ix] = _cells(pos[ix], z)
+    for i in np.lexsort((np.arange(n), -deg)):
+        q = data.nodes[i]
+        t = tiles.setdefault((int(level[i]), int(node_tile[i])), {"nodes": [], "edges": []})
+        t["nodes"].append([q, round(float(pos[i, 0]), 5), round(float(pos[i, 1]), 5), int(deg[i]),
+                           int(comm[i]), labels.get(q)])
+    # aristas: en la tesela del extremo más profundo (visible solo cuando ambos lo son)
+    for (s, p, o), a, b in zip(data.edges, data.src, data.dst):
+        home = a if (level[a], a) >= (level[b], b) else b
+        t = tiles.setdefault((int(level[home]), int(node_tile[home])), {"nodes": [], "edges": []})
+        t["edges"].append([round(float(pos[a, 0]), 5), round(float(pos[a, 1]), 5),
+                           round(float(pos[b, 0]), 5), round(float(pos[b, 1]), 5), prop_ix[p]])
+
+    tiles_dir = out_dir / "tiles"
+    if tiles_dir.exists():
+        shutil.rmtree(tiles_dir)
+    index, total_bytes = {}, 0
+    for (z, cell), t in sorted(tiles.items()):
+        k = 1 << z
+        x, y = cell % k, cell // k
+        total_bytes += _write_json_gz(tiles_dir / str(z) / f"{x}_{y}.json.gz", t)
+        index.setdefault(str(z), []).append([x, y, len(t["nodes"]), len(t["edges"])])
+
+    sizes = np.bincount(comm) if n else np.array([], dtype=np.int64)
+    top = np.lexsort((np.arange(n), -deg))[:25]
+    manifest = {
+        "title": title,
+        "version": 1,
+        "bounds": [-1, -1, 1, 1],
+        "max_level": max_level,
+        "per_tile": per_tile,
+        "tiles": index,
+        "props": [[p, (prop_labels or {}).get(p, p)] for p in props],
+        "stats": {
+            "nodes": n,
+            "edges": len(data.edges),
+            "communities": int(len(sizes)),
+            "largest_communities": sizes[:10].tolist(),
+            "max_degree": int(deg.max()) if n else 0,
+            "mean_degree": round(float(deg.mean()), 3) if n else 0,
+            "top_nodes": [[data.nodes[i], labels.get(data.nodes[i]), int(deg[i])] for i in top],
+            "prop_counts": {p: int(c) for p, c in zip(props, np.bincount([prop_ix[p] for _, p, _ in data.edges],
+                                                                         minlength=len(props)))},
+            "tile_bytes": total_bytes,
+            "export_s": round(time.perf_counter() - t0, 3),
+        },
+    }
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = out_dir / f"manifest.json.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, out_dir / "manifest.json")
+    shutil.copyfile(VIEWER, out_dir / "index.html")
+    return manifest
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Exporta un grafo grande a teselas JSON + visor HTML estático.")
+    ap.add_argument("paths", nargs="+", help="Grafos de entrada: archivos .ttl/.nt/.nq (o .gz) o directorios.")
+    ap.add_argument("--out", required=True, help="Directorio de salida (index.html, manifest.json, tiles/).")
+    ap.add_argument("--title", help="Título del visor (default: nombre del primer path).")
+    ap.add_argument("--max-nodes", type=int, default=0, help="Muestreo por grado antes de exportar (0 = todos).")
+    ap.add_argument("--props", help="Solo estas propiedades, separadas por coma (ej. P69,P108).")
+    ap.add_argument("--per-tile", type=int, default=1500, help="Nodos por celda y nivel (default: 1500).")
+    ap.add_argument("--levels", type=int, default=6, help="Nivel de detalle máximo del quadtree (default: 6).")
+    ap.add_argument("--layout", choices=["auto", "spring", "radial"], default="auto")
+    ap.add_argument("--iterations", type=int, default=50, help="Iteraciones del layout (default: 50).")
+    ap.add_argument("--label-langs", default="es,en", help='Idiomas de etiquetas faltantes; "" para no consultarlas.')
+    args = ap.parse_args()
+
+    data = load_graph(args.paths)
+    props = {p.strip() for p in args.props.split(",") if p.strip()} if args.props else None
+    data = downsample(data, max_nodes=args.max_nodes or None, props=props)
+    if not data.edges:
+        raise SystemExit("[error] No se encontraron aristas 'wdt:' en la entrada.")
+    print(f"Grafo: {len(data.nodes):,} nodos, {len(data.edges):,} aristas")
+
+    labels, prop_labels = {}, {}
+    if args.label_langs:
+        from kg.wd.label_store import resolve_labels
+        try:
+            labels = resolve_labels([q for q in data.nodes if q not in data.labels], langs=args.label_langs)
+            prop_labels = resolve_labels({p for _, p, _ in data.edges}, langs=args.label_langs)
+        except Exception as e:
+            print(f"[warn] no se pudieron resolver etiquetas: {e}")
+
+    m = export_tiles(data, args.out, per_tile=args.per_tile, max_level=args.levels, layout=args.layout,
+                     iterations=args.iterations, labels=labels, prop_labels=prop_labels,
+                     title=args.title or Path(args.paths[0]).name)
+    n_tiles = sum(len(v) for v in m["tiles"].values())
+    print(f"✅ {n_tiles} teselas ({m['stats']['tile_bytes'] / 2**20:.1f} MB) en {args.out}")
+    print(f"   Servir con: python -m http.server -d {args.out}  →  http://localhost:8000/")
+
+
+if __name__ == "__main__":
+    main()
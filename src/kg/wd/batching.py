@@ -0,0 +1,170 @@
+# src/kg/wd/batching.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Iterator, Sequence, TypeVar
+import atexit
+import json
+import math
+import os
+import threading
+import time
+
+from kg.wd.utils import DATA_ROOT, SparqlTimeout, last_query_cached
+
+# tamaños de lote aprendidos por tipo de consulta (persisten entre corridas)
+BATCH_STATE = DATA_ROOT / "batch_sizes.json"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class AdaptiveBatcher:
+    """
+    Tamaño de lote adaptativo para una familia de consultas con bloque VALUES.
+
+    - Crece (×`grow`) mientras las respuestas tardan menos de la mitad de `target_s`.
+    - Se reduce si una respuesta supera `target_s`.
+    - Ante un timeout parte el lote en dos mitades y reintenta solo esas mitades
+      (recursivamente); el tamaño aprendido baja a la mitad del lote que falló y ese
+      tamaño queda como techo, que se relaja poco a poco tras `relax_every` éxitos.
+    - Las respuestas servidas desde el caché no cuentan como observaciones.
+
+    Lleva latencia media (EWMA), número de consultas y de timeouts; el estado se guarda
+    en data/batch_sizes.json y se reutiliza en la siguiente corrida.
+    """
+
+    def __init__(self, name: str, size: int, min_size: int = 1, max_size: int = 1000,
+                 target_s: float = 10.0, grow: float = 1.25, relax_every: int = 20):
+        self.name = name
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.size = self._clamp(size)
+        self.target_s = target_s
+        self.grow = grow
+        self.relax_every = relax_every
+        self.ceiling: int | None = None   # menor lote que agotó el tiempo
+        self._fast = 0
+        self.latency_s = 0.0
+        self.calls = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def _clamp(self, n: float) -> int:
+        return max(self.min_size, min(self.max_size, int(n)))
+
+    # ---- estado ----
+    def state(self) -> dict:
+        return {"size": self.size, "ceiling": self.ceiling, "latency_s": round(self.latency_s, 3),
+                "calls": self.calls, "timeouts": self.timeouts, "updated": time.time()}
+
+    def load(self, st: dict) -> None:
+        self.size = self._clamp(st.get("size", self.size))
+        self.ceiling = st.get("ceiling")
+        self.latency_s = float(st.get("latency_s", 0.0))
+        self.calls = int(st.get("calls", 0))
+        self.timeouts = int(st.get("timeouts", 0))
+
+    def observe(self, n: int, elapsed: float) -> None:
+        """Registra una respuesta correcta de `n` elementos que tardó `elapsed` segundos."""
+        with self._lock:
+            self.calls += 1
+            self.latency_s = elapsed if self.calls == 1 else 0.8 * self.latency_s + 0.2 * elapsed
+            if n < self.size:
+                return  # lote incompleto (cola o mitad de una bisección): no informa del tamaño
+            if elapsed < self.target_s / 2:
+                self._fast += 1
+                if self.ceiling and self._fast % self.relax_every == 0:
+                    self.ceiling = math.ceil(self.ceiling * 1.1)
+                new = max(self.size + 1, math.ceil(self.size * self.grow))
+                if self.ceiling:
+                    new = min(new, self.ceiling - 1)
+                self.size = self._clamp(max(self.size, new))
+            elif elapsed > self.target_s:
+                self.size = self._clamp(self.size * self.target_s / elapsed)
+
+    def observe_timeout(self, n: int) -> None:
+        with self._lock:
+            self.timeouts += 1
+            self._fast = 0
+            self.ceiling = n if self.ceiling is None else min(self.ceiling, n)
+            self.size = self._clamp(min(self.size, n // 2))
+
+    # ---- ejecución ----
+    def map(self, items: Sequence[T], fn: Callable[[list[T]], R],
+            cap: Callable[[], int] | None = None) -> Iterator[tuple[list[T], R]]:
+        """
+        Ejecuta `fn(lote)` sobre `items` en lotes del tamaño aprendido y produce (lote, resultado)
+        en orden. `cap()` acota además el siguiente lote (p. ej. por filas esperadas).
+        Un lote de un solo elemento que agota el tiempo se reintenta una vez y luego se propaga.
+        """
+        items = list(items)
+        i = 0
+        try:
+            while i < len(items):
+                size = self.size if cap is None else max(1, min(self.size, cap()))
+                chunk = items[i:i + size]
+                yield from self._run(chunk, fn)
+                i += len(chunk)
+        finally:
+            save_batch_state()
+
+    def _run(self, chunk: list[T], fn: Callable[[list[T]], R]) -> Iterator[tuple[list[T], R]]:
+        t0 = time.monotonic()
+        try:
+            res = fn(chunk)
+        except SparqlTimeout:
+            self.observe_timeout(len(chunk))
+            if len(chunk) == 1:
+                res = fn(chunk)
+                yield chunk, res
+                return
+            mid = len(chunk) // 2
+            yield from self._run(chunk[:mid], fn)
+            yield from self._run(chunk[mid:], fn)
+            return
+        if not last_query_cached():
+            self.observe(len(chunk), time.monotonic() - t0)
+        yield chunk, res
+
+
+_BATCHERS: dict[str, AdaptiveBatcher] = {}
+_LOCK = threading.Lock()
+_saved_at = 0.0
+
+
+def _read_state() -> dict:
+    try:
+        return json.loads(Path(BATCH_STATE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def get_batcher(name: str, size: int, **kw) -> AdaptiveBatcher:
+    """Batcher compartido del proceso para `name` (p. ej. "filter.p1"), con su estado guardado."""
+    with _LOCK:
+        b = _BATCHERS.get(name)
+        if b is None:
+            b = AdaptiveBatcher(name, size, **kw)
+            st = _read_state().get(name)
+            if st:
+                b.load(st)
+            _BATCHERS[name] = b
+        return b
+
+
+def save_batch_state(min_interval_s: float = 5.0) -> None:
+    """Guarda los tamaños aprendidos (escritura atómica; como mucho cada `min_interval_s`)."""
+    global _saved_at
+    with _LOCK:
+        now = time.monotonic()
+        if not _BATCHERS or now - _saved_at < min_interval_s:
+            return
+        _saved_at = now
+        data = _read_state()
+        data.update({name: b.state() for name, b in _BATCHERS.items()})
+        tmp = Path(BATCH_STATE).with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, BATCH_STATE)
+
+
+atexit.register(save_batch_state, 0.0)
@@ -7,10 +7,20 @@ from rdflib.namespace import RDF, RDFS, XSD
 WD = Namespace("http://www.wikidata.org/entity/")
 WDT = Namespace("http://www.wikidata.org/prop/direct/")
 
-def build_degree1_graph(root_qid: str, edges: list[tuple[str,str]], labels: dict[str,str] | None = None) -> Graph:
+def build_degree1_graph(root_qid: str, edges: list[tuple[str,str]], labels: dict[str,str] | None = None,
+                        label_langs: str | None = None) -> Graph:
     """
     Construye un grafo con aristas (root) -[P]-> (Q), grado-1.
+    Si se pasa `label_langs` (ej. "es,en"), las etiquetas que falten en `labels`
+    se resuelven con el store de etiquetas (kg.wd.label_store).
     """
+    if label_langs:
+        from kg.wd.label_store import resolve_labels
+        ids = [root_qid] + [Q for _, Q in edges]
+        missing = [x for x in ids if not labels or x not in labels]
+        if missing:
+            labels = {**resolve_labels(missing, langs=label_langs), **(labels or {})}
+
     g = Graph()
     g.bind("wd", WD)
     g.bind("wdt", WDT)
@@ -0,0 +1,712 @@
+# src/kg/wd/cache.py
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+import argparse
+import atexit
+import gzip
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+try:  # zstd es opcional; si no está, se usa gzip
+    import zstandard as _zstd
+except ImportError:  # pragma: no cover - depende del entorno
+    _zstd = None
+
+
+# --------------------------------------------------------------------------------------
+# Compresión
+# --------------------------------------------------------------------------------------
+def _default_codec() -> str:
+    return "zstd" if _zstd is not None else "gzip"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd.ZstdCompressor(level=6).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    return data
+
+
+def _compress_chunks(chunks, codec: str) -> tuple[bytes, int]:
+    """Comprime un flujo de bytes sin juntarlo antes; devuelve (comprimido, bytes originales)."""
+    if codec == "zstd":
+        co = _zstd.ZstdCompressor(level=6).compressobj()
+    elif codec == "gzip":
+        co = zlib.compressobj(6, zlib.DEFLATED, 31)   # formato gzip (lo lee gzip.decompress)
+    else:
+        data = b"".join(chunks)
+        return data, len(data)
+    parts, raw = [], 0
+    for chunk in chunks:
+        raw += len(chunk)
+        parts.append(co.compress(chunk))
+    parts.append(co.flush())
+    return b"".join(parts), raw
+
+
+def _encode_chunks(value: dict, rows_per_chunk: int = 256):
+    """
+    JSON compacto de una respuesta por partes: las filas de results.bindings se codifican por
+    grupos (con el encoder en C), así una respuesta grande no se materializa entera como texto.
+    """
+    dumps = lambda v: json.dumps(v, separators=(",", ":"))
+    results = value.get("results") if isinstance(value, dict) else None
+    rows = results.get("bindings") if isinstance(results, dict) else None
+    if not isinstance(rows, list):
+        yield dumps(value).encode("utf-8")
+        return
+    head = dumps({k: v for k, v in value.items() if k != "results"})[1:-1]
+    rest = dumps({k: v for k, v in results.items() if k != "bindings"})[1:-1]
+    yield ("{" + (head + "," if head else "") + '"results":{' + (rest + "," if rest else "")
+           + '"bindings":[').encode("utf-8")
+    for i in range(0, len(rows), rows_per_chunk):
+        part = ",".join(dumps(b) for b in rows[i:i + rows_per_chunk])
+        yield ((',' if i else '') + part).encode("utf-8")
+    yield b"]}}"
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if _zstd is None:
+            raise RuntimeError("Entrada comprimida con zstd pero 'zstandard' no está instalado.")
+        return _zstd.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    return data
+
+
+# --------------------------------------------------------------------------------------
+# Backends
+# --------------------------------------------------------------------------------------
+class QueryCache:
+    """
+    Interfaz de caché de respuestas SPARQL: clave (sha1 de la consulta) → JSON parseado.
+    Las subclases implementan `_get`/`_put` (`_get` devuelve (valor, creado)); aquí se lleva la
+    capa LRU en memoria, que respeta el mismo `ttl_s` que el backend, y los contadores.
+
+    Los leases (`acquire_lease`/`release_lease`/`wait_for`) coordinan procesos que piden la misma
+    consulta a la vez: uno la ejecuta y los demás esperan a que aparezca en el caché. En esta
+    clase base no hay coordinación (todo proceso obtiene el lease).
+    """
+
+    def __init__(self, mem_items: int = 2048, ttl_s: float | None = None):
+        self.mem_items = int(mem_items)
+        self.ttl_s = ttl_s
+        self._mem: OrderedDict[str, tuple[dict, float]] = OrderedDict()   # clave → (valor, creado)
+        self._mem_lock = threading.Lock()
+        self.hits = 0
+        self.mem_hits = 0
+        self.misses = 0
+
+    def _expired(self, created: float, now: float | None = None) -> bool:
+        return self.ttl_s is not None and (now or time.time()) - created > self.ttl_s
+
+    def _mem_get(self, key: str, now: float) -> dict | None:
+        # con _mem_lock tomado; una entrada vencida se descarta (y se busca en el backend)
+        entry = self._mem.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry[1], now):
+            del self._mem[key]
+            return None
+        self._mem.move_to_end(key)
+        return entry[0]
+
+    def get(self, key: str) -> dict | None:
+        if self.mem_items:
+            with self._mem_lock:
+                value = self._mem_get(key, time.time())
+            if value is not None:
+                self.hits += 1
+                self.mem_hits += 1
+                return value
+        entry = self._get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, *entry)
+        return entry[0]
+
+    def put(self, key: str, value: dict) -> None:
+        self._put_chunks(key, _encode_chunks(value))
+        self._remember(key, value, time.time())
+
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """Como `get` para muchas claves a la vez; devuelve solo las encontradas."""
+        found: dict[str, dict] = {}
+        if self.mem_items:
+            now = time.time()
+            with self._mem_lock:
+                for k in keys:
+                    value = self._mem_get(k, now)
+                    if value is not None:
+                        found[k] = value
+        mem_found = len(found)
+        rest = [k for k in keys if k not in found]
+        got = self._get_many(rest) if rest else {}
+        self.hits += mem_found + len(got)
+        self.mem_hits += mem_found
+        self.misses += len(rest) - len(got)
+        for k, (v, created) in got.items():
+            self._remember(k, v, created)
+            found[k] = v
+        return found
+
+    def contains_many(self, keys: list[str]) -> set[str]:
+        """Claves vigentes en el backend (sin la capa en memoria ni contadores): lo que verá otro proceso."""
+        return set(self._get_many(keys)) if keys else set()
+
+    def put_many(self, values: dict[str, dict]) -> None:
+        """Como `put` para muchas entradas (una sola transacción en sqlite)."""
+        if not values:
+            return
+        self._put_many({k: json.dumps(v, separators=(",", ":")).encode("utf-8") for k, v in values.items()})
+        now = time.time()
+        for k, v in values.items():
+            self._remember(k, v, now)
+
+    def put_raw(self, key: str, payload: bytes, value: dict | None = None) -> None:
+        """Guarda el cuerpo JSON tal cual llegó (sin volver a serializarlo)."""
+        self._put(key, payload)
+        if value is not None:
+            self._remember(key, value, time.time())
+
+    def _remember(self, key: str, value: dict, created: float) -> None:
+        if not self.mem_items:
+            return
+        with self._mem_lock:
+            self._mem[key] = (value, created)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.mem_items:
+                self._mem.popitem(last=False)
+
+    def peek(self, key: str) -> dict | None:
+        """Como `get`, pero sin contadores ni memoria LRU (para sondeos). Respeta `ttl_s`."""
+        entry = self._peek(key)
+        return entry[0] if entry else None
+
+    def adopt(self, old_key: str, key: str) -> dict | None:
+        """
+        Pasa la entrada vigente de `old_key` a `key` conservando su fecha de creación (claves de
+        formatos anteriores). Devuelve el valor, o None si no hay entrada o ya venció.
+        """
+        entry = self._peek(old_key)
+        if entry is None:
+            return None
+        self._put_chunks(key, _encode_chunks(entry[0]))
+        self._remember(key, *entry)
+        return entry[0]
+
+    # ---- leases entre procesos ----
+    def acquire_lease(self, key: str, ttl_s: float) -> bool:
+        """Intenta tomar el lease de `key` por `ttl_s` segundos. False si otro proceso lo tiene vigente."""
+        return True
+
+    def release_lease(self, key: str) -> None:
+        pass
+
+    def _lease_alive(self, key: str) -> bool:
+        return False
+
+    def wait_for(self, key: str, timeout_s: float) -> dict | None:
+        """
+        Espera a que el dueño del lease de `key` guarde la respuesta. Devuelve None si el lease
+        se libera o expira sin respuesta (el dueño falló) o si se agota `timeout_s`.
+        """
+        deadline = time.monotonic() + timeout_s
+        delay = 0.05
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            # primero el lease y después la entrada: el dueño guarda antes de liberar
+            alive = self._lease_alive(key)
+            entry = self._peek(key)
+            if entry is not None:
+                self._remember(key, *entry)
+                return entry[0]
+            if not alive:
+                return None
+            delay = min(delay * 1.5, 0.5)
+        return None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "mem_hits": self.mem_hits, "misses": self.misses}
+
+    def flush(self) -> None:
+        """Vuelca lo que el backend acumula en memoria (nada en esta clase)."""
+
+    def _get(self, key: str) -> tuple[dict, float] | None:
+        raise NotImplementedError
+
+    def _peek(self, key: str) -> tuple[dict, float] | None:
+        return self._get(key)
+
+    def _get_many(self, keys: list[str]) -> dict[str, tuple[dict, float]]:
+        out = {}
+        for k in keys:
+            v = self._get(k)
+            if v is not None:
+                out[k] = v
+        return out
+
+    def _put_many(self, payloads: dict[str, bytes]) -> None:
+        for k, payload in payloads.items():
+            self._put(k, payload)
+
+    def _put_chunks(self, key: str, chunks) -> None:
+        self._put(key, b"".join(chunks))
+
+    def _put(self, key: str, payload: bytes) -> None:
+        raise NotImplementedError
+
+
+def _lease_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class FileCache(QueryCache):
+    """
+    Formato histórico: un archivo `<sha1>.json` por consulta (sin compresión ni expiración).
+    Los leases son archivos `<sha1>.lease` creados en exclusiva, con su vencimiento adentro.
+    """
+
+    def __init__(self, cache_dir: Path | str, mem_items: int = 2048):
+        super().__init__(mem_items=mem_items)
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _get(self, key: str) -> tuple[dict, float] | None:
+        p = self.cache_dir / f"{key}.json"
+        try:
+            return json.loads(p.read_text(encoding="utf-8")), p.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def _put(self, key: str, payload: bytes) -> None:
+        self._put_chunks(key, [payload])
+
+    def _put_chunks(self, key: str, chunks) -> None:
+        p = self.cache_dir / f"{key}.json"
+        # escritura atómica: otros hilos/procesos pueden estar leyendo el caché
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp.open("wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, p)
+
+    def adopt(self, old_key: str, key: str) -> dict | None:
+        entry = self._peek(old_key)
+        if entry is None:
+            return None
+        try:
+            os.replace(self.cache_dir / f"{old_key}.json", self.cache_dir / f"{key}.json")  # conserva el mtime
+        except FileNotFoundError:
+            pass   # otro proceso ya la movió
+        self._remember(key, *entry)
+        return entry[0]
+
+    def _lease_expires(self, p: Path) -> float | None:
+        try:
+            return float(p.read_text(encoding="utf-8").split()[0])
+        except (FileNotFoundError, IndexError, ValueError):
+            return None
+
+    def acquire_lease(self, key: str, ttl_s: float) -> bool:
+        p = self.cache_dir / f"{key}.lease"
+        for _ in range(2):
+            try:
+                fd = os.open(p, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                expires = self._lease_expires(p)
+                if expires is not None and expires > time.time():
+                    return False
+                # lease vencido (o a medio escribir por un proceso que murió): se descarta
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(f"{time.time() + ttl_s} {_lease_owner()}")
+            return True
+        return False
+
+    def release_lease(self, key: str) -> None:
+        p = self.cache_dir / f"{key}.lease"
+        try:
+            if p.read_text(encoding="utf-8").split()[1:] == [_lease_owner()]:
+                p.unlink()
+        except (FileNotFoundError, IndexError):
+            pass
+
+    def _lease_alive(self, key: str) -> bool:
+        expires = self._lease_expires(self.cache_dir / f"{key}.lease")
+        return expires is not None and expires > time.time()
+
+    def stats(self) -> dict:
+        out = super().stats()
+        files = list(self.cache_dir.glob("*.json"))
+        out.update(entries=len(files), bytes=sum(f.stat().st_size for f in files))
+        return out
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key      TEXT    PRIMARY KEY,
+    payload  BLOB    NOT NULL,
+    codec    TEXT    NOT NULL,
+    size     INTEGER NOT NULL,     -- bytes comprimidos
+    raw_size INTEGER NOT NULL,     -- bytes del JSON original
+    created  REAL    NOT NULL,
+    accessed REAL    NOT NULL,
+    hits     INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key     TEXT PRIMARY KEY,      -- consulta en vuelo en algún proceso
+    owner   TEXT NOT NULL,         -- host:pid
+    expires REAL NOT NULL
+);
+"""
+
+
+class SQLiteCache(QueryCache):
+    """
+    Caché en un único SQLite (modo WAL) con payloads comprimidos (zstd o gzip).
+    - ttl_s: antigüedad máxima de una entrada (None = sin expiración).
+    - max_bytes: presupuesto de bytes comprimidos; al superarlo se expulsan las
+      entradas menos usadas recientemente (LRU).
+    - flush_s: las lecturas no escriben; la hora de último acceso (para el LRU), los hits por
+      entrada y los contadores se acumulan en memoria y se vuelcan en una sola transacción
+      como mucho cada `flush_s` segundos (y antes de expulsar, en `stats` y al salir).
+    Varios hilos y procesos pueden compartir el mismo archivo; los leases viven en la tabla `leases`.
+    Un miss cuesta dos transacciones de escritura: tomar el lease y guardar la respuesta, que
+    libera el lease en la misma transacción (`release_lease` queda para el caso de error).
+    """
+
+    def __init__(self, path: Path | str, ttl_s: float | None = None, max_bytes: int | None = None,
+                 mem_items: int = 2048, codec: str | None = None, evict_every: int = 500,
+                 flush_s: float = 5.0):
+        super().__init__(mem_items=mem_items, ttl_s=ttl_s)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.codec = codec or _default_codec()
+        self.evict_every = max(1, int(evict_every))
+        self.flush_s = flush_s
+        self._puts = 0
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._touched: dict[str, list] = {}     # clave → [último acceso, hits]
+        self._counts: dict[str, int] = {}
+        self._flushed_at = time.monotonic()
+        self._held: set[str] = set()            # leases tomados por este proceso
+        c = self._conn()
+        c.execute("PRAGMA journal_mode=WAL")
+        c.executescript(_SCHEMA)
+        atexit.register(self._flush_at_exit)
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.path), timeout=60)
+            c.execute("PRAGMA busy_timeout=60000")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._pending_lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+        self._maybe_flush()
+
+    def _touch(self, keys: list[str], now: float) -> None:
+        with self._pending_lock:
+            for k in keys:
+                t = self._touched.get(k)
+                if t is None:
+                    self._touched[k] = [now, 1]
+                else:
+                    t[0] = now
+                    t[1] += 1
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._flushed_at >= self.flush_s:
+            self.flush()
+
+    def flush(self) -> None:
+        """Vuelca accesos y contadores pendientes (una transacción)."""
+        with self._pending_lock:
+            touched, counts = self._touched, self._counts
+            self._touched, self._counts = {}, {}
+            self._flushed_at = time.monotonic()
+        if not touched and not counts:
+            return
+        with self._conn() as c:
+            if touched:
+                c.executemany("UPDATE entries SET accessed = MAX(accessed, ?), hits = hits + ? WHERE key = ?",
+                              [(t, n, k) for k, (t, n) in touched.items()])
+            if counts:
+                c.executemany(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    list(counts.items()))
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass   # archivo borrado o bloqueado: los accesos pendientes son solo estadística
+
+    def _get(self, key: str) -> tuple[dict, float] | None:
+        c = self._conn()
+        row = c.execute("SELECT payload, codec, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        payload, codec, created = row
+        now = time.time()
+        if self._expired(created, now):
+            # solo cuenta como fallo: la lectura no escribe (la borran `purge_expired`/`evict`)
+            self._count("expired")
+            self._count("misses")
+            return None
+        self._touch([key], now)
+        return json.loads(_decompress(payload, codec)), created
+
+    def _get_many(self, keys: list[str]) -> dict[str, tuple[dict, float]]:
+        c = self._conn()
+        rows = []
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows += c.execute(f"SELECT key, payload, codec, created FROM entries "
+                              f"WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+        now = time.time()
+        out, expired = {}, 0
+        for key, payload, codec, created in rows:
+            if self._expired(created, now):
+                expired += 1
+            else:
+                out[key] = (json.loads(_decompress(payload, codec)), created)
+        if out:
+            self._touch(list(out), now)
+        if expired:
+            self._count("expired", expired)
+        if len(out) < len(keys):
+            self._count("misses", len(keys) - len(out))
+        return out
+
+    def _put_many(self, payloads: dict[str, bytes]) -> None:
+        now = time.time()
+        rows = []
+        for key, payload in payloads.items():
+            blob = _compress(payload, self.codec)
+            rows.append((key, blob, self.codec, len(blob), len(payload), now, now))
+        with self._conn() as c:
+            c.executemany(
+                "INSERT OR REPLACE INTO entries (key, payload, codec, size, raw_size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._release_stored(c, list(payloads))
+        before = self._puts
+        self._puts += len(rows)
+        if self.max_bytes and self._puts // self.evict_every > before // self.evict_every:
+            self.evict(self.max_bytes)
+
+    def _peek(self, key: str) -> tuple[dict, float] | None:
+        # sin escrituras: una entrada vencida no se devuelve (la borran `purge_expired`/`evict`)
+        row = self._conn().execute("SELECT payload, codec, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or self._expired(row[2]):
+            return None
+        return json.loads(_decompress(row[0], row[1])), row[2]
+
+    def adopt(self, old_key: str, key: str) -> dict | None:
+        c = self._conn()
+        row = c.execute("SELECT payload, codec, created FROM entries WHERE key = ?", (old_key,)).fetchone()
+        if row is None or self._expired(row[2]):
+            return None
+        with c:
+            c.execute("UPDATE OR REPLACE entries SET key = ? WHERE key = ?", (key, old_key))
+        value = json.loads(_decompress(row[0], row[1]))
+        self._remember(key, value, row[2])
+        return value
+
+    def acquire_lease(self, key: str, ttl_s: float) -> bool:
+        now = time.time()
+        with self._conn() as c:
+            # una sola sentencia: inserta, o se queda con un lease vencido
+            cur = c.execute(
+                "INSERT INTO leases (key, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.expires < ?",
+                (key, _lease_owner(), now + ttl_s, now),
+            )
+        if cur.rowcount > 0:
+            with self._pending_lock:
+                self._held.add(key)
+            return True
+        return False
+
+    def release_lease(self, key: str) -> None:
+        with self._pending_lock:
+            if key not in self._held:
+                return   # ya se liberó al guardar la respuesta
+            self._held.discard(key)
+        with self._conn() as c:
+            c.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, _lease_owner()))
+
+    def _release_stored(self, c: sqlite3.Connection, keys: list[str]) -> None:
+        # dentro de la transacción que guarda `keys`: suelta los leases propios de esas claves
+        with self._pending_lock:
+            held = [k for k in keys if k in self._held]
+            self._held.difference_update(held)
+        if held:
+            c.executemany("DELETE FROM leases WHERE key = ? AND owner = ?", [(k, _lease_owner()) for k in held])
+
+    def _lease_alive(self, key: str) -> bool:
+        row = self._conn().execute("SELECT expires FROM leases WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def _put(self, key: str, payload: bytes) -> None:
+        self._store(key, _compress(payload, self.codec), len(payload))
+
+    def _put_chunks(self, key: str, chunks) -> None:
+        self._store(key, *_compress_chunks(chunks, self.codec))
+
+    def _store(self, key: str, blob: bytes, raw_size: int) -> None:
+        now = time.time()
+        with self._conn() as c:
+            c.execute(
+                "INSERT OR REPLACE INTO entries (key, payload, codec, size, raw_size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, blob, self.codec, len(blob), raw_size, now, now),
+            )
+            self._release_stored(c, [key])
+        self._puts += 1
+        if self.max_bytes and self._puts % self.evict_every == 0:
+            self.evict(self.max_bytes)
+
+    # ---- mantenimiento ----
+    def purge_expired(self) -> int:
+        """Borra las entradas con más de `ttl_s` segundos (y los leases vencidos). Devuelve cuántas."""
+        with self._conn() as c:
+            c.execute("DELETE FROM leases WHERE expires < ?", (time.time(),))
+        if self.ttl_s is None:
+            return 0
+        with self._conn() as c:
+            cur = c.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl_s,))
+            return cur.rowcount
+
+    def evict(self, max_bytes: int) -> int:
+        """Borra las vencidas y expulsa entradas LRU hasta que el total comprimido quede bajo `max_bytes`."""
+        self.flush()   # el orden LRU necesita los accesos pendientes
+        self.purge_expired()
+        c = self._conn()
+        total = c.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= max_bytes:
+            return 0
+        removed = 0
+        keys: list[str] = []
+        for key, size in c.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+            if total <= max_bytes:
+                break
+            keys.append(key)
+            total -= size
+        with c:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                c.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                removed += len(chunk)
+        if removed:
+            self._count("evicted", removed)
+        return removed
+
+    def migrate_dir(self, cache_dir: Path | str, delete: bool = False) -> int:
+        """Importa (una sola vez) un directorio de caché antiguo `<sha1>.json`."""
+        n = 0
+        batch: list[tuple] = []
+        now = time.time()
+        c = self._conn()
+        for p in Path(cache_dir).glob("*.json"):
+            raw = p.read_bytes()
+            blob = _compress(raw, self.codec)
+            mtime = p.stat().st_mtime
+            batch.append((p.stem, blob, self.codec, len(blob), len(raw), mtime, now))
+            if len(batch) >= 1000:
+                with c:
+                    c.executemany("INSERT OR IGNORE INTO entries (key, payload, codec, size, raw_size, created, accessed) "
+                                  "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                n += len(batch)
+                batch.clear()
+        if batch:
+            with c:
+                c.executemany("INSERT OR IGNORE INTO entries (key, payload, codec, size, raw_size, created, accessed) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            n += len(batch)
+        if delete:
+            for p in Path(cache_dir).glob("*.json"):
+                p.unlink()
+        return n
+
+    def migrate_once(self, cache_dir: Path | str) -> int:
+        """Como `migrate_dir`, pero solo la primera vez para este SQLite."""
+        c = self._conn()
+        if c.execute("SELECT 1 FROM counters WHERE name = 'migrated'").fetchone():
+            return 0
+        n = self.migrate_dir(cache_dir) if Path(cache_dir).is_dir() else 0
+        self._count("migrated")
+        self.flush()   # otros procesos deben ver la marca de inmediato
+        return n
+
+    def stats(self) -> dict:
+        self.flush()
+        out = super().stats()
+        c = self._conn()
+        entries, size, raw, hits = c.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0), COALESCE(SUM(hits), 0) FROM entries"
+        ).fetchone()
+        out.update(entries=entries, bytes=size, raw_bytes=raw, stored_hits=hits)
+        out.update({f"total_{k}": v for k, v in c.execute("SELECT name, value FROM counters")})
+        return out
+
+
+def main():
+    from kg.wd.utils import CACHE_DIR, get_cache
+
+    ap = argparse.ArgumentParser(description="Mantenimiento del caché SPARQL.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="Muestra tamaño y contadores de aciertos/fallos.")
+    m = sub.add_parser("migrate", help="Importa el directorio antiguo data/cache_wd/*.json.")
+    m.add_argument("--src", default=str(CACHE_DIR))
+    m.add_argument("--delete", action="store_true", help="Borra los .json tras importarlos.")
+    e = sub.add_parser("evict", help="Expulsa entradas LRU hasta un presupuesto de bytes.")
+    e.add_argument("--max-mb", type=float, required=True)
+    sub.add_parser("purge-expired", help="Borra entradas más antiguas que HFKG_CACHE_TTL.")
+    args = ap.parse_args()
+
+    cache = get_cache()
+    if not isinstance(cache, SQLiteCache) and args.cmd != "stats":
+        raise SystemExit("[error] Este comando requiere el backend sqlite (HFKG_CACHE=sqlite).")
+    if args.cmd == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.cmd == "migrate":
+        print(f"Importadas: {cache.migrate_dir(args.src, delete=args.delete)} entradas")
+    elif args.cmd == "evict":
+        print(f"Expulsadas: {cache.evict(int(args.max_mb * 1024 * 1024))} entradas")
+    elif args.cmd == "purge-expired":
+        print(f"Expiradas: {cache.purge_expired()} entradas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# src/kg/wd/client.py
+from __future__ import annotations
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:  # ijson es opcional: sin él, el cuerpo se lee completo y se parsea con json.loads
+    import ijson
+except ImportError:  # pragma: no cover - depende del entorno
+    ijson = None
+
+ENDPOINT = os.getenv("HFKG_ENDPOINT", "https://query.wikidata.org/sparql")
+USER_AGENT = "kg-country-agnostic/0.1 (mailto:example@example.com)"
+
+# consultas más largas que esto (caracteres) van por POST: evita URLs enormes con VALUES grandes
+POST_THRESHOLD = 1500
+
+# con ijson, las respuestas se parsean a medida que llegan (sin guardar además el cuerpo en bytes)
+STREAMING = ijson is not None
+
+
+class _BodyReader:
+    """Vista tipo archivo sobre `iter_content` (ya descomprimido), contando los bytes leídos."""
+
+    def __init__(self, resp: requests.Response, chunk_size: int = 64 * 1024):
+        self._chunks = resp.iter_content(chunk_size)
+        self._buf = b""
+        self.bytes = 0
+
+    def read(self, n: int = -1) -> bytes:
+        while n < 0 or len(self._buf) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self.bytes += len(chunk)
+            self._buf += chunk
+        if n < 0:
+            out, self._buf = self._buf, b""
+        else:
+            out, self._buf = self._buf[:n], self._buf[n:]
+        return out
+
+
+class SparqlClient:
+    """
+    Cliente SPARQL compartido por todo el proceso.
+    - Conexiones HTTPS persistentes (keep-alive) en un pool, reutilizadas entre hilos.
+    - Respuestas comprimidas (gzip/deflate) negociadas con Accept-Encoding.
+    - GET para consultas cortas (cacheables por WDQS) y POST para bloques VALUES grandes.
+    - El cuerpo se lee una sola vez como bytes y se parsea sin copias intermedias a str; con
+      ijson instalado (`query_json`), se parsea por partes mientras llega.
+    """
+
+    def __init__(self, endpoint: str = ENDPOINT, user_agent: str = USER_AGENT,
+                 pool_size: int = 16, post_threshold: int = POST_THRESHOLD):
+        self.endpoint = endpoint
+        self.post_threshold = post_threshold
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "Accept": "application/sparql-results+json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+    def _send(self, query: str, timeout: float, stream: bool = False) -> requests.Response:
+        if len(query) > self.post_threshold:
+            return self.session.post(self.endpoint, data={"query": query}, timeout=timeout, stream=stream)
+        return self.session.get(self.endpoint, params={"query": query}, timeout=timeout, stream=stream)
+
+    def query_raw(self, query: str, timeout: float = 120) -> bytes:
+        """Ejecuta la consulta y devuelve el cuerpo JSON (ya descomprimido) como bytes."""
+        resp = self._send(query, timeout)
+        try:
+            resp.raise_for_status()
+            return resp.content
+        finally:
+            resp.close()
+
+    def query_json(self, query: str, timeout: float = 120) -> tuple[dict, int]:
+        """
+        Ejecuta la consulta y devuelve (JSON SPARQL parseado, bytes recibidos). Con ijson, las
+        filas se construyen mientras llega el cuerpo y los bytes no se guardan: una respuesta
+        grande ocupa memoria una sola vez. Una respuesta truncada lanza json.JSONDecodeError.
+        """
+        if not STREAMING:
+            raw = self.query_raw(query, timeout=timeout)
+            return json.loads(raw), len(raw)
+        resp = self._send(query, timeout, stream=True)
+        try:
+            resp.raise_for_status()
+            body = _BodyReader(resp)
+            try:
+                res = next(ijson.items(body, "", use_float=True))
+            except (ijson.JSONError, StopIteration) as e:
+                raise json.JSONDecodeError(f"respuesta JSON incompleta: {e}", "", body.bytes) from e
+            return res, body.bytes
+        finally:
+            resp.close()
+
+    def query(self, query: str, timeout: float = 120) -> dict:
+        """Como `query_raw`, pero devuelve el JSON SPARQL parseado."""
+        return self.query_json(query, timeout=timeout)[0]
+
+
+_CLIENT: SparqlClient | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> SparqlClient:
+    """Cliente compartido (se crea la primera vez que se usa)."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = SparqlClient()
+        return _CLIENT
+
+
+def configure_client(endpoint: str = ENDPOINT, pool_size: int = 16, **kw) -> SparqlClient:
+    """Reemplaza el cliente compartido (p. ej. otro endpoint o un pool más grande)."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        _CLIENT = SparqlClient(endpoint=endpoint, pool_size=pool_size, **kw)
+        return _CLIENT
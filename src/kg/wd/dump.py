@@ -0,0 +1,342 @@
+# src/kg/wd/dump.py
+"""
+Backend offline sobre un volcado truthy de Wikidata (`latest-truthy.nt[.gz|.bz2]`).
+
+El volcado (o un recorte filtrado) se lee UNA vez en streaming y se indexa en un
+SQLite local con:
+  - edges(s, p, o)        aristas entidad→entidad (wdt:Pxx → Qxxx), clave (s, p, o)
+  - prop_edges(p, o, s)   índice inverso para P31/P27/P106/P17/P131/P159/P276
+  - labels(id, lang, ...) rdfs:label por idioma (entidades Q y propiedades P)
+  - sitelinks(qid, wiki)  artículos de Wikipedia (schema:about)
+
+Las funciones públicas (`truthy_edges`, `filter_by_country`, `labels`,
+`sample_per_class`, ...) consultan este store en vez de WDQS cuando el backend
+activo es "dump":
+
+    HFKG_BACKEND=dump HFKG_DUMP_DB=data/wd_dump.sqlite python -m kg.pipeline.run_wd ...
+
+o bien desde Python con `use_dump("data/wd_dump.sqlite")`.
+
+Construcción del índice:
+
+    python -m kg.wd.dump --dump latest-truthy.nt.gz --db data/wd_dump.sqlite --langs es,en
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, Iterator
+import argparse
+import bz2
+import gzip
+import os
+import re
+import sqlite3
+import threading
+
+from kg.wd.utils import DATA_ROOT
+
+DEFAULT_DUMP_DB = DATA_ROOT / "wd_dump.sqlite"
+
+# propiedades con índice inverso (objeto → sujetos)
+INDEXED_PROPS = (31, 27, 106, 17, 131, 159, 276)
+
+_ENT = "http://www.wikidata.org/entity/"
+_WDT = "http://www.wikidata.org/prop/direct/"
+_RDFS_LABEL = "<http://www.w3.org/2000/01/rdf-schema#label>"
+_SCHEMA_ABOUT = "<http://schema.org/about>"
+
+_LIT_RE = re.compile(r'^"(.*)"@([A-Za-z0-9-]+)\s*\.\s*$')
+_ESC_RE = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|[tbnrf"\'\\])')
+_ESC_CHARS = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS edges (
+    s INTEGER NOT NULL, p INTEGER NOT NULL, o INTEGER NOT NULL,
+    PRIMARY KEY (s, p, o)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS prop_edges (
+    p INTEGER NOT NULL, o INTEGER NOT NULL, s INTEGER NOT NULL,
+    PRIMARY KEY (p, o, s)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS labels (
+    id TEXT NOT NULL, lang TEXT NOT NULL, label TEXT NOT NULL,
+    PRIMARY KEY (id, lang)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sitelinks (
+    qid INTEGER NOT NULL, wiki TEXT NOT NULL, title TEXT NOT NULL,
+    PRIMARY KEY (qid, wiki)
+) WITHOUT ROWID;
+"""
+
+
+# --------------------------------------------------------------------------------------
+# Lectura del volcado
+# --------------------------------------------------------------------------------------
+def _open_dump(path: Path):
+    name = path.name
+    if name.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if name.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8", errors="replace")
+    return path.open("r", encoding="utf-8", errors="replace")
+
+
+def _unescape(s: str) -> str:
+    if "\\" not in s:
+        return s
+
+    def _sub(m: re.Match) -> str:
+        e = m.group(1)
+        if e[0] in "uU":
+            return chr(int(e[1:], 16))
+        return _ESC_CHARS[e]
+    return _ESC_RE.sub(_sub, s)
+
+
+def iter_dump(path: Path | str, langs: Iterable[str] | None = None) -> Iterator[tuple]:
+    """
+    Recorre el volcado N-Triples y emite solo lo que usa el pipeline:
+      ("e", s, p, o)            arista wdt:Pp entre entidades Qs → Qo (enteros)
+      ("l", id, lang, label)    rdfs:label (id = "Q42" / "P31")
+      ("w", qid, wiki, title)   sitelink de Wikipedia (wiki = "es.wikipedia.org")
+    """
+    langs = set(langs) if langs else None
+    ent = "<" + _ENT
+    wdt = "<" + _WDT
+    with _open_dump(Path(path)) as f:
+        for line in f:
+            parts = line.split(" ", 2)
+            if len(parts) < 3:
+                continue
+            s, p, rest = parts
+            if p.startswith(wdt):
+                if not (s.startswith(ent + "Q") and rest.startswith(ent + "Q")):
+                    continue
+                o = rest[len(ent) + 1:rest.index(">")]
+                pid = p[len(wdt) + 1:-1]
+                sid = s[len(ent) + 1:-1]
+                if sid.isdigit() and pid.isdigit() and o.isdigit():
+                    yield ("e", int(sid), int(pid), int(o))
+            elif p == _RDFS_LABEL:
+                if not s.startswith(ent):
+                    continue
+                m = _LIT_RE.match(rest)
+                if not m or (langs and m.group(2) not in langs):
+                    continue
+                yield ("l", s[len(ent):-1], m.group(2), _unescape(m.group(1)))
+            elif p == _SCHEMA_ABOUT:
+                # <https://es.wikipedia.org/wiki/Titulo> schema:about <.../entity/Q42>
+                if ".wikipedia.org/wiki/" not in s or not rest.startswith(ent + "Q"):
+                    continue
+                url = s[1:-1]
+                wiki = url.split("/")[2]
+                qid = rest[len(ent) + 1:rest.index(">")]
+                if qid.isdigit():
+                    yield ("w", int(qid), wiki, url.split("/")[-1])
+
+
+def build_dump_store(dump_path: Path | str, db_path: Path | str = DEFAULT_DUMP_DB,
+                     langs: Iterable[str] | None = ("es", "en"),
+                     batch: int = 200_000, verbose: bool = True) -> Path:
+    """
+    Indexa un volcado truthy (una sola pasada en streaming) en un SQLite en disco.
+    Se puede llamar varias veces sobre el mismo `db_path` para añadir recortes.
+    """
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(str(db_path))
+    con.executescript(_SCHEMA)
+    con.execute("PRAGMA journal_mode=OFF")
+    con.execute("PRAGMA synchronous=OFF")
+
+    indexed = set(INDEXED_PROPS)
+    edges: list[tuple[int, int, int]] = []
+    lbls: list[tuple[str, str, str]] = []
+    links: list[tuple[int, str, str]] = []
+    n = 0
+
+    def _flush():
+        con.executemany("INSERT OR IGNORE INTO edges (s, p, o) VALUES (?, ?, ?)", edges)
+        con.executemany("INSERT OR IGNORE INTO prop_edges (p, o, s) VALUES (?, ?, ?)",
+                        [(p, o, s) for s, p, o in edges if p in indexed])
+        con.executemany("INSERT OR REPLACE INTO labels (id, lang, label) VALUES (?, ?, ?)", lbls)
+        con.executemany("INSERT OR REPLACE INTO sitelinks (qid, wiki, title) VALUES (?, ?, ?)", links)
+        con.commit()
+        edges.clear(); lbls.clear(); links.clear()
+
+    for rec in iter_dump(dump_path, langs=langs):
+        kind = rec[0]
+        if kind == "e":
+            edges.append(rec[1:])
+        elif kind == "l":
+            lbls.append(rec[1:])
+        else:
+            links.append(rec[1:])
+        n += 1
+        if n % batch == 0:
+            _flush()
+            if verbose:
+                print(f"  … {n:,} registros indexados")
+    _flush()
+    con.execute("ANALYZE")
+    con.close()
+    if verbose:
+        print(f"✅ Store offline: {db_path} ({n:,} registros)")
+    return db_path
+
+
+# --------------------------------------------------------------------------------------
+# Store de consulta
+# --------------------------------------------------------------------------------------
+def _num(qid: str) -> int | None:
+    return int(qid[1:]) if qid and qid[0] in "QP" and qid[1:].isdigit() else None
+
+
+class DumpStore:
+    """Consultas del pipeline resueltas sobre el índice local (solo lectura, thread-safe)."""
+
+    def __init__(self, db_path: Path | str = DEFAULT_DUMP_DB):
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"No se encontró el store offline {self.db_path}. "
+                                    f"Créalo con: python -m kg.wd.dump --dump <latest-truthy.nt.gz>")
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = c
+        return c
+
+    # ---- aristas ----
+    def objects(self, s: int, p: int) -> list[int]:
+        return [o for (o,) in self._conn().execute(
+            "SELECT o FROM edges WHERE s = ? AND p = ?", (s, p))]
+
+    def subjects(self, p: int, o: int) -> list[int]:
+        """Sujetos con wdt:Pp = Qo (solo para INDEXED_PROPS)."""
+        return [s for (s,) in self._conn().execute(
+            "SELECT s FROM prop_edges WHERE p = ? AND o = ?", (p, o))]
+
+    def truthy_edges(self, qid: str) -> list[tuple[str, str]]:
+        s = _num(qid)
+        if s is None:
+            return []
+        return [(f"P{p}", f"Q{o}") for p, o in self._conn().execute(
+            "SELECT p, o FROM edges WHERE s = ?", (s,))]
+
+    def truthy_edges_batch(self, qids: Iterable[str]) -> dict[str, list[tuple[str, str]]]:
+        return {q: self.truthy_edges(q) for q in dict.fromkeys(qids)}
+
+    # ---- país ----
+    def _has(self, s: int, p: int, o: int) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM edges WHERE s = ? AND p = ? AND o = ?", (s, p, o)).fetchone() is not None
+
+    def _admin_in_country(self, x: int, c: int, hops: int) -> bool:
+        """x P17 C, o bien x P131 … (≤ hops saltos) … P17 C."""
+        if self._has(x, 17, c):
+            return True
+        if hops <= 0:
+            return False
+        return any(self._admin_in_country(a, c, hops - 1) for a in self.objects(x, 131))
+
+    def country_pass(self, qid: str, country_qid: str) -> int:
+        """
+        Misma semántica que las 3 pasadas de filter_by_country.
+        Devuelve la pasada que lo aceptó (1, 2, 3) o 0 si está fuera del país.
+        """
+        o, c = _num(qid), _num(country_qid)
+        if o is None or c is None:
+            return 0
+        if self._has(o, 27, c) or self._has(o, 17, c):
+            return 1
+        if any(self._admin_in_country(a, c, 2) for a in self.objects(o, 131)):
+            return 2
+        for p in (159, 276):
+            if any(self._admin_in_country(x, c, 2) for x in self.objects(o, p)):
+                return 3
+        return 0
+
+    def filter_by_country(self, qids: Iterable[str], country_qid: str) -> set[str]:
+        return {q for q in dict.fromkeys(qids) if self.country_pass(q, country_qid)}
+
+    # ---- etiquetas ----
+    def labels(self, ids: Iterable[str], langs: str = "es,en") -> dict[str, str]:
+        """Como el SERVICE wikibase:label: primer idioma disponible, o el propio id."""
+        order = [l.strip() for l in langs.split(",") if l.strip()]
+        out: dict[str, str] = {}
+        c = self._conn()
+        for x in dict.fromkeys(ids):
+            found = dict(c.execute("SELECT lang, label FROM labels WHERE id = ?", (x,)))
+            out[x] = next((found[l] for l in order if l in found), x)
+        return out
+
+    # ---- muestreo ----
+    def sample_subjects(self, occupations: Iterable[str], country_qid: str,
+                        wiki_lang: str, limit: int) -> list[tuple[str, str]]:
+        """
+        Humanos (P31=Q5) con P27=país, P106 ∈ ocupaciones y artículo en {wiki_lang}.wikipedia,
+        en orden de QID numérico (la muestra no depende del plan de consulta de SQLite).
+        """
+        occs = [n for n in (_num(q) for q in occupations) if n is not None]
+        c = _num(country_qid)
+        if not occs or c is None:
+            return []
+        marks = ",".join("?" * len(occs))
+        rows = self._conn().execute(
+            f"""
+            SELECT DISTINCT a.s, sl.title FROM prop_edges a
+              JOIN prop_edges b ON b.p = 27 AND b.o = ? AND b.s = a.s
+              JOIN prop_edges h ON h.p = 31 AND h.o = 5 AND h.s = a.s
+              JOIN sitelinks sl ON sl.qid = a.s AND sl.wiki = ?
+            WHERE a.p = 106 AND a.o IN ({marks})
+            ORDER BY a.s
+            LIMIT ?
+            """,
+            [c, f"{wiki_lang}.wikipedia.org", *occs, int(limit)],
+        )
+        return [(f"Q{s}", title) for s, title in rows]
+
+
+# --------------------------------------------------------------------------------------
+# Selección de backend
+# --------------------------------------------------------------------------------------
+_ACTIVE: DumpStore | None = None
+_ACTIVE_LOCK = threading.Lock()
+_ENV_CHECKED = False
+
+
+def use_dump(db_path: Path | str | None = DEFAULT_DUMP_DB) -> DumpStore | None:
+    """Activa (o desactiva con None) el backend offline para todo el proceso."""
+    global _ACTIVE, _ENV_CHECKED
+    with _ACTIVE_LOCK:
+        _ACTIVE = DumpStore(db_path) if db_path else None
+        _ENV_CHECKED = True
+        return _ACTIVE
+
+
+def active_dump() -> DumpStore | None:
+    """Store offline activo, o None si el backend es WDQS (HFKG_BACKEND=wdqs, por defecto)."""
+    global _ACTIVE, _ENV_CHECKED
+    if not _ENV_CHECKED:
+        with _ACTIVE_LOCK:
+            if not _ENV_CHECKED:
+                if os.getenv("HFKG_BACKEND", "wdqs").lower() == "dump":
+                    _ACTIVE = DumpStore(os.getenv("HFKG_DUMP_DB", str(DEFAULT_DUMP_DB)))
+                _ENV_CHECKED = True
+    return _ACTIVE
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Indexa un volcado truthy de Wikidata para uso offline.")
+    ap.add_argument("--dump", required=True, help="Ruta a latest-truthy.nt(.gz|.bz2) o a un recorte del mismo.")
+    ap.add_argument("--db", default=str(DEFAULT_DUMP_DB), help=f"SQLite de salida (default: {DEFAULT_DUMP_DB}).")
+    ap.add_argument("--langs", default="es,en", help='Idiomas de etiquetas a conservar (default: "es,en"; "" = todos).')
+    args = ap.parse_args()
+    langs = [l.strip() for l in args.langs.split(",") if l.strip()] or None
+    build_dump_store(args.dump, args.db, langs=langs)
+
+
+if __name__ == "__main__":
+    main()
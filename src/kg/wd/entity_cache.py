@@ -0,0 +1,216 @@
+# src/kg/wd/entity_cache.py
+from __future__ import annotations
+from typing import Callable, Iterable, TypeVar
+import hashlib
+import json
+
+from kg import metrics
+from kg.wd.utils import LEASE_S, get_cache, run_sparql
+
+# Caché por entidad para consultas con bloque VALUES (truthy_edges_batch, pasadas de
+# filter_by_country...). La clave de una consulta completa cambia con el orden, el lote o el
+# espaciado de las entidades; aquí cada plantilla declara qué variable liga cada fila a su
+# entidad y las filas se guardan por (plantilla, entidad, parámetros) en el mismo caché de
+# consultas (kg.wd.cache: TTL, LRU y compresión incluidos). Un lote se sirve en parte desde el
+# caché y solo las entidades que faltan se piden a WDQS, en una única consulta rearmada.
+#
+# Las claves no derivan de las de las consultas completas que se guardaban antes: esas entradas
+# no se pueden repartir por entidad (la clave es un sha1 del texto), así que estas plantillas
+# empiezan con el caché frío y las entradas viejas salen por TTL o LRU (o con `purge`).
+#
+# Cada consulta de un lote toma un lease entre procesos sobre (plantilla, parámetros, entidades
+# ordenadas): otro proceso que pide el mismo lote espera y usa las filas que el primero guardó.
+
+T = TypeVar("T")
+
+
+def _lease_key(lease_id: list) -> str:
+    return hashlib.sha1(json.dumps(lease_id, separators=(",", ":"), default=list).encode("utf-8")).hexdigest()
+
+
+def _leased(lease_id: list, kind: str, cached: Callable[[], T | None], run: Callable[[], T]) -> T:
+    """
+    `run()` bajo el lease de `lease_id`. Si otro proceso lo tiene, espera a que lo suelte y
+    devuelve `cached()` si ya quedó todo guardado; si no (el otro falló), consulta por su cuenta.
+    """
+    cache = get_cache()
+    lease = _lease_key(lease_id)
+    waited = False
+    while not cache.acquire_lease(lease, LEASE_S):
+        if not waited:
+            metrics.inc("sparql_coalesced_total", kind=kind, scope="process")
+            waited = True
+        cache.wait_for(lease, LEASE_S)
+        got = cached()
+        if got is not None:
+            return got
+    try:
+        return run()
+    finally:
+        cache.release_lease(lease)
+
+
+class EntityTemplate:
+    """
+    Plantilla de consulta por entidades.
+
+    - name: identifica la plantilla en las claves del caché (cambiarlo invalida sus entradas).
+    - render(ids, **params): texto SPARQL para un lote de entidades.
+    - var: variable de cada fila que contiene la entidad (su IRI o el QID).
+    - kind: etiqueta de métricas de las consultas (default: name).
+
+    Los parámetros (país, idiomas...) forman parte de la clave: (labels, Q30, "es,en").
+    Una entidad consultada sin filas se guarda con lista vacía (también es una respuesta).
+    """
+
+    def __init__(self, name: str, render: Callable[..., str], var: str, kind: str | None = None):
+        self.name = name
+        self.render = render
+        self.var = var
+        self.kind = kind or name
+
+    def key(self, entity: str, params: dict) -> str:
+        blob = json.dumps([self.name, sorted(params.items()), entity], separators=(",", ":"), default=list)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def lookup(self, ids: Iterable[str], **params) -> tuple[dict[str, list[dict]], list[str]]:
+        """Filas cacheadas por entidad y lista (en orden) de las entidades que faltan."""
+        ids = list(dict.fromkeys(ids))
+        keys = {x: self.key(x, params) for x in ids}
+        got = get_cache().get_many(list(keys.values())) if ids else {}
+        found = {x: got[k]["rows"] for x, k in keys.items() if k in got}
+        missing = [x for x in ids if x not in found]
+        if found:
+            metrics.inc("entity_cache_total", len(found), template=self.name, result="hit")
+        if missing:
+            metrics.inc("entity_cache_total", len(missing), template=self.name, result="miss")
+        return found, missing
+
+    def cached(self, ids: Iterable[str], **params) -> set[str]:
+        """Entidades de `ids` con filas vigentes en el caché (sin métricas; ver `kg.pipeline.prefetch`)."""
+        keys = {x: self.key(x, params) for x in dict.fromkeys(ids)}
+        present = get_cache().contains_many(list(keys.values()))
+        return {x for x, k in keys.items() if k in present}
+
+    def fetch(self, ids: list[str], retry_timeouts: bool = False, **params) -> dict[str, list[dict]]:
+        """
+        Consulta `ids` en WDQS (una sola consulta, sin pasar por el caché de consultas completas),
+        reparte las filas por entidad y las guarda. Devuelve entidad → filas para todo `ids`.
+        """
+        keys = {x: self.key(x, params) for x in ids}
+
+        def cached() -> dict[str, list[dict]] | None:
+            got = get_cache().get_many(list(keys.values()))
+            return {x: got[k]["rows"] for x, k in keys.items()} if len(got) == len(keys) else None
+
+        def run() -> dict[str, list[dict]]:
+            res = run_sparql(self.render(ids, **params), use_cache=False, retry_timeouts=retry_timeouts,
+                             kind=self.kind)
+            rows: dict[str, list[dict]] = {x: [] for x in ids}
+            for b in res["results"]["bindings"]:
+                x = b.get(self.var, {}).get("value", "").rsplit("/", 1)[-1]
+                if x in rows:
+                    rows[x].append(b)
+            get_cache().put_many({keys[x]: {"rows": r} for x, r in rows.items()})
+            return rows
+
+        return _leased([self.name, sorted(params.items()), sorted(ids)], self.kind, cached, run)
+
+    def run(self, ids: Iterable[str], retry_timeouts: bool = True, **params) -> dict[str, list[dict]]:
+        """`lookup` + `fetch` de las que faltan (sin lotes: para lotes adaptativos, ver `map`)."""
+        found, missing = self.lookup(ids, **params)
+        if missing:
+            found.update(self.fetch(missing, retry_timeouts=retry_timeouts, **params))
+        return found
+
+    def map(self, ids: Iterable[str], batcher, cap: Callable[[], int] | None = None, **params):
+        """
+        Como `batcher.map`, pero los lotes solo contienen entidades sin caché: produce
+        (lote, entidad → filas), primero un único lote con todo lo cacheado y luego los consultados.
+        """
+        found, missing = self.lookup(ids, **params)
+        if found:
+            yield list(found), found
+        if missing:
+            fn = lambda chunk: self.fetch(chunk, **params)
+            yield from batcher.map(missing, fn, cap=cap)
+
+
+class FanOutTemplate:
+    """
+    Plantilla que resuelve varios valores de un parámetro en la misma consulta (p. ej. todos los
+    países con `VALUES ?country`) pero guarda cada (entidad, valor) con las claves de `base`, la
+    plantilla de un solo valor: las corridas de un país y las de varios comparten entradas.
+
+    - render(ids, values): texto SPARQL para un lote de entidades y todos los valores.
+    - param: parámetro de `base` que toma cada valor (p. ej. "country").
+    - value_var: variable de cada fila con el valor (su IRI o el QID).
+    """
+
+    def __init__(self, name: str, base: EntityTemplate, render: Callable[..., str], param: str,
+                 value_var: str, kind: str | None = None):
+        self.name = name
+        self.base = base
+        self.render = render
+        self.param = param
+        self.value_var = value_var
+        self.kind = kind or base.kind
+
+    def _keys(self, ids: list[str], values: list[str]) -> dict[tuple[str, str], str]:
+        return {(x, v): self.base.key(x, {self.param: v}) for x in ids for v in values}
+
+    def _split(self, keys: dict[tuple[str, str], str], got: dict[str, dict], values: list[str]):
+        out: dict[str, dict[str, list[dict]]] = {v: {} for v in values}
+        for (x, v), k in keys.items():
+            if k in got:
+                out[v][x] = got[k]["rows"]
+        return out
+
+    def lookup(self, ids: Iterable[str], values: Iterable[str]) -> tuple[dict[str, dict[str, list[dict]]], list[str]]:
+        """Filas cacheadas (valor → entidad → filas) y las entidades a las que les falta algún valor."""
+        ids, values = list(dict.fromkeys(ids)), list(dict.fromkeys(values))
+        keys = self._keys(ids, values)
+        got = get_cache().get_many(list(keys.values())) if keys else {}
+        found = self._split(keys, got, values)
+        missing = [x for x in ids if any(x not in found[v] for v in values)]
+        hits = len(got)
+        if hits:
+            metrics.inc("entity_cache_total", hits, template=self.name, result="hit")
+        if len(keys) > hits:
+            metrics.inc("entity_cache_total", len(keys) - hits, template=self.name, result="miss")
+        return found, missing
+
+    def fetch(self, ids: list[str], values: list[str], retry_timeouts: bool = False) -> dict[str, dict[str, list[dict]]]:
+        """Consulta `ids` para todos los `values` y guarda cada (entidad, valor); devuelve valor → entidad → filas."""
+        keys = self._keys(ids, values)
+
+        def cached() -> dict[str, dict[str, list[dict]]] | None:
+            got = get_cache().get_many(list(keys.values()))
+            return self._split(keys, got, values) if len(got) == len(keys) else None
+
+        def run() -> dict[str, dict[str, list[dict]]]:
+            res = run_sparql(self.render(ids, tuple(values)), use_cache=False, retry_timeouts=retry_timeouts,
+                             kind=self.kind)
+            rows: dict[str, dict[str, list[dict]]] = {v: {x: [] for x in ids} for v in values}
+            for b in res["results"]["bindings"]:
+                x = b.get(self.base.var, {}).get("value", "").rsplit("/", 1)[-1]
+                v = b.get(self.value_var, {}).get("value", "").rsplit("/", 1)[-1]
+                if v in rows and x in rows[v]:
+                    # la fila queda igual que la de `base` (sin la variable del valor)
+                    rows[v][x].append({n: t for n, t in b.items() if n != self.value_var})
+            get_cache().put_many({keys[x, v]: {"rows": r} for v, per in rows.items() for x, r in per.items()})
+            return rows
+
+        return _leased([self.name, sorted(values), sorted(ids)], self.kind, cached, run)
+
+    def map(self, ids: Iterable[str], values: Iterable[str], batcher, cap: Callable[[], int] | None = None):
+        """Como `EntityTemplate.map`: produce (lote, valor → entidad → filas)."""
+        values = list(dict.fromkeys(values))
+        found, missing = self.lookup(ids, values)
+        todo = set(missing)
+        done = [x for x in dict.fromkeys(ids) if x not in todo]
+        if done:
+            yield done, {v: {x: found[v][x] for x in done} for v in values}
+        if missing:
+            fn = lambda chunk: self.fetch(chunk, values)
+            yield from batcher.map(missing, fn, cap=cap)
@@ -0,0 +1,128 @@
+# src/kg/wd/expand.py
+from __future__ import annotations
+from typing import Iterable
+import re
+
+from kg import metrics
+from kg.wd.truthy import truthy_edges_batch
+
+# Expansión de vecindarios de grado k (BFS por niveles) a partir de las aristas truthy.
+# Las fronteras de todos los sujetos de una ventana se consultan juntas en lotes
+# (truthy_edges_batch) y las aristas ya descargadas se comparten entre sujetos,
+# de modo que un nodo común (una ciudad, una universidad) se consulta una sola vez por corrida.
+
+_QID_RE = re.compile(r"^Q\d+$")
+
+# Propiedades cuyos objetos son "hubs" (clases, sexo, idiomas, países...): llevan a nodos con
+# miles de vecinos y no aportan al vecindario de un sujeto. No se siguen y, más allá del
+# primer salto, tampoco se emiten.
+HUB_PROPS = frozenset({
+    "P31",    # instancia de
+    "P279",   # subclase de
+    "P21",    # sexo o género
+    "P17",    # país
+    "P27",    # nacionalidad
+    "P30",    # continente
+    "P103",   # lengua materna
+    "P407",   # idioma de la obra
+    "P1412",  # idiomas hablados
+    "P495",   # país de origen
+    "P910",   # categoría principal
+    "P1343",  # descrito en la fuente
+    "P361",   # parte de
+    "P1552",  # tiene la cualidad
+})
+
+Triple = tuple[str, str, str]
+
+
+def _num(x: str) -> int:
+    return int(x[1:]) if x[1:].isdigit() else -1
+
+
+def _edge_key(e: tuple[str, str]) -> tuple:
+    return (_num(e[0]), e[0], _num(e[1]), e[1])
+
+
+class KHopExpander:
+    """
+    BFS de `hops` saltos desde cada sujeto sobre aristas truthy (P, Q).
+
+    - max_nodes_per_hop: nodos nuevos que cada salto agrega a la frontera (por sujeto).
+    - max_edges_per_hop: aristas que cada salto emite (por sujeto).
+    - exclude_props: propiedades que no se siguen (por defecto `HUB_PROPS`).
+    - max_degree: nodos con más aristas salientes no se expanden (0 = sin límite).
+
+    `self.edges` es el conjunto de visitados compartido entre todos los sujetos de la corrida
+    (QID → aristas). Los recortes son deterministas: fronteras y aristas se recorren en
+    orden numérico de (P, Q), así que el resultado no depende del orden de los sujetos.
+    """
+
+    def __init__(self, hops: int = 2, *, max_nodes_per_hop: int = 500, max_edges_per_hop: int = 5000,
+                 exclude_props: Iterable[str] | None = None, max_degree: int = 0, batch_size: int = 50):
+        if hops < 1:
+            raise ValueError("hops debe ser >= 1")
+        self.hops = hops
+        self.max_nodes_per_hop = max_nodes_per_hop
+        self.max_edges_per_hop = max_edges_per_hop
+        self.exclude_props = frozenset(HUB_PROPS if exclude_props is None else exclude_props)
+        self.max_degree = max_degree
+        self.batch_size = batch_size
+        self.edges: dict[str, list[tuple[str, str]]] = {}
+
+    def fetch(self, qids: Iterable[str]) -> None:
+        """Descarga (por lotes) las aristas de los nodos que aún no se han visitado."""
+        missing = list(dict.fromkeys(q for q in qids if q not in self.edges and _QID_RE.match(q)))
+        if not missing:
+            return
+        with metrics.timer("stage_seconds", stage="expand_fetch"):
+            got = truthy_edges_batch(missing, batch_size=self.batch_size)
+        for q in missing:
+            self.edges[q] = sorted({(P, Q) for P, Q in got.get(q, []) if Q.startswith("Q")}, key=_edge_key)
+        metrics.inc("expand_nodes_fetched_total", len(missing))
+
+    def _out(self, node: str, hop: int) -> list[tuple[str, str]]:
+        edges = self.edges.get(node, [])
+        if hop > 1:
+            if self.max_degree and len(edges) > self.max_degree:
+                return []
+            edges = [e for e in edges if e[0] not in self.exclude_props]
+        return edges
+
+    def expand(self, roots: list[str],
+               seeds: dict[str, list[tuple[str, str]]] | None = None) -> dict[str, list[Triple]]:
+        """
+        Vecindario de grado k de cada sujeto como lista de tripletas (s, P, o).
+        `seeds` permite fijar las aristas del primer salto (p. ej. ya filtradas por país);
+        los sujetos sin semilla usan sus aristas truthy completas.
+        """
+        seeds = seeds or {}
+        roots = list(dict.fromkeys(roots))
+        seen = {r: {r} for r in roots}
+        frontier = {r: [r] for r in roots}
+        out: dict[str, list[Triple]] = {r: [] for r in roots}
+
+        for hop in range(1, self.hops + 1):
+            # una sola tanda de consultas por nivel para todos los sujetos
+            self.fetch(q for r in roots for q in frontier[r] if not (hop == 1 and r in seeds))
+            for r in roots:
+                triples: list[Triple] = []
+                for s in frontier[r]:
+                    edges = sorted(seeds[r], key=_edge_key) if hop == 1 and r in seeds else self._out(s, hop)
+                    triples.extend((s, P, Q) for P, Q in edges)
+                    if len(triples) >= self.max_edges_per_hop:
+                        break
+                triples = triples[:self.max_edges_per_hop]
+                out[r].extend(triples)
+
+                nxt: list[str] = []
+                if hop < self.hops:
+                    for _, P, Q in triples:
+                        if len(nxt) >= self.max_nodes_per_hop:
+                            break
+                        if P not in self.exclude_props and Q not in seen[r]:
+                            seen[r].add(Q)
+                            nxt.append(Q)
+                frontier[r] = nxt
+                metrics.inc("expand_edges_total", len(triples), hop=hop)
+        return out
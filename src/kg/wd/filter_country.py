@@ -1,7 +1,13 @@
 from __future__ import annotations
 from typing import Iterable, Set
 import re
-from kg.wd.utils import run_sparql
+from kg import metrics
+from kg.wd.batching import get_batcher
+from kg.wd.dump import active_dump
+from kg.wd.entity_cache import EntityTemplate, FanOutTemplate
+from kg.wd.places import PlaceIndex, get_place_index
+from kg.wd.verdicts import (VerdictStore, get_verdict_store,
+                            PASS_DIRECT, PASS_P131, PASS_LOCATED)
 
 _QID_RE = re.compile(r"^Q\d+$")
 
@@ -11,18 +17,92 @@ def _only_qids(qids: Iterable[str]) -> list[str]:
 def _values_block(qids: list[str]) -> str:
     return " ".join(f"wd:{q}" for q in qids)
 
-def _select_o(query_core: str) -> Set[str]:
-    res = run_sparql(query_core)
-    out: Set[str] = set()
-    for b in res["results"]["bindings"]:
-        out.add(b["o"]["value"].split("/")[-1])
-    return out
+def _p1_query(chunk: list[str], country: str) -> str:
+    # pasada 1: P27/P17 directos
+    vals = _values_block(chunk)
+    return f"""
+    SELECT DISTINCT ?o WHERE {{
+      VALUES ?o {{ {vals} }}
+      {{ ?o wdt:P27 wd:{country} . }} UNION {{ ?o wdt:P17 wd:{country} . }}
+    }}
+    """
+
+
+def _p2_query(chunk: list[str], country: str) -> str:
+    # pasada 2: P131 sin '*', hasta 3 saltos
+    vals = _values_block(chunk)
+    return f"""
+    SELECT DISTINCT ?o WHERE {{
+      VALUES ?o {{ {vals} }}
+      {{
+        ?o wdt:P131 ?a1 . ?a1 wdt:P17 wd:{country} .
+      }} UNION {{
+        ?o wdt:P131 ?a1 . ?a1 wdt:P131 ?a2 . ?a2 wdt:P17 wd:{country} .
+      }} UNION {{
+        ?o wdt:P131 ?a1 . ?a1 wdt:P131 ?a2 . ?a2 wdt:P131 ?a3 . ?a3 wdt:P17 wd:{country} .
+      }}
+    }}
+    """
+
+
+def _p3_query(chunk: list[str], country: str) -> str:
+    # pasada 3: P159/P276 con lugar en el país directo o vía P131 1–2 saltos
+    vals = _values_block(chunk)
+    return f"""
+    SELECT DISTINCT ?o WHERE {{
+      VALUES ?o {{ {vals} }}
+      {{
+        ?o wdt:P159 ?hq .
+        {{ ?hq wdt:P17 wd:{country} . }}
+        UNION
+        {{ ?hq wdt:P131 ?b1 . ?b1 wdt:P17 wd:{country} . }}
+        UNION
+        {{ ?hq wdt:P131 ?b1 . ?b1 wdt:P131 ?b2 . ?b2 wdt:P17 wd:{country} . }}
+      }}
+      UNION
+      {{
+        ?o wdt:P276 ?place .
+        {{ ?place wdt:P17 wd:{country} . }}
+        UNION
+        {{ ?place wdt:P131 ?c1 . ?c1 wdt:P17 wd:{country} . }}
+        UNION
+        {{ ?place wdt:P131 ?c1 . ?c1 wdt:P131 ?c2 . ?c2 wdt:P17 wd:{country} . }}
+      }}
+    }}
+    """
+
+
+def _p1_multi_query(chunk: list[str], countries: tuple[str, ...]) -> str:
+    vals = _values_block(chunk)
+    return f"""
+    SELECT DISTINCT ?o ?country WHERE {{
+      VALUES ?o {{ {vals} }}
+      VALUES ?country {{ {_values_block(list(countries))} }}
+      {{ ?o wdt:P27 ?country . }} UNION {{ ?o wdt:P17 ?country . }}
+    }}
+    """
+
+
+# caché por (pasada, objeto, país): una fila ?o significa que el objeto pasa el filtro
+FILTER_P1 = EntityTemplate("filter_p1", _p1_query, var="o")
+FILTER_P2 = EntityTemplate("filter_p2", _p2_query, var="o")
+FILTER_P3 = EntityTemplate("filter_p3", _p3_query, var="o")
+# varios países en una consulta, guardados con las claves (objeto, país) de FILTER_P1
+FILTER_P1_MULTI = FanOutTemplate("filter_p1_multi", FILTER_P1, _p1_multi_query, param="country",
+                                 value_var="country")
+
+
+def _passed(rows: dict[str, list[dict]]) -> Set[str]:
+    return {o for o, r in rows.items() if r}
+
 
 def filter_by_country(qids: Iterable[str],
                       country_qid: str,
                       batch_p1: int = 40,   # P27/P17 directos (rápido)
                       batch_p2: int = 10,   # P131 a ≤3 saltos (medio)
-                      batch_p3: int = 8     # P159/P276 (lento)
+                      batch_p3: int = 8,    # P159/P276 (lento)
+                      store: VerdictStore | None | bool = True,
+                      places: PlaceIndex | None | bool = True
                       ) -> Set[str]:
     """
     Devuelve los QIDs del conjunto de entrada que están relacionados con el país dado,
@@ -31,10 +111,20 @@ def filter_by_country(qids: Iterable[str],
       2) Vía P131 hasta 3 saltos (sin usar '*')
       3) P159 (HQ) o P276 (situado en) con lugar en el país (directo o vía P131 1-2 saltos)
 
+    Con `places` (por defecto), las pasadas 2 y 3 se resuelven localmente con el índice
+    de lugares del país (kg.wd.places): se traen los P131/P159/P276 de los objetos en
+    lotes grandes y la jerarquía P131 se recorre completa (sin límite de saltos).
+
     Parámetros:
       - qids: iterable de QIDs candidatos (solo se consideran Q\\d+)
       - country_qid: QID del país objetivo (ej. 'Q30' EE. UU., 'Q183' Alemania)
-      - batch_p1/p2/p3: tamaños de lote por pasada para evitar timeouts en WDQS
+      - batch_p1/p2/p3: tamaños de lote iniciales por pasada. Luego se adaptan (kg.wd.batching):
+                        crecen mientras WDQS responde rápido y, ante un timeout, el lote
+                        se parte en mitades; lo aprendido se guarda en data/batch_sizes.json
+      - store: caché de veredictos por (objeto, país). True = store por defecto en disco,
+               False/None = sin caché. Solo se consulta a WDQS por los QIDs sin veredicto.
+      - places: índice de lugares. True = índice por defecto en disco; False/None = pasadas
+                2 y 3 remotas (consultas P131 desenrolladas, como antes).
     """
     if not _QID_RE.match(country_qid):
         raise ValueError(f"country_qid inválido: {country_qid!r} (se espera 'Q\\d+')")
@@ -42,79 +132,140 @@ def filter_by_country(qids: Iterable[str],
     qids = list(dict.fromkeys(_only_qids(qids)))
     ok: Set[str] = set()
 
+    # backend offline: las 3 pasadas se resuelven sobre el índice local
+    dump = active_dump()
+    if dump:
+        return dump.filter_by_country(qids, country_qid)
+
+    if store is True:
+        store = get_verdict_store()
+    if store:
+        known = store.get_many(qids, country_qid)
+        ok |= {q for q, (inside, _) in known.items() if inside}
+        qids = [q for q in qids if q not in known]
+        if not qids:
+            return ok
+
     # PASO 1 — rápido (P27/P17)
-    for i in range(0, len(qids), batch_p1):
-        chunk = qids[i:i+batch_p1]
-        if not chunk:
-            continue
-        vals = _values_block(chunk)
-        q1 = f"""
-        SELECT DISTINCT ?o WHERE {{
-          VALUES ?o {{ {vals} }}
-          {{ ?o wdt:P27 wd:{country_qid} . }} UNION {{ ?o wdt:P17 wd:{country_qid} . }}
-        }}
-        """
-        ok1 = _select_o(q1)
-        ok |= ok1
+    with metrics.timer("stage_seconds", stage="filter_p1"):
+        batcher = get_batcher("filter.p1", batch_p1, max_size=400)
+        for chunk, rows in FILTER_P1.map(qids, batcher, country=country_qid):
+            ok1 = _passed(rows)
+            ok |= ok1
+            if store:
+                store.put_many(ok1 & set(chunk), country_qid, True, PASS_DIRECT)
 
     rem1 = [q for q in qids if q not in ok]
     if not rem1:
         return ok
 
-    # PASO 2 — medio (P131 sin '*', hasta 3 saltos)
-    for i in range(0, len(rem1), batch_p2):
-        chunk = rem1[i:i+batch_p2]
-        if not chunk:
-            continue
-        vals = _values_block(chunk)
-        q2 = f"""
-        SELECT DISTINCT ?o WHERE {{
-          VALUES ?o {{ {vals} }}
-          {{
-            ?o wdt:P131 ?a1 . ?a1 wdt:P17 wd:{country_qid} .
-          }} UNION {{
-            ?o wdt:P131 ?a1 . ?a1 wdt:P131 ?a2 . ?a2 wdt:P17 wd:{country_qid} .
-          }} UNION {{
-            ?o wdt:P131 ?a1 . ?a1 wdt:P131 ?a2 . ?a2 wdt:P131 ?a3 . ?a3 wdt:P17 wd:{country_qid} .
-          }}
-        }}
-        """
-        ok2 = _select_o(q2)
+    if places is True:
+        places = get_place_index()
+    if places:
+        # PASOS 2 y 3 — locales: hechos por lotes + cierre P131 del país en memoria
+        with metrics.timer("stage_seconds", stage="filter_p2"):
+            ok2 = places.located_in(rem1, country_qid, (131,))
         ok |= ok2
+        if store:
+            store.put_many(ok2, country_qid, True, PASS_P131)
+        rem2 = [q for q in rem1 if q not in ok]
+        with metrics.timer("stage_seconds", stage="filter_p3"):
+            ok3 = places.located_in(rem2, country_qid, (159, 276)) if rem2 else set()
+        ok |= ok3
+        if store:
+            store.put_many(ok3, country_qid, True, PASS_LOCATED)
+            store.put_many([q for q in rem2 if q not in ok3], country_qid, False, PASS_LOCATED)
+        return ok
+
+    # PASO 2 — medio (P131 sin '*', hasta 3 saltos)
+    with metrics.timer("stage_seconds", stage="filter_p2"):
+        batcher = get_batcher("filter.p2", batch_p2, max_size=200)
+        for chunk, rows in FILTER_P2.map(rem1, batcher, country=country_qid):
+            ok2 = _passed(rows)
+            ok |= ok2
+            if store:
+                store.put_many(ok2 & set(chunk), country_qid, True, PASS_P131)
 
     rem2 = [q for q in rem1 if q not in ok]
     if not rem2:
         return ok
 
     # PASO 3 — lento (P159/P276) con lugar en el país directo o vía P131 1–2 saltos
-    for i in range(0, len(rem2), batch_p3):
-        chunk = rem2[i:i+batch_p3]
-        if not chunk:
-            continue
-        vals = _values_block(chunk)
-        q3 = f"""
-        SELECT DISTINCT ?o WHERE {{
-          VALUES ?o {{ {vals} }}
-          {{
-            ?o wdt:P159 ?hq .
-            {{ ?hq wdt:P17 wd:{country_qid} . }}
-            UNION
-            {{ ?hq wdt:P131 ?b1 . ?b1 wdt:P17 wd:{country_qid} . }}
-            UNION
-            {{ ?hq wdt:P131 ?b1 . ?b1 wdt:P131 ?b2 . ?b2 wdt:P17 wd:{country_qid} . }}
-          }}
-          UNION
-          {{
-            ?o wdt:P276 ?place .
-            {{ ?place wdt:P17 wd:{country_qid} . }}
-            UNION
-            {{ ?place wdt:P131 ?c1 . ?c1 wdt:P17 wd:{country_qid} . }}
-            UNION
-            {{ ?place wdt:P131 ?c1 . ?c1 wdt:P131 ?c2 . ?c2 wdt:P17 wd:{country_qid} . }}
-          }}
-        }}
-        """
-        ok3 = _select_o(q3)
-        ok |= ok3
+    with metrics.timer("stage_seconds", stage="filter_p3"):
+        batcher = get_batcher("filter.p3", batch_p3, max_size=200)
+        for chunk, rows in FILTER_P3.map(rem2, batcher, country=country_qid):
+            ok3 = _passed(rows)
+            ok |= ok3
+            if store:
+                store.put_many(ok3 & set(chunk), country_qid, True, PASS_LOCATED)
+                # lo que no pasó ninguna de las 3 pasadas queda fuera del país
+                store.put_many([q for q in chunk if q not in ok3], country_qid, False, PASS_LOCATED)
+
+    return ok
 
+
+def filter_by_countries(qids: Iterable[str],
+                        country_qids: Iterable[str],
+                        batch_p1: int = 40,
+                        store: VerdictStore | None | bool = True,
+                        places: PlaceIndex | None | bool = True
+                        ) -> dict[str, Set[str]]:
+    """
+    Como `filter_by_country`, pero para varios países a la vez: devuelve país → QIDs en ese país.
+
+    La pasada 1 liga `?country` con VALUES y obtiene en una sola consulta las pertenencias
+    de cada objeto a todos los países; las pasadas 2 y 3 usan el índice de lugares, cuyos
+    hechos (P131/P159/P276) se consultan una vez y se comparten entre países. Así la carga
+    sobre WDQS depende de los objetos únicos, no de objetos × países.
+    Con un solo país (o `places=False`) se delega en `filter_by_country`.
+    """
+    countries = list(dict.fromkeys(country_qids))
+    for c in countries:
+        if not _QID_RE.match(c):
+            raise ValueError(f"country_qid inválido: {c!r} (se espera 'Q\\d+')")
+    qids = list(dict.fromkeys(_only_qids(qids)))
+    if len(countries) <= 1 or not places or active_dump():
+        return {c: filter_by_country(qids, c, batch_p1=batch_p1, store=store, places=places)
+                for c in countries}
+
+    ok: dict[str, Set[str]] = {c: set() for c in countries}
+    todo: dict[str, list[str]] = {c: list(qids) for c in countries}   # sin veredicto, por país
+    if store is True:
+        store = get_verdict_store()
+    if store:
+        for c in countries:
+            known = store.get_many(qids, c)
+            ok[c] |= {q for q, (inside, _) in known.items() if inside}
+            todo[c] = [q for q in qids if q not in known]
+
+    # PASO 1 — P27/P17 directos para todos los países en la misma consulta
+    todo_sets = {c: set(v) for c, v in todo.items()}
+    pending = [q for q in qids if any(q in s for s in todo_sets.values())]
+    with metrics.timer("stage_seconds", stage="filter_p1"):
+        batcher = get_batcher("filter.p1", batch_p1, max_size=400)
+        for chunk, rows in FILTER_P1_MULTI.map(pending, sorted(countries), batcher):
+            for c in countries:
+                new = _passed(rows[c]) & todo_sets[c]
+                ok[c] |= new
+                if store:
+                    store.put_many(new, c, True, PASS_DIRECT)
+
+    # PASOS 2 y 3 — locales, con los hechos de lugares compartidos entre países
+    if places is True:
+        places = get_place_index()
+    for c in countries:
+        rem1 = [q for q in todo[c] if q not in ok[c]]
+        if not rem1:
+            continue
+        with metrics.timer("stage_seconds", stage="filter_p2"):
+            ok2 = places.located_in(rem1, c, (131,))
+        ok[c] |= ok2
+        rem2 = [q for q in rem1 if q not in ok2]
+        with metrics.timer("stage_seconds", stage="filter_p3"):
+            ok3 = places.located_in(rem2, c, (159, 276)) if rem2 else set()
+        ok[c] |= ok3
+        if store:
+            store.put_many(ok2, c, True, PASS_P131)
+            store.put_many(ok3, c, True, PASS_LOCATED)
+            store.put_many([q for q in rem2 if q not in ok3], c, False, PASS_LOCATED)
     return ok
@@ -0,0 +1,212 @@
+# src/kg/wd/label_store.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable
+import re
+import sqlite3
+import threading
+import time
+
+from kg.wd.utils import DATA_ROOT, run_sparql, store_ttl_s
+from kg.wd.batching import get_batcher
+from kg.wd.dump import active_dump
+
+LABELS_DB = DATA_ROOT / "labels.sqlite"
+
+_ID_RE = re.compile(r"^[QP]\d+$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS labels (
+    id         TEXT NOT NULL,      -- Q... o P...
+    lang       TEXT NOT NULL,
+    label      TEXT,               -- NULL = la entidad no tiene etiqueta en ese idioma
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (id, lang)
+) WITHOUT ROWID;
+"""
+
+
+def _parse_langs(langs: str | Iterable[str]) -> list[str]:
+    if isinstance(langs, str):
+        langs = langs.split(",")
+    return list(dict.fromkeys(l.strip() for l in langs if l and l.strip()))
+
+
+class LabelStore:
+    """
+    Etiquetas multilingües persistentes por (id, idioma), para entidades (Q) y propiedades (P).
+
+    - Deduplica en todo el proceso: capa en memoria + SQLite en disco (WAL, seguro entre procesos).
+    - Solo consulta a WDQS los pares (id, idioma) desconocidos: cambiar --label-langs
+      trae únicamente los idiomas que faltan.
+    - Las consultas se parten en lotes adaptativos (kg.wd.batching), acotados además por
+      la longitud del texto de la consulta.
+    - Con `ttl_s`, un par obtenido hace más que eso cuenta como desconocido y se vuelve a pedir.
+    """
+
+    def __init__(self, path: Path | str = LABELS_DB, batch_size: int = 300, max_query_chars: int = 12000,
+                 ttl_s: float | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.max_query_chars = max_query_chars
+        self.ttl_s = ttl_s
+        self._mem: dict[tuple[str, str], tuple[str | None, float]] = {}   # (id, idioma) → (etiqueta, fetched_at)
+        self._mem_lock = threading.Lock()
+        self._local = threading.local()
+        c = self._conn()
+        c.execute("PRAGMA journal_mode=WAL")
+        c.executescript(_SCHEMA)
+        if "updated" in {row[1] for row in c.execute("PRAGMA table_info(labels)")}:
+            with c:
+                c.execute("ALTER TABLE labels RENAME COLUMN updated TO fetched_at")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.path), timeout=60)
+            c.execute("PRAGMA busy_timeout=60000")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    # ---- almacenamiento ----
+    def _lookup(self, ids: list[str], langs: list[str]) -> dict[tuple[str, str], str | None]:
+        """Pares (id, idioma) conocidos y vigentes (memoria y luego disco)."""
+        found: dict[tuple[str, str], str | None] = {}
+        pending: list[str] = []
+        cutoff = time.time() - self.ttl_s if self.ttl_s is not None else 0.0
+        with self._mem_lock:
+            for x in ids:
+                if all((x, l) in self._mem and self._mem[(x, l)][1] >= cutoff for l in langs):
+                    for l in langs:
+                        found[(x, l)] = self._mem[(x, l)][0]
+                else:
+                    pending.append(x)
+        if not pending:
+            return found
+        c = self._conn()
+        lmarks = ",".join("?" * len(langs))
+        from_disk: dict[tuple[str, str], tuple[str | None, float]] = {}
+        for i in range(0, len(pending), 400):
+            chunk = pending[i:i + 400]
+            rows = c.execute(
+                f"SELECT id, lang, label, fetched_at FROM labels WHERE lang IN ({lmarks}) "
+                f"AND fetched_at >= ? AND id IN ({','.join('?' * len(chunk))})",
+                [*langs, cutoff, *chunk],
+            )
+            for x, l, lab, at in rows:
+                from_disk[(x, l)] = (lab, at)
+        with self._mem_lock:
+            self._mem.update(from_disk)
+        found.update((k, lab) for k, (lab, _) in from_disk.items())
+        return found
+
+    def _save(self, values: dict[tuple[str, str], str | None]) -> None:
+        if not values:
+            return
+        now = time.time()
+        with self._conn() as c:
+            c.executemany(
+                "INSERT OR REPLACE INTO labels (id, lang, label, fetched_at) VALUES (?, ?, ?, ?)",
+                [(x, l, lab, now) for (x, l), lab in values.items()],
+            )
+        with self._mem_lock:
+            self._mem.update((k, (lab, now)) for k, lab in values.items())
+
+    def clear(self) -> None:
+        """Borra todas las etiquetas guardadas (en disco y en memoria)."""
+        with self._conn() as c:
+            c.execute("DELETE FROM labels")
+        with self._mem_lock:
+            self._mem.clear()
+
+    # ---- consultas ----
+    def _fetch(self, ids: list[str], langs: list[str]) -> dict[tuple[str, str], str | None]:
+        out: dict[tuple[str, str], str | None] = {}
+        lang_list = ", ".join(f'"{l}"' for l in langs)
+        cost = max(len(x) for x in ids) + 4  # "wd:Qxxx "
+        batcher = get_batcher("labels", self.batch_size, max_size=max(1, self.max_query_chars // cost))
+
+        def query(chunk: list[str]) -> dict:
+            values = " ".join(f"wd:{x}" for x in chunk)
+            return run_sparql(f"""
+            SELECT ?x ?l WHERE {{
+              VALUES ?x {{ {values} }}
+              ?x rdfs:label ?l .
+              FILTER(LANG(?l) IN ({lang_list}))
+            }}
+            """, retry_timeouts=False, kind="labels")
+
+        for chunk, res in batcher.map(ids, query, cap=lambda: self.max_query_chars // cost):
+            got: dict[tuple[str, str], str | None] = {(x, l): None for x in chunk for l in langs}
+            for b in res["results"]["bindings"]:
+                x = b["x"]["value"].split("/")[-1]
+                l = b["l"].get("xml:lang", "")
+                if (x, l) in got:
+                    got[(x, l)] = b["l"]["value"]
+            self._save(got)
+            out.update(got)
+        return out
+
+    def missing(self, ids: Iterable[str], langs: str | Iterable[str] = "es,en") -> list[str]:
+        """Ids a los que les falta algún idioma de `langs` en el store (no consulta WDQS)."""
+        langs = _parse_langs(langs)
+        ids = list(dict.fromkeys(x for x in ids if x and _ID_RE.match(x)))
+        if not ids or not langs:
+            return []
+        known = self._lookup(ids, langs)
+        return [x for x in ids if any((x, l) not in known for l in langs)]
+
+    def prefetch(self, ids: Iterable[str], langs: str | Iterable[str] = "es,en") -> None:
+        """Asegura que todos los pares (id, idioma) estén en el store (sin resolver)."""
+        langs = _parse_langs(langs)
+        ids = list(dict.fromkeys(x for x in ids if x and _ID_RE.match(x)))
+        if not ids or not langs:
+            return
+        known = self._lookup(ids, langs)
+        # agrupar por idiomas faltantes, para no pedir idiomas ya conocidos
+        missing: dict[tuple[str, ...], list[str]] = {}
+        for x in ids:
+            need = tuple(l for l in langs if (x, l) not in known)
+            if need:
+                missing.setdefault(need, []).append(x)
+        for need, xs in missing.items():
+            self._fetch(xs, list(need))
+
+    def resolve(self, ids: Iterable[str], langs: str | Iterable[str] = "es,en") -> dict[str, str]:
+        """
+        id → etiqueta en el primer idioma disponible de `langs` (o el propio id si no hay),
+        igual que `SERVICE wikibase:label`.
+        """
+        langs = _parse_langs(langs)
+        ids = list(dict.fromkeys(x for x in ids if x and _ID_RE.match(x)))
+        if not ids:
+            return {}
+        self.prefetch(ids, langs)
+        known = self._lookup(ids, langs)
+        out: dict[str, str] = {}
+        for x in ids:
+            out[x] = next((known[(x, l)] for l in langs if known.get((x, l))), x)
+        return out
+
+
+_STORE: LabelStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_label_store() -> LabelStore:
+    """Store por defecto (data/labels.sqlite, vigencia `store_ttl_s()`), creado bajo demanda."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = LabelStore(ttl_s=store_ttl_s())
+        return _STORE
+
+
+def resolve_labels(ids: Iterable[str], langs: str = "es,en") -> dict[str, str]:
+    """Etiquetas para entidades y propiedades (backend offline si está activo; si no, LabelStore)."""
+    dump = active_dump()
+    if dump:
+        return dump.labels([x for x in dict.fromkeys(ids) if x and _ID_RE.match(x)], langs=langs)
+    return get_label_store().resolve(ids, langs)
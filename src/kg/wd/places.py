@@ -0,0 +1,311 @@
+# src/kg/wd/places.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable
+import argparse
+import sqlite3
+import threading
+import time
+
+from kg.wd.utils import DATA_ROOT, run_sparql, store_ttl_s
+from kg.wd.batching import get_batcher
+
+PLACES_DB = DATA_ROOT / "places.sqlite"
+
+# hechos que se guardan por entidad: país, división administrativa, sede y ubicación
+FACT_PROPS = (17, 131, 159, 276)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS facts (
+    qid    INTEGER NOT NULL,
+    p      INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    PRIMARY KEY (qid, p, target)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fetched (
+    qid        INTEGER PRIMARY KEY,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inside (
+    country    INTEGER NOT NULL,
+    qid        INTEGER NOT NULL,
+    value      INTEGER NOT NULL,
+    fetched_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (country, qid)
+) WITHOUT ROWID;
+"""
+
+
+def _num(qid: str) -> int:
+    return int(qid[1:])
+
+
+class PlaceIndex:
+    """
+    Índice local "lugares en el país" para las pasadas 2 y 3 de filter_by_country.
+
+    Guarda en disco (SQLite WAL, compartido entre países y procesos):
+      - facts:   P17/P131/P159/P276 de cada entidad consultada (independiente del país)
+      - inside:  veredicto por (país, lugar): el lugar tiene P17 = país, o alguna cadena
+                 P131 (sin límite de saltos) llega a un lugar con P17 = país.
+
+    Los hechos que faltan se piden a WDQS en lotes grandes de consultas simples
+    (sin cadenas P131 desenrolladas); las cadenas se recorren localmente en memoria.
+    `build_from_dump` precalcula el índice completo desde el backend offline.
+
+    Con `ttl_s`, los hechos y veredictos guardados con `fetched_at` más antiguo que eso se
+    ignoran al leer el disco (se vuelven a consultar); la copia en memoria dura lo que el índice.
+    """
+
+    def __init__(self, path: Path | str = PLACES_DB, batch: int = 250, ttl_s: float | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch = batch
+        self.ttl_s = ttl_s
+        self._facts: dict[int, dict[int, list[int]]] = {}
+        self._inside: dict[tuple[int, int], bool] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        c = self._conn()
+        c.execute("PRAGMA journal_mode=WAL")
+        c.executescript(_SCHEMA)
+        with c:
+            if "updated" in {row[1] for row in c.execute("PRAGMA table_info(fetched)")}:
+                c.execute("ALTER TABLE fetched RENAME COLUMN updated TO fetched_at")
+            if "fetched_at" not in {row[1] for row in c.execute("PRAGMA table_info(inside)")}:
+                # veredictos anteriores sin fecha: cuentan como vencidos si hay TTL
+                c.execute("ALTER TABLE inside ADD COLUMN fetched_at REAL NOT NULL DEFAULT 0")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.path), timeout=60)
+            c.execute("PRAGMA busy_timeout=60000")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def _cutoff(self) -> float:
+        """fetched_at mínimo de una fila vigente en disco."""
+        return time.time() - self.ttl_s if self.ttl_s is not None else 0.0
+
+    def clear(self, country_qid: str | None = None) -> None:
+        """Borra los hechos consultados y los veredictos (de un país o de todos)."""
+        with self._conn() as c:
+            c.execute("DELETE FROM facts")
+            c.execute("DELETE FROM fetched")
+            if country_qid:
+                c.execute("DELETE FROM inside WHERE country = ?", (_num(country_qid),))
+            else:
+                c.execute("DELETE FROM inside")
+        with self._lock:
+            self._facts.clear()
+            self._inside.clear()
+
+    # ---- hechos ----
+    def _load_facts(self, xs: list[int]) -> list[int]:
+        """Carga a memoria los hechos guardados y vigentes; devuelve los QIDs aún no consultados."""
+        cutoff = self._cutoff()
+        with self._lock:
+            todo = [x for x in xs if x not in self._facts]
+        if not todo:
+            return []
+        c = self._conn()
+        known: dict[int, dict[int, list[int]]] = {}
+        for i in range(0, len(todo), 500):
+            chunk = todo[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            for (x,) in c.execute(f"SELECT qid FROM fetched WHERE fetched_at >= ? AND qid IN ({marks})",
+                                  [cutoff, *chunk]):
+                known[x] = {}
+            for x, p, t in c.execute(f"SELECT qid, p, target FROM facts WHERE qid IN ({marks})", chunk):
+                if x in known:
+                    known[x].setdefault(p, []).append(t)
+        with self._lock:
+            self._facts.update(known)
+        return [x for x in todo if x not in known]
+
+    def _fetch_facts(self, xs: list[int]) -> None:
+        """Consulta P17/P131/P159/P276 de muchas entidades (consultas simples por lotes adaptativos)."""
+        props = " ".join(f"wdt:P{p}" for p in FACT_PROPS)
+
+        def query(chunk: list[int]) -> dict:
+            values = " ".join(f"wd:Q{x}" for x in chunk)
+            return run_sparql(f"""
+            SELECT ?x ?p ?y WHERE {{
+              VALUES ?x {{ {values} }}
+              VALUES ?p {{ {props} }}
+              ?x ?p ?y .
+              FILTER(STRSTARTS(STR(?y), "http://www.wikidata.org/entity/Q"))
+            }}
+            """, retry_timeouts=False, kind="place_facts")
+
+        for chunk, res in get_batcher("places.facts", self.batch, max_size=2000).map(xs, query):
+            got: dict[int, dict[int, list[int]]] = {x: {} for x in chunk}
+            rows: list[tuple[int, int, int]] = []
+            for b in res["results"]["bindings"]:
+                x = int(b["x"]["value"].rsplit("/Q", 1)[1])
+                p = int(b["p"]["value"].rsplit("/P", 1)[1])
+                y = int(b["y"]["value"].rsplit("/Q", 1)[1])
+                got.setdefault(x, {}).setdefault(p, []).append(y)
+                rows.append((x, p, y))
+            now = time.time()
+            with self._conn() as c:
+                # una entidad vencida se reemplaza entera: los hechos que ya no están se van
+                c.executemany("DELETE FROM facts WHERE qid = ?", [(x,) for x in chunk])
+                c.executemany("INSERT OR IGNORE INTO facts (qid, p, target) VALUES (?, ?, ?)", rows)
+                c.executemany("INSERT OR REPLACE INTO fetched (qid, fetched_at) VALUES (?, ?)",
+                              [(x, now) for x in chunk])
+            with self._lock:
+                self._facts.update(got)
+
+    def ensure_facts(self, xs: Iterable[int]) -> None:
+        missing = self._load_facts(list(dict.fromkeys(xs)))
+        if missing:
+            self._fetch_facts(missing)
+
+    def targets(self, x: int, p: int) -> list[int]:
+        return self._facts.get(x, {}).get(p, [])
+
+    # ---- pertenencia ----
+    def _load_inside(self, country: int, xs: list[int]) -> None:
+        cutoff = self._cutoff()
+        todo = [x for x in xs if (country, x) not in self._inside]
+        c = self._conn()
+        for i in range(0, len(todo), 500):
+            chunk = todo[i:i + 500]
+            rows = c.execute(
+                f"SELECT qid, value FROM inside WHERE country = ? AND fetched_at >= ? "
+                f"AND qid IN ({','.join('?' * len(chunk))})",
+                [country, cutoff, *chunk],
+            )
+            with self._lock:
+                for x, v in rows:
+                    self._inside[(country, x)] = bool(v)
+
+    def inside_many(self, places: Iterable[int], country: int) -> dict[int, bool]:
+        """
+        ¿Está cada lugar en el país? (P17 = país, o P131+ hasta un lugar con P17 = país).
+        Trae los hechos que falten nivel a nivel, subiendo por P131 sin límite de saltos.
+        """
+        places = list(dict.fromkeys(places))
+        self._load_inside(country, places)
+
+        # 1) subir por la jerarquía hasta tener todos los hechos necesarios
+        frontier = [x for x in places if (country, x) not in self._inside]
+        seen = set(frontier)
+        while frontier:
+            self.ensure_facts(frontier)
+            self._load_inside(country, frontier)
+            nxt: list[int] = []
+            for x in frontier:
+                if (country, x) in self._inside or country in self.targets(x, 17):
+                    continue
+                for a in self.targets(x, 131):
+                    if a not in seen:
+                        seen.add(a)
+                        nxt.append(a)
+            frontier = nxt
+
+        # 2) resolver en memoria: desde las "raíces" (P17 = país, o ya conocidas dentro)
+        #    se baja por P131 invertido; lo alcanzado está en el país, el resto no.
+        explored = set(places) | seen
+        children: dict[int, list[int]] = {}
+        good: set[int] = set()
+        for x in explored:
+            known = self._inside.get((country, x))
+            if known is not None:
+                if known:
+                    good.add(x)
+                continue
+            if country in self.targets(x, 17):
+                good.add(x)
+                continue
+            for a in self.targets(x, 131):
+                children.setdefault(a, []).append(x)
+        stack = list(good)
+        while stack:
+            for x in children.get(stack.pop(), ()):
+                if x not in good:
+                    good.add(x)
+                    stack.append(x)
+
+        new = {x: x in good for x in explored if (country, x) not in self._inside}
+        out = {x: self._inside.get((country, x), x in good) for x in places}
+        if new:
+            with self._lock:
+                self._inside.update({(country, x): v for x, v in new.items()})
+            now = time.time()
+            with self._conn() as c:
+                c.executemany("INSERT OR REPLACE INTO inside (country, qid, value, fetched_at) VALUES (?, ?, ?, ?)",
+                              [(country, x, int(v), now) for x, v in new.items()])
+        return out
+
+    def located_in(self, qids: Iterable[str], country_qid: str, props: tuple[int, ...]) -> set[str]:
+        """QIDs cuyo valor de alguna de `props` (p. ej. P131, o P159/P276) es un lugar del país."""
+        nums = {q: _num(q) for q in dict.fromkeys(qids)}
+        country = _num(country_qid)
+        self.ensure_facts(nums.values())
+        places = {t for x in nums.values() for p in props for t in self.targets(x, p)}
+        verdict = self.inside_many(places, country)
+        return {q for q, x in nums.items()
+                if any(verdict.get(t) for p in props for t in self.targets(x, p))}
+
+    # ---- precálculo ----
+    def build_from_dump(self, country_qid: str, dump=None) -> int:
+        """
+        Cierre transitivo completo desde el volcado local: todos los lugares con P17 = país
+        y, recursivamente, todo lo que está en ellos vía P131. Devuelve cuántos lugares.
+        """
+        from kg.wd.dump import active_dump
+        dump = dump or active_dump()
+        if dump is None:
+            raise RuntimeError("build_from_dump requiere el backend offline (kg.wd.dump.use_dump).")
+        country = _num(country_qid)
+        found = set(dump.subjects(17, country))
+        frontier = list(found)
+        while frontier:
+            nxt: list[int] = []
+            for a in frontier:
+                for x in dump.subjects(131, a):
+                    if x not in found:
+                        found.add(x)
+                        nxt.append(x)
+            frontier = nxt
+        now = time.time()
+        with self._conn() as c:
+            c.executemany("INSERT OR REPLACE INTO inside (country, qid, value, fetched_at) VALUES (?, ?, 1, ?)",
+                          [(country, x, now) for x in found])
+        with self._lock:
+            self._inside.update({(country, x): True for x in found})
+        return len(found)
+
+
+_INDEX: PlaceIndex | None = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_place_index() -> PlaceIndex:
+    """Índice por defecto (data/places.sqlite, vigencia `store_ttl_s()`), creado bajo demanda."""
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = PlaceIndex(ttl_s=store_ttl_s())
+        return _INDEX
+
+
+def main():
+    from kg.wd.country import resolve_country_id
+    from kg.wd.dump import DEFAULT_DUMP_DB, use_dump
+
+    ap = argparse.ArgumentParser(description="Precalcula el índice de lugares de un país desde el volcado local.")
+    ap.add_argument("--country", required=True, help="QID, ISO o nombre del país (según config/countries.yml).")
+    ap.add_argument("--dump-db", default=str(DEFAULT_DUMP_DB), help="SQLite del volcado indexado (kg.wd.dump).")
+    args = ap.parse_args()
+    country_qid = resolve_country_id(args.country)
+    n = get_place_index().build_from_dump(country_qid, dump=use_dump(args.dump_db))
+    print(f"✅ {n:,} lugares en {country_qid} → {PLACES_DB}")
+
+
+if __name__ == "__main__":
+    main()
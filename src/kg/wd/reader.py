@@ -0,0 +1,158 @@
+# src/kg/wd/reader.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterator, NamedTuple
+import gzip
+import re
+
+from kg.wd.writer import RDFS_LABEL, TURTLE_PREFIXES, WD, WDT, XSD_STRING
+
+# Lectura en streaming de los grafos que produce el pipeline, sin construir un rdflib.Graph:
+# el Turtle de kg.wd.writer y N-Triples/N-Quads se leen con expresiones regulares; cualquier
+# otro archivo (Turtle con otra sintaxis, etc.) pasa por rdflib y se convierte al mismo formato.
+#
+# Tripletas (s, p, o): IRIs completos como str, nodos en blanco como "_:id" y literales como Lit.
+
+
+class Lit(NamedTuple):
+    value: str
+    datatype: str | None = XSD_STRING
+    lang: str | None = None
+
+
+SUFFIXES = (".ttl", ".ttl.gz", ".nt", ".nt.gz", ".nq", ".nq.gz")
+
+_PREFIX_LINES = set(TURTLE_PREFIXES.splitlines())
+_CURIE = {"wd": WD, "wdt": WDT}
+_TTL_TOKEN = re.compile(
+    r'\s*(?:(@prefix[^\n]*)\n|(wd:Q\d+|wdt:P\d+|rdfs:label)|("(?:[^"\\]|\\.)*")(\^\^xsd:string|@[\w-]+)?|([;,.]))'
+)
+_NT_TERM = r'(<[^>]*>|_:\S+|"(?:[^"\\]|\\.)*"(?:\^\^<[^>]*>|@[\w-]+)?)'
+_NT_LINE = re.compile(rf'^\s*(<[^>]*>|_:\S+)\s+<([^>]*)>\s+{_NT_TERM}(?:\s+(?:<[^>]*>|_:\S+))?\s*\.\s*$')
+_UNESCAPE = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+_UNESCAPES = {"n": "\n", "r": "\r", "t": "\t", "b": "\b", "f": "\f"}
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _unescape(s: str) -> str:
+    def sub(m):
+        e = m.group(1)
+        if e[0] in "uU" and len(e) > 1:
+            return chr(int(e[1:], 16))
+        return _UNESCAPES.get(e, e)
+    return _UNESCAPE.sub(sub, s)
+
+
+def read_text(path: Path | str) -> str:
+    path = Path(path)
+    if path.suffix == ".gz":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    return path.read_text(encoding="utf-8")
+
+
+def graph_files(paths) -> list[Path]:
+    """Archivos de grafo de uno o varios paths (archivos o directorios, recorridos en orden)."""
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    out: list[Path] = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            out += sorted(f for f in p.rglob("*") if f.is_file() and f.name.endswith(SUFFIXES))
+        else:
+            out.append(p)
+    return out
+
+
+def _iri(term: str) -> str:
+    return RDFS_LABEL if term == "rdfs:label" else _CURIE[term.split(":", 1)[0]] + term.split(":", 1)[1]
+
+
+def _ttl_fast(text: str) -> list[tuple]:
+    out: list[tuple] = []
+    subj = pred = None
+    i, n = 0, len(text)
+    while i < n:
+        m = _TTL_TOKEN.match(text, i)
+        if not m:
+            if text[i:].strip():
+                raise _Unsupported(text[i:i + 40])
+            break
+        i = m.end()
+        prefix, term, lit, suffix, punct = m.groups()
+        if prefix is not None:
+            if prefix not in _PREFIX_LINES:
+                raise _Unsupported(prefix)
+            continue
+        if punct:
+            if punct == ";":
+                pred = None
+            elif punct == ".":
+                subj = pred = None
+            continue
+        if subj is None:
+            if term is None or term == "rdfs:label" or term.startswith("wdt:"):
+                raise _Unsupported(m.group(0))
+            subj = _iri(term)
+        elif pred is None:
+            if term is None or term.startswith("wd:"):
+                raise _Unsupported(m.group(0))
+            pred = _iri(term)
+        elif lit is not None:
+            lang = suffix[1:] if suffix and suffix[0] == "@" else None
+            out.append((subj, pred, Lit(_unescape(lit[1:-1]), None if lang else XSD_STRING, lang)))
+        else:
+            out.append((subj, pred, _iri(term)))
+    return out
+
+
+def _nt_term(t: str):
+    if t[0] == "<":
+        return t[1:-1]
+    if t[0] == "_":
+        return t
+    end = t.rindex('"')
+    rest = t[end + 1:]
+    if rest.startswith("@"):
+        return Lit(_unescape(t[1:end]), None, rest[1:])
+    return Lit(_unescape(t[1:end]), rest[3:-1] if rest else XSD_STRING)
+
+
+def _nt_fast(text: str) -> list[tuple]:
+    out: list[tuple] = []
+    for line in text.splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        m = _NT_LINE.match(line)
+        if not m:
+            raise _Unsupported(line[:40])
+        s, p, o = m.groups()
+        out.append((_nt_term(s), p, _nt_term(o)))
+    return out
+
+
+def _rdflib(text: str, fmt: str) -> list[tuple]:
+    from rdflib import BNode, Dataset, Graph, Literal
+    g = Dataset() if fmt == "nquads" else Graph()
+    g.parse(data=text, format=fmt)
+    conv = lambda t: ("_:" + str(t) if isinstance(t, BNode) else
+                      Lit(str(t), str(t.datatype) if t.datatype else (None if t.language else XSD_STRING), t.language)
+                      if isinstance(t, Literal) else str(t))
+    quads = g.quads((None, None, None, None)) if fmt == "nquads" else ((s, p, o, None) for s, p, o in g)
+    return [(conv(s), str(p), conv(o)) for s, p, o, _ in quads]
+
+
+def iter_triples(path: Path | str) -> Iterator[tuple]:
+    """Tripletas (s, p, o) de un archivo .ttl/.nt/.nq (opcionalmente .gz)."""
+    path = Path(path)
+    text = read_text(path)
+    name = path.name[:-3] if path.name.endswith(".gz") else path.name
+    try:
+        triples = _nt_fast(text) if name.endswith((".nt", ".nq")) else _ttl_fast(text)
+    except _Unsupported:
+        fmt = "nquads" if name.endswith(".nq") else "nt" if name.endswith(".nt") else "turtle"
+        triples = _rdflib(text, fmt)
+    yield from triples
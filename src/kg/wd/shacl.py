@@ -0,0 +1,293 @@
+# src/kg/wd/shacl.py
+from __future__ import annotations
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable
+import re
+
+from kg.wd.reader import Lit, iter_triples
+from kg.wd.writer import WD, WDT
+
+# Validación SHACL rápida de los grafos del pipeline.
+# Las shapes simples (targets directos + property shapes con ruta simple y restricciones
+# minCount/maxCount/hasValue/datatype/nodeKind/in/pattern/minLength/maxLength) se compilan a
+# comprobaciones nativas sobre el flujo de tripletas de kg.wd.reader, sin rdflib ni pyshacl.
+# El resto (rutas complejas, sh:node, sh:or, sh:sparql, ...) se valida con pyshacl (opcional).
+#
+# Los grafos de Wikidata no llevan rdf:type: para sh:targetClass, wdt:P31 cuenta como rdf:type.
+# Las shapes se escriben para cualquier país: `ex:TargetCountry` se reemplaza por el país del
+# grafo que se valida (ShapeSet(..., country_qid=...)).
+
+SH = "http://www.w3.org/ns/shacl#"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDF_LANGSTRING = "http://www.w3.org/1999/02/22-rdf-syntax-ns#langString"
+TYPE_PROPS = (RDF_TYPE, WDT + "P31")
+TARGET_COUNTRY = "http://example.org/TargetCountry"
+
+_NODE_KEYS = {"targetClass", "targetNode", "targetSubjectsOf", "targetObjectsOf", "property", "severity",
+              "message", "deactivated", "name", "description", "order", "group"}
+_PROP_KEYS = {"path", "minCount", "maxCount", "hasValue", "datatype", "nodeKind", "in", "pattern", "flags",
+              "minLength", "maxLength", "severity", "message", "deactivated", "name", "description",
+              "order", "group"}
+
+
+def _local(iri: str) -> str:
+    return iri[len(SH):] if iri.startswith(SH) else iri
+
+
+def _term(t):
+    """Término rdflib → representación de kg.wd.reader (str / "_:id" / Lit)."""
+    from rdflib import BNode, Literal
+    if isinstance(t, BNode):
+        return "_:" + str(t)
+    if isinstance(t, Literal):
+        return Lit(str(t), str(t.datatype) if t.datatype else (None if t.language else
+                   "http://www.w3.org/2001/XMLSchema#string"), t.language)
+    return str(t)
+
+
+class PropertyCheck:
+    """Property shape compilada: restricciones sobre los valores de `path` de cada nodo foco."""
+
+    def __init__(self, path: str, **c):
+        self.path = path
+        self.min_count: int | None = c.get("minCount")
+        self.max_count: int | None = c.get("maxCount")
+        self.has_value: list = c.get("hasValue", [])
+        self.datatype: str | None = c.get("datatype")
+        self.node_kind: str | None = c.get("nodeKind")
+        self.in_values: set | None = c.get("in")
+        self.pattern = re.compile(c["pattern"], _flags(c.get("flags", ""))) if c.get("pattern") else None
+        self.min_length: int | None = c.get("minLength")
+        self.max_length: int | None = c.get("maxLength")
+        self.severity: str = c.get("severity", SH + "Violation")
+        self.message: str | None = c.get("message")
+
+    def check(self, values) -> Iterable[tuple[str, object]]:
+        """(componente, valor) por cada violación."""
+        if self.min_count is not None and len(values) < self.min_count:
+            yield "MinCount", None
+        if self.max_count is not None and len(values) > self.max_count:
+            yield "MaxCount", None
+        for hv in self.has_value:
+            if hv not in values:
+                yield "HasValue", hv
+        for v in values:
+            if self.datatype and not (isinstance(v, Lit) and (v.datatype or RDF_LANGSTRING) == self.datatype):
+                yield "Datatype", v
+            if self.node_kind and not _node_kind_ok(v, self.node_kind):
+                yield "NodeKind", v
+            if self.in_values is not None and v not in self.in_values:
+                yield "In", v
+            if self.pattern or self.min_length is not None or self.max_length is not None:
+                if isinstance(v, str) and v.startswith("_:"):
+                    yield ("Pattern" if self.pattern else "MinLength"), v
+                    continue
+                text = v.value if isinstance(v, Lit) else v
+                if self.pattern and not self.pattern.search(text):
+                    yield "Pattern", v
+                if self.min_length is not None and len(text) < self.min_length:
+                    yield "MinLength", v
+                if self.max_length is not None and len(text) > self.max_length:
+                    yield "MaxLength", v
+
+
+def _flags(s: str) -> int:
+    return (re.I if "i" in s else 0) | (re.M if "m" in s else 0) | (re.S if "s" in s else 0) | (re.X if "x" in s else 0)
+
+
+def _node_kind_ok(v, kind: str) -> bool:
+    blank = isinstance(v, str) and v.startswith("_:")
+    iri = isinstance(v, str) and not blank
+    lit = isinstance(v, Lit)
+    return {
+        "IRI": iri, "BlankNode": blank, "Literal": lit, "BlankNodeOrIRI": blank or iri,
+        "BlankNodeOrLiteral": blank or lit, "IRIOrLiteral": iri or lit,
+    }.get(_local(kind), True)
+
+
+class CompiledShape:
+    def __init__(self, iri: str):
+        self.iri = iri
+        self.nodes: list = []
+        self.classes: set[str] = set()
+        self.subjects_of: set[str] = set()
+        self.objects_of: set[str] = set()
+        self.checks: list[PropertyCheck] = []
+        self.native = True
+        self.reason: str | None = None   # por qué se delega en pyshacl
+
+    def focus(self, idx: "TripleIndex") -> set:
+        f = set(self.nodes)
+        f.update(s for s, ts in idx.types.items() if ts & self.classes)
+        for p in self.subjects_of:
+            f.update(idx.subjects.get(p, ()))
+        for p in self.objects_of:
+            f.update(idx.objects.get(p, ()))
+        return f
+
+
+class ShapeSet:
+    """
+    Shapes de un archivo SHACL: las simples compiladas a `CompiledShape` y las complejas
+    reunidas en un grafo Turtle (`complex_ttl`) que se valida con pyshacl.
+    Con `country_qid`, `ex:TargetCountry` pasa a ser ese país; sin él, las tripletas que lo
+    usan se descartan (y queda un aviso en `warnings`).
+    """
+
+    def __init__(self, path: Path | str, country_qid: str | None = None):
+        from rdflib import Graph, URIRef
+        from rdflib.collection import Collection
+        from rdflib.namespace import RDF, RDFS, SH as NS
+
+        meta = {RDF.type, RDFS.label, RDFS.comment}
+        self.path = str(path)
+        g = Graph()
+        g.parse(str(path), format="turtle")
+        self.country_qid = country_qid
+        self.warnings: list[str] = []
+        placeholder = URIRef(TARGET_COUNTRY)
+        bound = [(s, p) for s, p in g.subject_predicates(placeholder)]
+        for s, p in bound:
+            g.remove((s, p, placeholder))
+            if country_qid:
+                g.add((s, p, URIRef(WD + country_qid)))
+        if bound and not country_qid:
+            self.warnings.append(f"{len(bound)} restricciones con ex:TargetCountry omitidas (falta el país)")
+        shapes = set(g.subjects(RDF.type, NS.NodeShape))
+        for key in ("targetClass", "targetNode", "targetSubjectsOf", "targetObjectsOf", "property"):
+            shapes.update(s for s in g.subjects(NS[key], None) if (None, NS.property, s) not in g)
+
+        self.shapes: list[CompiledShape] = []
+        complex_g = Graph()
+        for s in sorted(shapes, key=str):
+            cs = CompiledShape(str(s))
+            if str(g.value(s, NS.deactivated)).lower() == "true":
+                continue
+            bad = {_local(str(p)) for p in g.predicates(s) if p not in meta} - _NODE_KEYS
+            if bad:
+                cs.native, cs.reason = False, ", ".join(sorted(bad))
+            for o in g.objects(s, NS.targetNode):
+                cs.nodes.append(_term(o))
+            cs.classes.update(str(o) for o in g.objects(s, NS.targetClass))
+            cs.subjects_of.update(str(o) for o in g.objects(s, NS.targetSubjectsOf))
+            cs.objects_of.update(str(o) for o in g.objects(s, NS.targetObjectsOf))
+            node_sev = g.value(s, NS.severity)
+            for ps in g.objects(s, NS.property):
+                if str(g.value(ps, NS.deactivated)).lower() == "true":
+                    continue
+                path = g.value(ps, NS.path)
+                bad = {_local(str(p)) for p in g.predicates(ps) if p not in meta} - _PROP_KEYS
+                if not isinstance(path, URIRef) or bad:
+                    cs.native = False
+                    cs.reason = cs.reason or ("ruta compleja" if not isinstance(path, URIRef) else ", ".join(sorted(bad)))
+                    continue
+                c: dict = {}
+                for key in ("minCount", "maxCount", "minLength", "maxLength"):
+                    v = g.value(ps, NS[key])
+                    if v is not None:
+                        c[key] = int(v)
+                for key in ("datatype", "nodeKind", "severity"):
+                    v = g.value(ps, NS[key]) or (node_sev if key == "severity" else None)
+                    if v is not None:
+                        c[key] = str(v)
+                for key in ("pattern", "flags", "message"):
+                    v = g.value(ps, NS[key]) or (g.value(s, NS.message) if key == "message" else None)
+                    if v is not None:
+                        c[key] = str(v)
+                c["hasValue"] = [_term(v) for v in g.objects(ps, NS.hasValue)]
+                lst = g.value(ps, NS["in"])
+                if lst is not None:
+                    c["in"] = {_term(v) for v in Collection(g, lst)}
+                cs.checks.append(PropertyCheck(str(path), **c))
+            if not cs.native:
+                cs.checks = []
+                for t in g.cbd(s):
+                    complex_g.add(t)
+            self.shapes.append(cs)
+        for prefix, ns in g.namespaces():
+            complex_g.bind(prefix, ns)
+        self.complex_ttl: str | None = complex_g.serialize(format="turtle") if len(complex_g) else None
+
+    @property
+    def target_preds(self) -> set[str]:
+        """Predicados que definen nodos foco (sh:targetSubjectsOf / sh:targetObjectsOf)."""
+        return {p for s in self.shapes for p in s.subjects_of | s.objects_of}
+
+    @property
+    def native(self) -> list[CompiledShape]:
+        return [s for s in self.shapes if s.native]
+
+    def summary(self) -> list[dict]:
+        return [{"shape": s.iri, "mode": "native" if s.native else "pyshacl", "reason": s.reason,
+                 "checks": len(s.checks)} for s in self.shapes]
+
+
+class TripleIndex:
+    """Índice en memoria de un grafo: valores por (sujeto, predicado), tipos y sujetos/objetos por predicado."""
+
+    def __init__(self, triples: Iterable[tuple], type_props: Iterable[str] = TYPE_PROPS,
+                 preds: set[str] | None = None):
+        type_props = set(type_props)
+        self.values: dict = defaultdict(lambda: defaultdict(dict))   # s → p → {o: None} (orden de llegada)
+        self.types: dict = defaultdict(set)
+        self.subjects: dict = defaultdict(set)
+        self.objects: dict = defaultdict(set)
+        self.triples = 0
+        for s, p, o in triples:
+            self.triples += 1
+            self.values[s][p][o] = None
+            if p in type_props and isinstance(o, str):
+                self.types[s].add(o)
+            if preds is None or p in preds:
+                self.subjects[p].add(s)
+                self.objects[p].add(o)
+
+
+def validate_native(idx: TripleIndex, shapes: Iterable[CompiledShape]) -> tuple[int, list[dict]]:
+    """Valida un índice contra shapes compiladas; devuelve (nodos foco, violaciones)."""
+    n_focus, out = 0, []
+    for sh in shapes:
+        focus = sh.focus(idx)
+        n_focus += len(focus)
+        for f in sorted(focus, key=str):
+            row = idx.values.get(f, {})
+            for chk in sh.checks:
+                for comp, v in chk.check(row.get(chk.path, {})):
+                    out.append({"shape": sh.iri, "focus": f, "path": chk.path, "constraint": comp,
+                                "value": v.value if isinstance(v, Lit) else v,
+                                "severity": _local(chk.severity), "message": chk.message})
+    return n_focus, out
+
+
+def validate_pyshacl(path: Path | str, shapes: ShapeSet, type_props: Iterable[str] = TYPE_PROPS) -> list[dict]:
+    """Shapes complejas con pyshacl (wdt:P31 se agrega como rdf:type, igual que en la vía nativa)."""
+    if not shapes.complex_ttl:
+        return []
+    import pyshacl
+    from rdflib import BNode, Graph, Literal, URIRef
+    from rdflib.namespace import RDF, SH as NS
+
+    data = Graph()
+    for s, p, o in iter_triples(path):
+        conv = lambda t: (BNode(t[2:]) if isinstance(t, str) and t.startswith("_:") else
+                          Literal(t.value, lang=t.lang, datatype=None if t.lang else t.datatype)
+                          if isinstance(t, Lit) else URIRef(t))
+        data.add((conv(s), URIRef(p), conv(o)))
+        if p in type_props and p != RDF_TYPE and isinstance(o, str):
+            data.add((conv(s), RDF.type, conv(o)))
+    sg = Graph().parse(data=shapes.complex_ttl, format="turtle")
+    parent = {ps: s for s, ps in sg.subject_objects(NS.property)}
+    _, results, _ = pyshacl.validate(data, shacl_graph=sg, inference="none")
+    out = []
+    for r in results.subjects(RDF.type, NS.ValidationResult):
+        src = results.value(r, NS.sourceShape)
+        comp = str(results.value(r, NS.sourceConstraintComponent) or "")
+        v = results.value(r, NS.value)
+        out.append({"shape": str(parent.get(src, src)), "focus": _term(results.value(r, NS.focusNode)),
+                    "path": str(results.value(r, NS.resultPath)) if results.value(r, NS.resultPath) else None,
+                    "constraint": _local(comp).replace("ConstraintComponent", ""),
+                    "value": None if v is None else str(v),
+                    "severity": _local(str(results.value(r, NS.resultSeverity))),
+                    "message": str(results.value(r, NS.resultMessage) or "") or None})
+    return out
@@ -0,0 +1,246 @@
+# src/kg/wd/throttle.py
+from __future__ import annotations
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, TypeVar
+import json
+import random
+import threading
+import time
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from kg import metrics
+
+try:  # httpx es opcional: solo para clasificar errores de clientes que lo usen
+    import httpx
+except ImportError:
+    httpx = None
+
+# Política única de ritmo y reintentos para las consultas a WDQS (la comparten todos los hilos
+# de `kg.wd.utils.run_sparql` y del muestreo de sujetos), en lugar de un sleep fijo tras cada
+# consulta y un backoff propio en cada bucle de reintentos:
+#
+#   - AIMD: mientras sea el ritmo (requests/s) lo que frena a los hilos, cada respuesta correcta
+#     lo sube en `increase / ritmo` (≈ +`increase` req/s por segundo, como la ventana de TCP);
+#     un 429/503 lo multiplica por 0.5 y un timeout por 0.8, como mucho una vez cada
+#     `cut_every_s` (o cada request, si el ritmo es más lento); entre `min_rps` y `max_rps`.
+#   - Retry-After: un 429/503 que lo trae pausa a todos los hilos hasta esa hora.
+#   - Errores clasificados: solo se reintentan los transitorios (red, 5xx, 429/503, timeouts);
+#     una consulta mal formada (400) u otro 4xx falla en el primer intento.
+#   - Circuit breaker: tras `breaker_after` fallos transitorios seguidos el endpoint se da por
+#     caído y todos esperan `breaker_s` (el doble en cada recaída, hasta `breaker_max_s`); luego
+#     pasa una sola consulta de prueba y, si responde, se reabre el paso.
+
+T = TypeVar("T")
+
+TIMEOUT, THROTTLED, TRANSIENT, FATAL = "timeout", "throttled", "transient", "fatal"
+# etiqueta `outcome` de sparql_requests_total por clase de error
+_OUTCOME = {TIMEOUT: "timeout", THROTTLED: "throttled", TRANSIENT: "error", FATAL: "rejected"}
+
+
+class SparqlTimeout(Exception):
+    """La consulta superó el límite de tiempo (del cliente o del propio WDQS)."""
+
+
+_TIMEOUTS = (SparqlTimeout, requests.Timeout, TimeoutError, ReadTimeoutError) + ((httpx.TimeoutException,) if httpx else ())
+
+
+def is_timeout(e: Exception) -> bool:
+    if isinstance(e, _TIMEOUTS):
+        return True
+    if isinstance(e, requests.ConnectionError):
+        # un timeout de lectura a mitad del cuerpo (iter_content, p. ej. bajo ijson) llega como
+        # ConnectionError que envuelve el ReadTimeoutError de urllib3
+        inner = e.args[0] if e.args else None
+        return isinstance(inner, ReadTimeoutError) or isinstance(e.__context__, ReadTimeoutError)
+    resp = getattr(e, "response", None)
+    if isinstance(e, requests.HTTPError) and resp is not None:
+        # WDQS corta a los 60 s con un 500 (java.util.concurrent.TimeoutException) o un 504
+        return resp.status_code == 504 or (resp.status_code == 500 and b"TimeoutException" in (resp.content or b""))
+    return False
+
+
+def classify(e: Exception) -> str:
+    """TIMEOUT, THROTTLED (429/503), TRANSIENT (red, 5xx, respuesta truncada) o FATAL (no reintentar)."""
+    if is_timeout(e):
+        return TIMEOUT
+    resp = getattr(e, "response", None)
+    if isinstance(e, requests.HTTPError) and resp is not None:
+        code = resp.status_code
+        if code in (429, 503):
+            return THROTTLED
+        if code >= 500 or code == 408:
+            return TRANSIENT
+        return FATAL
+    if isinstance(e, (requests.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                      requests.exceptions.ContentDecodingError, ConnectionError, json.JSONDecodeError)):
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after_s(e: Exception) -> float | None:
+    """Segundos pedidos por el header Retry-After de la respuesta (número o fecha HTTP), si hay."""
+    resp = getattr(e, "response", None)
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ThrottlePolicy:
+    """
+    Límite de requests en vuelo + ritmo AIMD + pausas (Retry-After, circuit breaker) + reintentos.
+    - max_inflight: requests simultáneas (WDQS permite ~5 por IP).
+    - max_rps: techo del ritmo (0 = sin techo: el ritmo lo fija la respuesta del endpoint).
+    - start_rps: ritmo inicial (default: max_rps, o 5/s sin techo).
+    """
+
+    def __init__(self, max_inflight: int = 5, max_rps: float = 0.0, start_rps: float | None = None,
+                 min_rps: float = 0.2, increase: float = 0.5, cut_every_s: float = 2.0,
+                 breaker_after: int = 8, breaker_s: float = 15.0, breaker_max_s: float = 120.0):
+        self.max_inflight = max(1, int(max_inflight))
+        self.max_rps = float(max_rps or 0.0)
+        self.min_rps = min_rps
+        self.rate = float(start_rps or self.max_rps or 5.0)
+        self.increase = increase
+        self.cut_every_s = cut_every_s
+        self.breaker_after = breaker_after
+        self.breaker_s = breaker_s
+        self.breaker_max_s = breaker_max_s
+        self._sem = threading.BoundedSemaphore(self.max_inflight)
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._limited_at = 0.0      # última vez que un hilo esperó por el ritmo
+        self._cut_at = 0.0
+        self._pause_until = 0.0     # Retry-After
+        self._fails = 0             # fallos transitorios seguidos
+        self.state = "closed"       # closed | open | half-open
+        self._open_until = 0.0
+        self._open_s = breaker_s
+        self._probing = False
+
+    # ---- paso ----
+    def _wait_turn(self) -> bool:
+        """Espera pausas y breaker; True si esta request es la prueba del breaker semiabierto."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(self._pause_until, self._open_until) - now
+                if wait <= 0:
+                    if self.state == "open":
+                        self.state = "half-open"
+                    if self.state != "half-open":
+                        return False
+                    if not self._probing:
+                        self._probing = True
+                        return True
+                    wait = 0.25          # otra request está probando el endpoint
+            time.sleep(min(wait, 1.0))
+
+    @contextmanager
+    def slot(self):
+        """Paso para una request: pausas, cupo de requests en vuelo y turno según el ritmo actual."""
+        probe = self._wait_turn()
+        try:
+            with self._sem:
+                with self._lock:
+                    now = time.monotonic()
+                    slot = max(now, self._next_slot)
+                    self._next_slot = slot + 1.0 / self.rate
+                    if slot > now:
+                        self._limited_at = now
+                if slot > now:
+                    time.sleep(slot - now)
+                yield
+        finally:
+            if probe:
+                with self._lock:
+                    self._probing = False
+
+    # ---- señales ----
+    def success(self) -> None:
+        with self._lock:
+            self._fails = 0
+            if self.state != "closed":
+                self.state = "closed"
+                self._open_until = 0.0
+                self._open_s = self.breaker_s
+            # aumento aditivo solo si el ritmo es lo que está frenando a los hilos
+            if time.monotonic() - self._limited_at < 5.0:
+                self.rate += self.increase / self.rate
+                if self.max_rps:
+                    self.rate = min(self.rate, self.max_rps)
+
+    def failure(self, kind: str, retry_after: float | None = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if kind in (THROTTLED, TIMEOUT) and now - self._cut_at >= max(self.cut_every_s, 1.0 / self.rate):
+                self._cut_at = now
+                self.rate = max(self.min_rps, self.rate * (0.5 if kind == THROTTLED else 0.8))
+                # el turno ya reservado no debe adelantarse al nuevo ritmo
+                self._next_slot = max(self._next_slot, now + 1.0 / self.rate)
+                metrics.inc("sparql_throttle_total", signal=kind)
+            if retry_after:
+                self._pause_until = max(self._pause_until, now + retry_after)
+            if kind in (THROTTLED, TRANSIENT):
+                self._fails += 1
+                if self.state == "half-open" or (self.state == "closed" and self._fails >= self.breaker_after):
+                    if self.state == "half-open":
+                        self._open_s = min(self._open_s * 2, self.breaker_max_s)
+                    self.state = "open"
+                    self._open_until = now + self._open_s
+                    metrics.inc("sparql_breaker_open_total")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rate_rps": round(self.rate, 3), "max_rps": self.max_rps, "max_inflight": self.max_inflight,
+                    "breaker": self.state, "consecutive_failures": self._fails}
+
+    # ---- ejecución con reintentos ----
+    def call(self, fn: Callable[[], T], kind: str = "other", retries: int = 7, retry_timeouts: bool = True) -> T:
+        """
+        Ejecuta `fn()` (una request) con esta política: hasta `retries` intentos con backoff
+        exponencial + jitter, solo para errores transitorios. Con `retry_timeouts=False` un
+        timeout se lanza de inmediato como `SparqlTimeout` (el llamador parte el lote).
+        """
+        backoff = 0.8
+        for attempt in range(retries):
+            if attempt:
+                metrics.inc("sparql_retries_total", kind=kind)
+            try:
+                with self.slot():
+                    t0 = time.perf_counter()
+                    try:
+                        out = fn()
+                    finally:
+                        metrics.observe("sparql_latency_seconds", time.perf_counter() - t0, kind=kind)
+            except Exception as e:
+                cls = classify(e)
+                metrics.inc("sparql_requests_total", kind=kind, outcome=_OUTCOME[cls])
+                self.failure(cls, retry_after_s(e))
+                if cls == FATAL:
+                    raise
+                if cls == TIMEOUT and not isinstance(e, SparqlTimeout):
+                    if not retry_timeouts:
+                        raise SparqlTimeout(str(e)) from e
+                    e = SparqlTimeout(str(e))
+                elif cls == TIMEOUT and not retry_timeouts:
+                    raise
+                if attempt == retries - 1:
+                    raise e
+                time.sleep(backoff + random.uniform(0, 0.6))
+                backoff = min(backoff * 1.9, 10.0)
+                continue
+            metrics.inc("sparql_requests_total", kind=kind, outcome="ok")
+            self.success()
+            return out
+        raise ValueError("retries debe ser >= 1")
@@ -1,6 +1,13 @@
 # src/kg/wd/truthy.py
 from __future__ import annotations
-from kg.wd.utils import run_sparql
+from typing import Iterable
+import re
+from kg.wd.batching import get_batcher
+from kg.wd.dump import active_dump
+from kg.wd.entity_cache import EntityTemplate
+
+_QID_RE = re.compile(r"^Q\d+$")
+
 
 def truthy_edges(qid: str) -> list[tuple[str, str]]:
     """
@@ -8,22 +15,86 @@ def truthy_edges(qid: str) -> list[tuple[str, str]]:
     no archivos/URLs/literales.
     P es el predicado directo wdt:Pxx, Q es el QID objeto.
     """
-    q = f"""
-    SELECT ?p ?o WHERE {{
-      VALUES ?s {{ wd:{qid} }}
+    dump = active_dump()
+    if dump:
+        return dump.truthy_edges(qid)
+    res = TRUTHY_EDGES.run([qid]) if _QID_RE.match(qid) else {}
+    edges = []
+    for b in res.get(qid, []):
+        P = b["p"]["value"].split("/")[-1]   # wdt:Pxx -> "Pxx"
+        O = b["o"]["value"].split("/")[-1]   # .../entity/Qxxxx -> "Qxxxx"
+        edges.append((P, O))
+    return edges
+
+
+def _truthy_edges_query(qids: list[str]) -> str:
+    values = " ".join(f"wd:{q}" for q in qids)
+    return f"""
+    SELECT ?s ?p ?o WHERE {{
+      VALUES ?s {{ {values} }}
       ?s ?p ?o .
       ?prop wikibase:directClaim ?p .
-
-      # Solo objetos IRI en el namespace de entidades Q de Wikidata
       FILTER(isIRI(?o))
       FILTER(STRSTARTS(STR(?o), "http://www.wikidata.org/entity/Q") ||
              STRSTARTS(STR(?o), "https://www.wikidata.org/entity/Q"))
     }}
     """
-    res = run_sparql(q)
-    edges = []
-    for b in res["results"]["bindings"]:
-        P = b["p"]["value"].split("/")[-1]   # wdt:Pxx -> "Pxx"
-        O = b["o"]["value"].split("/")[-1]   # .../entity/Qxxxx -> "Qxxxx"
-        edges.append((P, O))
-    return edges
+
+
+# filas por sujeto (?s): el caché es por entidad, independiente de cómo se armen los lotes
+TRUTHY_EDGES = EntityTemplate("truthy_edges", _truthy_edges_query, var="s", kind="truthy_batch")
+
+
+def truthy_edges_batch(qids: Iterable[str],
+                       max_rows: int = 20000,
+                       batch_size: int = 50,
+                       max_batch: int = 400) -> dict[str, list[tuple[str, str]]]:
+    """
+    Versión por lotes de `truthy_edges`: un solo bloque VALUES con muchos sujetos.
+
+    El tamaño de cada lote lo lleva un batcher adaptativo (kg.wd.batching: crece si WDQS
+    responde rápido, se parte en mitades ante un timeout) y además se acota según el
+    tamaño de las respuestas anteriores: se estima el número medio de filas por sujeto
+    y el siguiente lote se dimensiona para no superar `max_rows` filas.
+
+    Parameters
+    ----------
+    qids : Iterable[str]
+        QIDs de los sujetos (se ignoran duplicados y valores que no sean Q\\d+).
+    max_rows : int
+        Filas objetivo por respuesta SPARQL.
+    batch_size : int
+        Tamaño del primer lote (si no hay uno aprendido en corridas anteriores).
+    max_batch : int
+        Máximo de sujetos por lote.
+
+    Returns
+    -------
+    dict[str, list[tuple[str, str]]]
+        Diccionario sujeto → lista de pares (P, Q). Todos los sujetos de entrada
+        aparecen como clave (lista vacía si no tienen aristas).
+    """
+    qids = list(dict.fromkeys(q for q in qids if q and _QID_RE.match(q)))
+    dump = active_dump()
+    if dump:
+        return dump.truthy_edges_batch(qids)
+    out: dict[str, list[tuple[str, str]]] = {q: [] for q in qids}
+
+    batcher = get_batcher("truthy", batch_size, max_size=max_batch)
+    seen = {"rows": 0, "subjects": 0}
+
+    def rows_cap() -> int:
+        # acotar el siguiente lote según filas/sujeto observadas
+        if not seen["subjects"]:
+            return max_batch
+        return int(max_rows / max(seen["rows"] / seen["subjects"], 1.0))
+
+    # los sujetos ya vistos salen del caché por entidad; solo los demás van en lotes a WDQS
+    for chunk, rows in TRUTHY_EDGES.map(qids, batcher, cap=rows_cap):
+        for S, bindings in rows.items():
+            edges = out[S]
+            for b in bindings:
+                edges.append((b["p"]["value"].split("/")[-1], b["o"]["value"].split("/")[-1]))
+            seen["rows"] += len(bindings)
+        seen["subjects"] += len(chunk)
+    return out
@@ -1,52 +1,246 @@
 from __future__ import annotations
 from pathlib import Path
 import os
-from SPARQLWrapper import SPARQLWrapper, JSON
-import hashlib, json, time, random
+import hashlib, json, re, threading
+from kg.wd.cache import QueryCache, FileCache, SQLiteCache
+from kg.wd.client import STREAMING, get_client
+from kg.wd.throttle import SparqlTimeout, ThrottlePolicy
+from kg import metrics
 
-ENDPOINT = "https://query.wikidata.org/sparql"
 PROJECT_ROOT = Path(__file__).resolve().parents[3]
 DATA_ROOT = Path(os.getenv("HFKG_DATA_DIR", PROJECT_ROOT / "data"))
 
-CACHE_DIR = DATA_ROOT / "cache_wd"
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
-
-def _cache_path(query: str) -> Path:
-    h = hashlib.sha1(query.encode("utf-8")).hexdigest()
-    return CACHE_DIR / f"{h}.json"
-
-
-def run_sparql(query: str, use_cache: bool = True, sleep_s: float = 0.12, retries: int = 7):
-    """Ejecuta una consulta SPARQL con caché, reintentos y backoff exponencial."""
-    p = _cache_path(query)
-    if use_cache and p.exists():
-        return json.loads(p.read_text(encoding="utf-8"))
-
-    backoff = 0.8
-    last_err = None
-    for attempt in range(retries):
-        try:
-            sp = SPARQLWrapper(ENDPOINT, agent="kg-country-agnostic/0.1 (mailto:example@example.com)")
-            sp.setReturnFormat(JSON)
-            sp.setQuery(query)
-            sp.setTimeout(120)  # 2 minutos
-            res = sp.query().convert()
-            if sleep_s:
-                time.sleep(sleep_s)  # cortesía con el endpoint
-            if use_cache:
-                p.write_text(json.dumps(res), encoding="utf-8")
-            return res
-        except Exception as e:
-            last_err = e
-            # backoff exponencial + jitter
-            time.sleep(backoff + random.uniform(0, 0.6))
-            backoff = min(backoff * 1.9, 10.0)
-    raise last_err
+CACHE_DIR = DATA_ROOT / "cache_wd"            # formato antiguo: un .json por consulta
+CACHE_DB = DATA_ROOT / "cache_wd.sqlite"       # formato actual (HFKG_CACHE=sqlite)
+DATA_ROOT.mkdir(parents=True, exist_ok=True)
+
+
+# ritmo, reintentos y circuit breaker compartidos por todos los hilos (kg.wd.throttle);
+# WDQS permite ~5 consultas simultáneas por IP
+_BUDGET = ThrottlePolicy(max_inflight=5)
+
+
+def configure_budget(max_inflight: int = 5, max_rps: float = 0.0) -> ThrottlePolicy:
+    """
+    Reemplaza la política global de requests (llamar antes de lanzar hilos).
+    `max_rps` es el techo del ritmo AIMD (0 = sin techo).
+    """
+    global _BUDGET
+    _BUDGET = ThrottlePolicy(max_inflight=max_inflight, max_rps=max_rps)
+    return _BUDGET
+
+
+def get_budget() -> ThrottlePolicy:
+    """Política de requests activa del proceso."""
+    return _BUDGET
+
+
+_CACHE: QueryCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def configure_cache(backend: str | None = None, ttl_s: float | None = None,
+                    max_mb: float | None = None, mem_items: int = 2048) -> QueryCache:
+    """
+    Selecciona el caché de consultas del proceso.
+    - backend: "sqlite" (default; data/cache_wd.sqlite, comprimido) o "files" (data/cache_wd/*.json).
+    - ttl_s / max_mb: expiración y presupuesto LRU (solo sqlite).
+    Al abrir el SQLite por primera vez se importa el directorio antiguo data/cache_wd/.
+    """
+    global _CACHE
+    backend = (backend or os.getenv("HFKG_CACHE", "sqlite")).lower()
+    if ttl_s is None and os.getenv("HFKG_CACHE_TTL"):
+        ttl_s = float(os.environ["HFKG_CACHE_TTL"])
+    if max_mb is None and os.getenv("HFKG_CACHE_MAX_MB"):
+        max_mb = float(os.environ["HFKG_CACHE_MAX_MB"])
+    with _CACHE_LOCK:
+        if backend == "files":
+            _CACHE = FileCache(CACHE_DIR, mem_items=mem_items)
+        elif backend == "sqlite":
+            cache = SQLiteCache(CACHE_DB, ttl_s=ttl_s, mem_items=mem_items,
+                                max_bytes=int(max_mb * 1024 * 1024) if max_mb else None)
+            cache.migrate_once(CACHE_DIR)
+            _CACHE = cache
+        else:
+            raise ValueError(f"Backend de caché desconocido: {backend!r} (usa 'sqlite' o 'files')")
+        return _CACHE
+
+
+def store_ttl_s() -> float | None:
+    """
+    Vigencia (s) de los stores persistentes por entidad (veredictos, etiquetas, lugares):
+    HFKG_STORE_TTL, o HFKG_CACHE_TTL si no está definida. None = sin expiración.
+    """
+    value = os.getenv("HFKG_STORE_TTL") or os.getenv("HFKG_CACHE_TTL")
+    return float(value) if value else None
+
+
+def get_cache() -> QueryCache:
+    """Caché de consultas activo (se crea con `configure_cache()` la primera vez)."""
+    return _CACHE if _CACHE is not None else configure_cache()
+
+
+# espacios fuera de literales: se colapsan a " " (o a "\n" si había salto de línea, por los comentarios "#")
+_WS = re.compile(r'("(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')|\s+')
+
+
+def normalize_query(query: str) -> str:
+    """Consulta con el espaciado normalizado: dos textos equivalentes dan la misma clave de caché."""
+    return _WS.sub(lambda m: m.group(1) or ("\n" if "\n" in m.group(0) else " "), query).strip()
+
+
+def _cache_key(query: str) -> str:
+    return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
+
+
+def _legacy_cache_key(query: str) -> str:
+    """Clave de las entradas guardadas antes de normalizar las consultas (sha1 del texto tal cual)."""
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+
+def _cache_lookup(cache: QueryCache, key: str, query: str) -> dict | None:
+    hit = cache.get(key)
+    if hit is None:
+        legacy = _legacy_cache_key(query)
+        if legacy != key:
+            hit = cache.adopt(legacy, key)  # pasa a la clave nueva con su fecha de creación
+    return hit
+
+
+_CALL = threading.local()
+
+
+def last_query_cached() -> bool:
+    """True si la última llamada a `run_sparql` de este hilo se respondió desde el caché."""
+    return getattr(_CALL, "cached", False)
+
+
+class _Flight:
+    """Consulta en vuelo en este proceso: el primer hilo la ejecuta y los demás esperan su resultado."""
+    __slots__ = ("done", "result", "error", "retry_timeouts")
+
+    def __init__(self, retry_timeouts: bool):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.retry_timeouts = retry_timeouts
+
+
+_FLIGHTS: dict[str, _Flight] = {}
+_FLIGHTS_LOCK = threading.Lock()
+
+# vigencia del lease entre procesos: cubre una consulta de 120 s con holgura; si el dueño
+# muere, los que esperan toman el lease cuando vence
+LEASE_S = 180.0
+
+
+def run_sparql(query: str, use_cache: bool = True, retries: int = 7,
+               retry_timeouts: bool = True, kind: str = "other"):
+    """
+    Ejecuta una consulta SPARQL con caché y la política de ritmo y reintentos del proceso
+    (kg.wd.throttle: AIMD, Retry-After, solo errores transitorios, circuit breaker).
+    Con `retry_timeouts=False` un timeout no se reintenta: se lanza `SparqlTimeout` de
+    inmediato (para que el llamador parta el lote, ver kg.wd.batching).
+    `kind` (p. ej. "truthy_batch", "filter_p1", "labels") etiqueta las métricas (kg.metrics).
+
+    Consultas idénticas (tras `normalize_query`) se ejecutan una sola vez: los hilos que la piden
+    mientras está en vuelo esperan y comparten el resultado (o el error); entre procesos, el
+    lease del caché hace que los demás esperen a que la respuesta aparezca en él.
+    El resultado es compartido: no modificarlo.
+    """
+    key = _cache_key(query)
+    cache = get_cache() if use_cache else None
+    if cache is not None:
+        hit = _cache_lookup(cache, key, query)
+        metrics.inc("sparql_cache_total", kind=kind, result="hit" if hit is not None else "miss")
+        if hit is not None:
+            _CALL.cached = True
+            return hit
+
+    while True:
+        with _FLIGHTS_LOCK:
+            flight = _FLIGHTS.get(key)
+            leader = flight is None
+            if leader:
+                flight = _FLIGHTS[key] = _Flight(retry_timeouts)
+        if leader:
+            break
+        metrics.inc("sparql_coalesced_total", kind=kind, scope="thread")
+        flight.done.wait()
+        if flight.error is None:
+            _CALL.cached = True
+            return flight.result
+        # el líder no reintentó timeouts pero este llamador sí: vuelve a intentarlo por su cuenta
+        if not (retry_timeouts and not flight.retry_timeouts and isinstance(flight.error, SparqlTimeout)):
+            raise flight.error
+
+    _CALL.cached = False
+    try:
+        flight.result = _run_leased(query, key, cache, retries, retry_timeouts, kind)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _FLIGHTS_LOCK:
+            _FLIGHTS.pop(key, None)
+        flight.done.set()
+
+
+def _run_leased(query: str, key: str, cache: QueryCache | None, retries: int,
+                retry_timeouts: bool, kind: str):
+    if cache is None:
+        return _fetch(query, key, None, retries, retry_timeouts, kind)
+    waited = False
+    while not cache.acquire_lease(key, LEASE_S):
+        # otro proceso ya la está consultando: se espera su respuesta en el caché
+        if not waited:
+            metrics.inc("sparql_coalesced_total", kind=kind, scope="process")
+            waited = True
+        hit = cache.wait_for(key, LEASE_S)
+        if hit is not None:
+            _CALL.cached = True
+            return hit
+    try:
+        # el dueño anterior pudo guardar y soltar el lease entre el sondeo y acquire_lease
+        hit = cache.peek(key)
+        if hit is not None:
+            _CALL.cached = True
+            return hit
+        return _fetch(query, key, cache, retries, retry_timeouts, kind)
+    finally:
+        cache.release_lease(key)
+
+
+def _fetch(query: str, key: str, cache: QueryCache | None, retries: int, retry_timeouts: bool, kind: str):
+    if STREAMING:
+        # parseo incremental: el cuerpo no queda en memoria además del dict; el caché lo
+        # vuelve a codificar y comprimir por partes
+        def attempt() -> dict:
+            res, n = get_client().query_json(query, timeout=120)  # 2 minutos
+            metrics.inc("sparql_response_bytes_total", n, kind=kind)
+            return res   # una respuesta truncada se reintenta (error transitorio)
+
+        res = _BUDGET.call(attempt, kind=kind, retries=retries, retry_timeouts=retry_timeouts)
+        if cache is not None:
+            cache.put(key, res)
+        return res
+
+    def attempt_raw() -> tuple[bytes, dict]:
+        raw = get_client().query_raw(query, timeout=120)
+        metrics.inc("sparql_response_bytes_total", len(raw), kind=kind)
+        return raw, json.loads(raw)
+
+    raw, res = _BUDGET.call(attempt_raw, kind=kind, retries=retries, retry_timeouts=retry_timeouts)
+    if cache is not None:
+        cache.put_raw(key, raw, res)
+    return res
 
 
 def labels(qids: list[str], langs: str = "es,en") -> dict[str, str]:
     """
     Devuelve etiquetas de Wikidata en los idiomas especificados (por defecto 'es,en').
+    Se resuelven con `kg.wd.label_store` (lotes acotados + caché persistente por idioma).
 
     Parameters
     ----------
@@ -67,17 +261,6 @@ def labels(qids: list[str], langs: str = "es,en") -> dict[str, str]:
     if not qids:
         return {}
 
-    values = " ".join(f"wd:{q}" for q in qids)
-    q = f"""
-    SELECT ?x ?xLabel WHERE {{
-      VALUES ?x {{ {values} }}
-      SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{langs}". }}
-    }}
-    """
-
-    res = run_sparql(q)
-    out = {}
-    for b in res["results"]["bindings"]:
-        qid = b["x"]["value"].split("/")[-1]
-        out[qid] = b.get("xLabel", {}).get("value", qid)
-    return out
+    # store persistente por (QID, idioma): solo se consultan los pares desconocidos
+    from kg.wd.label_store import resolve_labels  # import diferido (depende de este módulo)
+    return resolve_labels(qids, langs=langs)
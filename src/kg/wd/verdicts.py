@@ -0,0 +1,110 @@
+# src/kg/wd/verdicts.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable
+import sqlite3
+import threading
+import time
+
+from kg.wd.utils import DATA_ROOT, store_ttl_s
+
+VERDICTS_DB = DATA_ROOT / "country_verdicts.sqlite"
+
+# Pasada de filter_by_country que decidió el veredicto
+PASS_DIRECT = 1     # P27/P17 directo
+PASS_P131 = 2       # vía P131
+PASS_LOCATED = 3    # vía P159/P276 (o descartado tras las 3 pasadas)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    obj        TEXT    NOT NULL,
+    country    TEXT    NOT NULL,
+    in_country INTEGER NOT NULL,
+    pass       INTEGER NOT NULL,
+    fetched_at REAL    NOT NULL,
+    PRIMARY KEY (obj, country)
+) WITHOUT ROWID;
+"""
+
+
+class VerdictStore:
+    """
+    Caché persistente de veredictos de pertenencia a país por entidad:
+    (QID objeto, QID país) → (en el país sí/no, pasada que lo decidió).
+
+    SQLite en modo WAL: varios procesos/hilos pueden leer y escribir a la vez.
+    Cada hilo usa su propia conexión. Con `ttl_s`, un veredicto más antiguo que eso no se
+    devuelve (se vuelve a calcular y se reemplaza).
+    """
+
+    def __init__(self, path: Path | str = VERDICTS_DB, ttl_s: float | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_s = ttl_s
+        self._local = threading.local()
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.executescript(_SCHEMA)
+            if "updated" in {row[1] for row in c.execute("PRAGMA table_info(verdicts)")}:
+                c.execute("ALTER TABLE verdicts RENAME COLUMN updated TO fetched_at")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(str(self.path), timeout=60)
+            c.execute("PRAGMA busy_timeout=60000")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def get_many(self, qids: Iterable[str], country_qid: str) -> dict[str, tuple[bool, int]]:
+        """Devuelve {qid: (in_country, pass)} solo para los QIDs con veredicto conocido y vigente."""
+        qids = list(dict.fromkeys(qids))
+        out: dict[str, tuple[bool, int]] = {}
+        cutoff = time.time() - self.ttl_s if self.ttl_s is not None else 0.0
+        c = self._conn()
+        # SQLite limita el número de parámetros por sentencia
+        for i in range(0, len(qids), 500):
+            chunk = qids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = c.execute(
+                f"SELECT obj, in_country, pass FROM verdicts "
+                f"WHERE country = ? AND fetched_at >= ? AND obj IN ({marks})",
+                [country_qid, cutoff, *chunk],
+            )
+            for obj, in_country, pass_ in rows:
+                out[obj] = (bool(in_country), int(pass_))
+        return out
+
+    def put_many(self, qids: Iterable[str], country_qid: str, in_country: bool, pass_: int) -> None:
+        """Registra el mismo veredicto para varios QIDs."""
+        now = time.time()
+        rows = [(q, country_qid, int(in_country), int(pass_), now) for q in dict.fromkeys(qids)]
+        if not rows:
+            return
+        with self._conn() as c:
+            c.executemany(
+                "INSERT OR REPLACE INTO verdicts (obj, country, in_country, pass, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def clear(self, country_qid: str | None = None) -> None:
+        """Borra los veredictos (de un país o de todos)."""
+        with self._conn() as c:
+            if country_qid:
+                c.execute("DELETE FROM verdicts WHERE country = ?", (country_qid,))
+            else:
+                c.execute("DELETE FROM verdicts")
+
+
+_STORE: VerdictStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_verdict_store() -> VerdictStore:
+    """Store por defecto (data/country_verdicts.sqlite, vigencia `store_ttl_s()`), creado bajo demanda."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = VerdictStore(ttl_s=store_ttl_s())
+        return _STORE
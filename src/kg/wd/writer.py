@@ -0,0 +1,230 @@
+# src/kg/wd/writer.py
+from __future__ import annotations
+from pathlib import Path
+import gzip
+import io
+import os
+
+from kg import metrics
+
+# Escritor streaming de grafos grado-1 directamente desde tuplas (P, Q) y dicts de etiquetas,
+# sin construir un rdflib.Graph. La salida es determinista byte a byte: aristas ordenadas
+# por (P, Q) numérico, etiquetas ordenadas por QID y gzip sin marca de tiempo.
+
+WD = "http://www.wikidata.org/entity/"
+WDT = "http://www.wikidata.org/prop/direct/"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+GRAPH_NS = "urn:hfkg:subject:"   # grafo nombrado por sujeto (N-Quads)
+
+TURTLE_PREFIXES = (
+    "@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .\n"
+    "@prefix wd: <http://www.wikidata.org/entity/> .\n"
+    "@prefix wdt: <http://www.wikidata.org/prop/direct/> .\n"
+    "@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .\n"
+)
+
+_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+
+def _lit(s: str) -> str:
+    return '"' + s.translate(_ESCAPES) + '"'
+
+
+def _num(x: str) -> int:
+    return int(x[1:]) if x[1:].isdigit() else -1
+
+
+def _sorted_edges(edges: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    return sorted(set(edges), key=lambda e: (_num(e[0]), e[0], _num(e[1]), e[1]))
+
+
+def _label_targets(root: str, edges: list[tuple[str, str]], labels: dict[str, str] | None) -> list[str]:
+    """Objetos (sin el root) con etiqueta, ordenados por QID."""
+    if not labels:
+        return []
+    objs = {Q for _, Q in edges if Q in labels and Q != root}
+    return sorted(objs, key=lambda q: (_num(q), q))
+
+
+def render_turtle(root: str, edges: list[tuple[str, str]], labels: dict[str, str] | None = None) -> str:
+    """Turtle de un grafo grado-1 (mismas tripletas que `build_degree1_graph`)."""
+    edges = _sorted_edges(edges)
+    out = [TURTLE_PREFIXES, "\n"]
+
+    preds: list[str] = []
+    if labels and root in labels:
+        preds.append(f"rdfs:label {_lit(labels[root])}^^xsd:string")
+    cur_p = None
+    objs: list[str] = []
+    for P, Q in edges:
+        if P != cur_p:
+            if cur_p is not None:
+                preds.append(f"wdt:{cur_p} " + ",\n        ".join(objs))
+            cur_p, objs = P, []
+        objs.append(f"wd:{Q}")
+    if cur_p is not None:
+        preds.append(f"wdt:{cur_p} " + ",\n        ".join(objs))
+    if preds:
+        out.append(f"wd:{root} " + " ;\n    ".join(preds) + " .\n\n")
+
+    for Q in _label_targets(root, edges, labels):
+        out.append(f"wd:{Q} rdfs:label {_lit(labels[Q])}^^xsd:string .\n\n")
+    return "".join(out)
+
+
+def render_ntriples(root: str, edges: list[tuple[str, str]], labels: dict[str, str] | None = None,
+                    graph: str | None = None) -> str:
+    """N-Triples (o N-Quads si se pasa `graph`, IRI del grafo nombrado)."""
+    edges = _sorted_edges(edges)
+    g = f" <{graph}>" if graph else ""
+    s = f"<{WD}{root}>"
+    lines: list[str] = []
+    if labels and root in labels:
+        lines.append(f'{s} <{RDFS_LABEL}> {_lit(labels[root])}^^<{XSD_STRING}>{g} .\n')
+    for P, Q in edges:
+        lines.append(f"{s} <{WDT}{P}> <{WD}{Q}>{g} .\n")
+    for Q in _label_targets(root, edges, labels):
+        lines.append(f'<{WD}{Q}> <{RDFS_LABEL}> {_lit(labels[Q])}^^<{XSD_STRING}>{g} .\n')
+    return "".join(lines)
+
+
+def render_triples(triples: list[tuple[str, str, str]], labels: dict[str, str] | None = None,
+                   fmt: str = "ttl", graph: str | None = None) -> str:
+    """
+    Grafo arbitrario (s, P, o) entre entidades, p. ej. un vecindario de grado k:
+    Turtle agrupado por sujeto ("ttl") o N-Triples/N-Quads ("nt"/"nq" con `graph`).
+    Tripletas y etiquetas ordenadas por QID numérico (salida determinista).
+    """
+    key = lambda t: (_num(t[0]), t[0], _num(t[1]), t[1], _num(t[2]), t[2])
+    triples = sorted(set(triples), key=key)
+    nodes = sorted({x for s, _, o in triples for x in (s, o)} & set(labels or ()), key=lambda q: (_num(q), q))
+    if fmt != "ttl":
+        g = f" <{graph}>" if graph else ""
+        lines = [f"<{WD}{s}> <{WDT}{P}> <{WD}{o}>{g} .\n" for s, P, o in triples]
+        lines += [f'<{WD}{q}> <{RDFS_LABEL}> {_lit(labels[q])}^^<{XSD_STRING}>{g} .\n' for q in nodes]
+        return "".join(lines)
+
+    out = [TURTLE_PREFIXES, "\n"]
+    by_s: dict[str, list[tuple[str, str]]] = {}
+    for s, P, o in triples:
+        by_s.setdefault(s, []).append((P, o))
+    for q in nodes:
+        by_s.setdefault(q, [])
+    for s in sorted(by_s, key=lambda q: (_num(q), q)):
+        preds = [f"rdfs:label {_lit(labels[s])}^^xsd:string"] if labels and s in labels else []
+        cur_p, objs = None, []
+        for P, o in by_s[s]:
+            if P != cur_p:
+                if cur_p is not None:
+                    preds.append(f"wdt:{cur_p} " + ",\n        ".join(objs))
+                cur_p, objs = P, []
+            objs.append(f"wd:{o}")
+        if cur_p is not None:
+            preds.append(f"wdt:{cur_p} " + ",\n        ".join(objs))
+        out.append(f"wd:{s} " + " ;\n    ".join(preds) + " .\n\n")
+    return "".join(out)
+
+
+def write_graph(out_path: Path, triples: list[tuple[str, str, str]], labels: dict[str, str] | None = None,
+                fmt: str = "ttl", compress: bool = False) -> Path:
+    """Escribe un grafo arbitrario (`render_triples`) de forma atómica; `.gz` si compress."""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    data = render_triples(triples, labels, fmt).encode("utf-8")
+    metrics.inc("output_bytes_total", len(data), format=fmt)
+    tmp = out_path.with_name(out_path.name + f".{os.getpid()}.tmp")
+    raw, gz = _open_out(tmp, compress)
+    try:
+        (gz or raw).write(data)
+    finally:
+        if gz:
+            gz.close()
+        raw.close()
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def subject_graph(root: str) -> str:
+    """IRI del grafo nombrado de un sujeto en la salida N-Quads consolidada."""
+    return GRAPH_NS + root
+
+
+def _open_out(path: Path, compress: bool):
+    raw = path.open("wb")
+    if compress:
+        # filename="" y mtime=0: la cabecera gzip no depende del momento ni del nombre
+        return raw, gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0)
+    return raw, None
+
+
+def write_turtle(out_path: Path, root: str, edges: list[tuple[str, str]],
+                 labels: dict[str, str] | None = None, compress: bool = False) -> Path:
+    """Escribe el Turtle de un sujeto (de forma atómica; `.gz` si compress)."""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    data = render_turtle(root, edges, labels).encode("utf-8")
+    metrics.inc("output_bytes_total", len(data), format="ttl")
+    tmp = out_path.with_name(out_path.name + f".{os.getpid()}.tmp")
+    raw, gz = _open_out(tmp, compress)
+    try:
+        (gz or raw).write(data)
+    finally:
+        if gz:
+            gz.close()
+        raw.close()
+    os.replace(tmp, out_path)
+    return out_path
+
+
+class StreamWriter:
+    """
+    Archivo consolidado por país: N-Triples ("nt") o N-Quads con un grafo nombrado
+    por sujeto ("nq"), opcionalmente gzip. Se escribe a un temporal y se publica
+    con os.replace al cerrar. El llamador debe escribir los sujetos en orden estable.
+    """
+
+    def __init__(self, out_path: Path | str, fmt: str = "nt", compress: bool = False,
+                 buffer_bytes: int = 1 << 20):
+        if fmt not in ("nt", "nq"):
+            raise ValueError(f"Formato consolidado inválido: {fmt!r} (usa 'nt' o 'nq')")
+        self.out_path = Path(out_path)
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        self.fmt = fmt
+        self._tmp = self.out_path.with_name(self.out_path.name + f".{os.getpid()}.tmp")
+        self._raw, self._gz = _open_out(self._tmp, compress)
+        self._out = io.BufferedWriter(self._gz, buffer_size=buffer_bytes) if self._gz else self._raw
+        self.subjects = 0
+
+    def render(self, root: str, edges: list[tuple[str, str]], labels: dict[str, str] | None = None) -> str:
+        return render_ntriples(root, edges, labels, graph=subject_graph(root) if self.fmt == "nq" else None)
+
+    def write_chunk(self, chunk: str) -> None:
+        data = chunk.encode("utf-8")
+        self._out.write(data)
+        metrics.inc("output_bytes_total", len(data), format=self.fmt)
+        self.subjects += 1
+
+    def write(self, root: str, edges: list[tuple[str, str]], labels: dict[str, str] | None = None) -> None:
+        self.write_chunk(self.render(root, edges, labels))
+
+    def close(self) -> Path:
+        if self._gz:
+            self._out.close()   # cierra también el GzipFile (no el archivo subyacente)
+        self._raw.close()
+        os.replace(self._tmp, self.out_path)
+        return self.out_path
+
+    def abort(self) -> None:
+        """Descarta la salida parcial (no publica el archivo)."""
+        if self._gz:
+            self._out.close()
+        self._raw.close()
+        self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.abort() if exc_type else self.close()
+        return False
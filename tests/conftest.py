@@ -0,0 +1,7 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# kg.wd.utils crea DATA_ROOT al importarse: los tests no tocan data/ del proyecto
+os.environ.setdefault("HFKG_DATA_DIR", tempfile.mkdtemp(prefix="hfkg-tests-"))
+os.environ.setdefault("HFKG_ENDPOINT", "http://127.0.0.1:9/sparql")
@@ -0,0 +1,64 @@
+# tests/test_batching.py
+import pytest
+
+from kg.wd import batching
+from kg.wd.batching import AdaptiveBatcher
+from kg.wd.throttle import SparqlTimeout
+
+
+@pytest.fixture(autouse=True)
+def no_state(monkeypatch):
+    # map() guarda los tamaños aprendidos al terminar: aquí no interesa
+    monkeypatch.setattr(batching, "save_batch_state", lambda *a, **kw: None)
+
+
+def _endpoint(limit, calls):
+    """Responde lotes de hasta `limit` elementos; los más grandes agotan el tiempo."""
+    def fn(chunk):
+        calls.append(list(chunk))
+        if len(chunk) > limit:
+            raise SparqlTimeout(f"{len(chunk)} > {limit}")
+        return sum(chunk)
+    return fn
+
+
+def test_timeout_bisects_only_the_failed_batch():
+    b = AdaptiveBatcher("t", size=8, max_size=8)
+    calls = []
+    out = list(b.map(list(range(16)), _endpoint(3, calls)))
+    # cada resultado corresponde a su lote y los lotes cubren la entrada en orden
+    assert [x for chunk, _ in out for x in chunk] == list(range(16))
+    assert all(res == sum(chunk) for chunk, res in out)
+    assert all(len(chunk) <= 3 for chunk, _ in out)
+    # 8 → 4 + 4 → 2+2 / 2+2; el segundo lote ya usa el tamaño aprendido (mitad del que falló)
+    assert [len(c) for c in calls[:7]] == [8, 4, 2, 2, 4, 2, 2]
+    assert b.timeouts >= 3
+    assert b.ceiling == 4 and b.size < 4   # luego crece, sin llegar al lote que falló
+
+
+def test_single_item_timeout_retries_once_then_raises():
+    b = AdaptiveBatcher("t", size=4)
+    calls = []
+    with pytest.raises(SparqlTimeout):
+        list(b.map([1, 2], _endpoint(0, calls)))
+    # [1, 2] → [1] → [1] otra vez → se propaga
+    assert calls == [[1, 2], [1], [1]]
+
+
+def test_growth_stops_below_ceiling():
+    b = AdaptiveBatcher("t", size=4, max_size=100, target_s=10.0, relax_every=1000)
+    b.observe_timeout(10)
+    assert b.ceiling == 10 and b.size == 4
+    for _ in range(20):
+        b.observe(b.size, 0.1)
+    assert b.size == 9   # crece con respuestas rápidas, sin alcanzar el lote que falló
+    b.observe(b.size, 20.0)
+    assert b.size < 9    # una respuesta lenta lo reduce
+
+
+def test_state_round_trip():
+    b = AdaptiveBatcher("t", size=4)
+    b.observe_timeout(6)
+    c = AdaptiveBatcher("t", size=50)
+    c.load(b.state())
+    assert (c.size, c.ceiling, c.timeouts) == (3, 6, 1)
@@ -0,0 +1,101 @@
+# tests/test_cache.py
+import threading
+import time
+
+from kg.wd.cache import SQLiteCache
+
+
+def _writes(cache: SQLiteCache) -> int:
+    return cache._conn().total_changes
+
+
+def test_reads_do_not_write_until_flush(tmp_path):
+    cache = SQLiteCache(tmp_path / "c.sqlite", mem_items=0, flush_s=3600)
+    cache.put("a", {"x": 1})
+    before = _writes(cache)
+    assert cache.get("a") == {"x": 1}
+    assert cache.get_many(["a", "missing"]) == {"a": {"x": 1}}
+    assert cache.get("missing") is None
+    assert _writes(cache) == before
+    cache.flush()
+    stats = cache.stats()
+    assert stats["stored_hits"] == 2
+    assert stats["total_misses"] == 2
+
+
+def test_expired_reads_do_not_delete(tmp_path):
+    cache = SQLiteCache(tmp_path / "c.sqlite", ttl_s=0.2, mem_items=0, flush_s=3600)
+    cache.put_many({"a": {"x": 1}, "b": {"x": 2}})
+    time.sleep(0.3)
+    before = _writes(cache)
+    assert cache.get("a") is None
+    assert cache.get_many(["a", "b"]) == {}
+    assert _writes(cache) == before
+    assert cache._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 2
+    assert cache.purge_expired() == 2
+
+
+def test_memory_layer_honours_ttl(tmp_path):
+    cache = SQLiteCache(tmp_path / "c.sqlite", ttl_s=0.2)
+    cache.put("a", {"x": 1})
+    assert cache.get("a") == {"x": 1}
+    assert cache.mem_hits == 1
+    time.sleep(0.3)
+    assert cache.get("a") is None
+    assert cache.get_many(["a"]) == {}
+
+
+def test_memory_entry_keeps_backend_creation_time(tmp_path):
+    writer = SQLiteCache(tmp_path / "c.sqlite", ttl_s=0.3, mem_items=0)
+    writer.put("a", {"x": 1})
+    time.sleep(0.2)
+    reader = SQLiteCache(tmp_path / "c.sqlite", ttl_s=0.3)
+    assert reader.get("a") == {"x": 1}       # leída del disco a los 0.2 s
+    time.sleep(0.15)
+    assert reader.get("a") is None           # vence según su creación, no según la lectura
+
+
+def test_peek_and_adopt_honour_ttl(tmp_path):
+    cache = SQLiteCache(tmp_path / "c.sqlite", ttl_s=60, mem_items=0)
+    cache.put("old", {"x": 1})
+    cache.put("stale", {"x": 2})
+    with cache._conn() as c:
+        c.execute("UPDATE entries SET created = created - 30 WHERE key = 'old'")
+        c.execute("UPDATE entries SET created = created - 120 WHERE key = 'stale'")
+    assert cache.peek("stale") is None
+    assert cache.adopt("stale", "new-stale") is None
+    assert cache.peek("new-stale") is None
+
+    assert cache.adopt("old", "new") == {"x": 1}
+    created = cache._conn().execute("SELECT created FROM entries WHERE key = 'new'").fetchone()[0]
+    assert time.time() - created >= 30       # conserva la creación: no se renueva el TTL
+    assert cache.peek("old") is None
+
+
+def test_store_releases_own_lease(tmp_path):
+    cache = SQLiteCache(tmp_path / "c.sqlite")
+    assert cache.acquire_lease("a", 60)
+    cache.put("a", {"x": 1})
+    assert not cache._lease_alive("a")
+    before = _writes(cache)
+    cache.release_lease("a")                 # ya liberado al guardar: sin otra escritura
+    assert _writes(cache) == before
+
+
+def test_lease_expires(tmp_path):
+    owner = SQLiteCache(tmp_path / "c.sqlite")
+    other = SQLiteCache(tmp_path / "c.sqlite")
+    assert owner.acquire_lease("a", 0.3)
+    assert not other.acquire_lease("a", 60)
+    t0 = time.monotonic()
+    assert other.wait_for("a", 10) is None   # el dueño no guardó nada y el lease venció
+    assert time.monotonic() - t0 < 2
+    assert other.acquire_lease("a", 60)
+
+
+def test_wait_for_returns_owner_result(tmp_path):
+    owner = SQLiteCache(tmp_path / "c.sqlite")
+    other = SQLiteCache(tmp_path / "c.sqlite")
+    assert owner.acquire_lease("a", 60)
+    threading.Timer(0.2, owner.put, ("a", {"x": 1})).start()
+    assert other.wait_for("a", 10) == {"x": 1}
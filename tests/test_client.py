@@ -0,0 +1,60 @@
+# tests/test_client.py
+import io
+import json
+
+import pytest
+import requests
+
+from kg.wd import client as client_mod
+from kg.wd.cache import SQLiteCache, _encode_chunks
+from kg.wd.throttle import TRANSIENT, classify
+
+BODY = {"head": {"vars": ["s", "o"]},
+        "results": {"distinct": False,
+                    "bindings": [{"s": {"type": "uri", "value": f"http://www.wikidata.org/entity/Q{i}"},
+                                  "o": {"type": "literal", "value": f"ñandú {i}", "xml:lang": "es"}}
+                                 for i in range(1000)]}}
+
+
+def _response(body: bytes, status: int = 200) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp.raw = io.BytesIO(body)
+    return resp
+
+
+@pytest.fixture
+def client(monkeypatch):
+    c = client_mod.SparqlClient(endpoint="http://127.0.0.1:9/sparql")
+    c.body = b""
+    monkeypatch.setattr(c, "_send", lambda query, timeout, stream=False: _response(c.body))
+    return c
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_query_json_parses_and_counts_bytes(client, monkeypatch, streaming):
+    if streaming and client_mod.ijson is None:
+        pytest.skip("ijson no está instalado")
+    monkeypatch.setattr(client_mod, "STREAMING", streaming)
+    client.body = json.dumps(BODY).encode("utf-8")
+    res, n = client.query_json("SELECT * WHERE {}")
+    assert res == BODY
+    assert n == len(client.body)
+
+
+@pytest.mark.skipif(client_mod.ijson is None, reason="ijson no está instalado")
+def test_truncated_stream_is_transient(client, monkeypatch):
+    monkeypatch.setattr(client_mod, "STREAMING", True)
+    client.body = json.dumps(BODY).encode("utf-8")[:5000]
+    with pytest.raises(json.JSONDecodeError) as e:
+        client.query_json("SELECT * WHERE {}")
+    assert classify(e.value) == TRANSIENT
+
+
+def test_encoded_chunks_round_trip(tmp_path):
+    assert json.loads(b"".join(_encode_chunks(BODY))) == BODY
+    assert json.loads(b"".join(_encode_chunks({"boolean": True}))) == {"boolean": True}
+    cache = SQLiteCache(tmp_path / "c.sqlite", mem_items=0)
+    cache.put("k", BODY)
+    assert cache.get("k") == BODY
+    assert cache.stats()["raw_bytes"] == len(b"".join(_encode_chunks(BODY)))
@@ -0,0 +1,31 @@
+# tests/test_csr.py
+import gzip
+
+import numpy as np
+
+from kg.store.csr import CSRGraph
+from kg.wd.writer import render_ntriples, render_turtle
+
+EDGES = [("P27", "Q30"), ("P31", "Q5"), ("P19", "Q60")]
+LABELS = {"Q1": "Ana \"A\"", "Q30": "Estados Unidos", "Q5": "humano"}
+
+
+def _arrays(g):
+    return [np.asarray(getattr(g, n)).tolist() for n in ("nodes", "props", "out_indptr", "out_dst", "in_src")]
+
+
+def test_turtle_and_ntriples_build_same_graph(tmp_path):
+    ttl = tmp_path / "ttl"
+    ttl.mkdir()
+    (ttl / "Q1.ttl").write_text(render_turtle("Q1", EDGES, LABELS), encoding="utf-8")
+    with gzip.open(ttl / "Q2.ttl.gz", "wt", encoding="utf-8") as f:
+        f.write(render_turtle("Q2", [("P31", "Q5")], LABELS))
+    nt = tmp_path / "all.nt"
+    nt.write_text(render_ntriples("Q1", EDGES, LABELS) + render_ntriples("Q2", [("P31", "Q5")], LABELS),
+                  encoding="utf-8")
+
+    a, b = CSRGraph.from_dir(ttl), CSRGraph.from_dir(nt)
+    assert _arrays(a) == _arrays(b)
+    assert a.labels == b.labels == LABELS
+    assert a.nodes.tolist() == [1, 2, 5, 30, 60]
+    assert CSRGraph.from_dir(nt, with_labels=False).labels == {}
@@ -0,0 +1,31 @@
+# tests/test_dump.py
+import sqlite3
+
+import pytest
+
+from kg.wd import dump
+from kg.wd.dump import DumpStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "dump.sqlite"
+    c = sqlite3.connect(path)
+    c.executescript(dump._SCHEMA)
+    edges = []
+    # Q12 y Q3 con la ocupación Q2, Q10 y Q9 con Q1: el índice (p, o, s) los da agrupados por ocupación
+    for s, occ in ((12, 2), (3, 2), (10, 1), (9, 1)):
+        edges += [(s, 31, 5), (s, 27, 30), (s, 106, occ)]
+    c.executemany("INSERT INTO edges VALUES (?, ?, ?)", edges)
+    c.executemany("INSERT INTO prop_edges VALUES (?, ?, ?)", [(p, o, s) for s, p, o in edges])
+    c.executemany("INSERT INTO sitelinks VALUES (?, ?, ?)",
+                  [(s, "es.wikipedia.org", f"Persona {s}") for s in (12, 3, 10, 9)])
+    c.commit()
+    c.close()
+    return DumpStore(path)
+
+
+def test_sample_subjects_follow_numeric_qid(store):
+    rows = store.sample_subjects(["Q2", "Q1"], "Q30", "es", limit=10)
+    assert [q for q, _ in rows] == ["Q3", "Q9", "Q10", "Q12"]
+    assert store.sample_subjects(["Q2", "Q1"], "Q30", "es", limit=2) == [("Q3", "Persona 3"), ("Q9", "Persona 9")]
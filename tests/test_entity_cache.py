@@ -0,0 +1,55 @@
+# tests/test_entity_cache.py
+import threading
+
+from kg.wd import entity_cache
+from kg.wd.entity_cache import _lease_key
+from kg.wd.filter_country import FILTER_P1, FILTER_P1_MULTI
+from kg.wd.utils import get_cache
+
+WD = "http://www.wikidata.org/entity/"
+
+
+def _fake_sparql(calls, bindings):
+    def run_sparql(query, **kw):
+        calls.append(query)
+        return {"results": {"bindings": bindings}}
+    return run_sparql
+
+
+def test_multi_country_rows_are_shared_with_single_country(monkeypatch):
+    calls = []
+    monkeypatch.setattr(entity_cache, "run_sparql", _fake_sparql(calls, [
+        {"o": {"type": "uri", "value": WD + "Q101"}, "country": {"type": "uri", "value": WD + "Q30"}},
+        {"o": {"type": "uri", "value": WD + "Q102"}, "country": {"type": "uri", "value": WD + "Q183"}},
+    ]))
+    rows = FILTER_P1_MULTI.fetch(["Q101", "Q102", "Q103"], ["Q183", "Q30"])
+    assert len(calls) == 1
+    assert {o for o, r in rows["Q30"].items() if r} == {"Q101"}
+    assert {o for o, r in rows["Q183"].items() if r} == {"Q102"}
+
+    # un run de un solo país (u otro conjunto de países) reutiliza las filas por (objeto, país)
+    found, missing = FILTER_P1.lookup(["Q101", "Q102", "Q103"], country="Q30")
+    assert not missing
+    assert found["Q101"] == [{"o": {"type": "uri", "value": WD + "Q101"}}]
+    assert found["Q102"] == found["Q103"] == []
+    found, missing = FILTER_P1_MULTI.lookup(["Q101", "Q102"], ["Q30", "Q38"])
+    assert missing == ["Q101", "Q102"] and set(found["Q30"]) == {"Q101", "Q102"}
+
+
+def test_fetch_waits_for_lease_holder(monkeypatch):
+    calls = []
+    monkeypatch.setattr(entity_cache, "run_sparql", _fake_sparql(calls, []))
+    template = entity_cache.EntityTemplate("test_lease", lambda ids, **p: " ".join(ids), var="o")
+    ids, params = ["Q2", "Q1"], {"country": "Q30"}
+    cache = get_cache()
+    lease = _lease_key([template.name, sorted(params.items()), sorted(ids)])
+    assert cache.acquire_lease(lease, 60)
+
+    def holder():   # el otro "proceso" guarda las filas y suelta el lease
+        cache.put_many({template.key(x, params): {"rows": [{"o": {"value": WD + x}}]} for x in ids})
+        cache.release_lease(lease)
+
+    threading.Timer(0.2, holder).start()
+    rows = template.fetch(ids, **params)
+    assert calls == []
+    assert rows == {x: [{"o": {"value": WD + x}}] for x in ids}
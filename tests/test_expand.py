@@ -0,0 +1,73 @@
+# tests/test_expand.py
+import random
+
+import pytest
+
+from kg.wd import expand
+from kg.wd.expand import KHopExpander
+
+# Q1 y Q2 (sujetos) comparten Q10; Q5 es un hub (P31) con muchos vecinos
+GRAPH = {
+    "Q1": [("P31", "Q5"), ("P69", "Q10"), ("P19", "Q11"), ("P26", "Q2")],
+    "Q2": [("P31", "Q5"), ("P69", "Q10"), ("P19", "Q12")],
+    "Q5": [("P279", f"Q{900 + i}") for i in range(50)],
+    "Q10": [("P131", "Q20"), ("P17", "Q30"), ("P31", "Q3918")],
+    "Q11": [("P131", "Q21")],
+    "Q12": [("P131", "Q22"), ("P131", "Q23"), ("P131", "Q24"), ("P131", "Q25")],
+    "Q20": [("P131", "Q40")],
+}
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    calls: list[list[str]] = []
+
+    def truthy_edges_batch(qids, batch_size=50):
+        calls.append(list(qids))
+        rng = random.Random(len(calls))   # el orden de las aristas de WDQS no está garantizado
+        return {q: rng.sample(GRAPH.get(q, []), len(GRAPH.get(q, []))) for q in qids}
+
+    monkeypatch.setattr(expand, "truthy_edges_batch", truthy_edges_batch)
+    return calls
+
+
+def test_two_hops_skip_hubs_and_share_fetches(fetched):
+    ex = KHopExpander(hops=2)
+    out = ex.expand(["Q1", "Q2"])
+    # el primer salto emite todo (también P31), pero no sigue a Q5
+    assert [t for t in out["Q1"] if t[0] == "Q1"] == [
+        ("Q1", "P19", "Q11"), ("Q1", "P26", "Q2"), ("Q1", "P31", "Q5"), ("Q1", "P69", "Q10")]
+    assert ("Q10", "P131", "Q20") in out["Q1"]
+    assert not any(t[0] == "Q5" for t in out["Q1"])
+    assert ("Q10", "P17", "Q30") not in out["Q1"] and ("Q10", "P31", "Q3918") not in out["Q1"]
+    # una tanda por nivel; Q10 se consulta una sola vez y Q2 (ya visitado como sujeto) no se repite
+    assert len(fetched) == 2
+    assert sorted(fetched[1]) == ["Q10", "Q11", "Q12"]
+
+
+def test_result_does_not_depend_on_subject_order(fetched):
+    a = KHopExpander(hops=3, max_nodes_per_hop=2, max_edges_per_hop=4).expand(["Q1", "Q2"])
+    b = KHopExpander(hops=3, max_nodes_per_hop=2, max_edges_per_hop=4).expand(["Q2", "Q1"])
+    assert a == b
+    # y tampoco de lo que otro sujeto dejó ya en el conjunto compartido
+    ex = KHopExpander(hops=3, max_nodes_per_hop=2, max_edges_per_hop=4)
+    ex.expand(["Q2"])
+    assert ex.expand(["Q1"])["Q1"] == a["Q1"]
+
+
+def test_caps_per_hop(fetched):
+    out = KHopExpander(hops=2, max_nodes_per_hop=1, max_edges_per_hop=3).expand(["Q2"])["Q2"]
+    hop1 = [t for t in out if t[0] == "Q2"]
+    assert hop1 == [("Q2", "P19", "Q12"), ("Q2", "P31", "Q5"), ("Q2", "P69", "Q10")]
+    # un solo nodo nuevo (Q12) pasa al segundo salto, y de él salen como mucho 3 aristas
+    assert out[3:] == [("Q12", "P131", "Q22"), ("Q12", "P131", "Q23"), ("Q12", "P131", "Q24")]
+
+
+def test_max_degree_and_seeds(fetched):
+    ex = KHopExpander(hops=2, max_degree=3)
+    out = ex.expand(["Q2"], seeds={"Q2": [("P19", "Q12")]})["Q2"]
+    # la semilla fija el primer salto (sin consultar Q2) y Q12, con 4 aristas, no se expande
+    assert out == [("Q2", "P19", "Q12")]
+    assert fetched == [["Q12"]]
+    with pytest.raises(ValueError):
+        KHopExpander(hops=0)
@@ -0,0 +1,48 @@
+# tests/test_label_store.py
+import re
+import sqlite3
+import time
+
+from kg.wd import label_store
+from kg.wd.label_store import LabelStore
+
+
+def _fake_sparql(calls):
+    def run(query, **kw):
+        ids = re.findall(r"wd:(Q\d+)", query)
+        calls.append(ids)
+        return {"results": {"bindings": [
+            {"x": {"value": f"http://www.wikidata.org/entity/{x}"},
+             "l": {"value": f"{x} v{len(calls)}", "xml:lang": "es"}} for x in ids]}}
+    return run
+
+
+def test_ttl_refetches_old_labels(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(label_store, "run_sparql", _fake_sparql(calls))
+    store = LabelStore(tmp_path / "l.sqlite", ttl_s=0.2)
+    assert store.resolve(["Q1"], "es") == {"Q1": "Q1 v1"}
+    assert store.resolve(["Q1"], "es") == {"Q1": "Q1 v1"}
+    assert len(calls) == 1
+    time.sleep(0.3)
+    assert store.missing(["Q1"], "es") == ["Q1"]
+    assert store.resolve(["Q1"], "es") == {"Q1": "Q1 v2"}
+    # otro proceso sin TTL ve la fila reemplazada
+    assert LabelStore(tmp_path / "l.sqlite").resolve(["Q1"], "es") == {"Q1": "Q1 v2"}
+
+
+def test_old_schema_is_migrated_and_clear(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(label_store, "run_sparql", _fake_sparql(calls))
+    path = tmp_path / "l.sqlite"
+    c = sqlite3.connect(path)
+    c.execute("CREATE TABLE labels (id TEXT NOT NULL, lang TEXT NOT NULL, label TEXT, updated REAL NOT NULL, "
+              "PRIMARY KEY (id, lang)) WITHOUT ROWID")
+    c.execute("INSERT INTO labels VALUES ('Q1', 'es', 'viejo', ?)", (time.time(),))
+    c.commit()
+    c.close()
+    store = LabelStore(path, ttl_s=3600)
+    assert store.resolve(["Q1"], "es") == {"Q1": "viejo"}
+    store.clear()
+    assert store.resolve(["Q1"], "es") == {"Q1": "Q1 v1"}
+    assert calls == [["Q1"]]
@@ -0,0 +1,67 @@
+# tests/test_manifest.py
+import json
+import pickle
+import time
+
+from kg import metrics
+from kg.pipeline.manifest import OK, RunManifest
+
+
+def test_records_from_another_process_are_applied(tmp_path):
+    out = tmp_path / "Q1.ttl"
+    out.write_text("", encoding="utf-8")
+    manifest = RunManifest(tmp_path / "manifest.json")
+    manifest.record("Q1", OK, h="h1", outputs=[out])
+
+    # lo que viaja al proceso del pool y lo que vuelve se puede serializar con pickle
+    view = pickle.loads(pickle.dumps(manifest.view(["Q1", "Q2"])))
+    worker = RunManifest(None, subjects=view)
+    assert worker.is_current("Q1", "h1")
+    worker.record("Q2", OK, h="h2", outputs=[out])
+    worker.flush()                           # sin archivo: no escribe nada
+    assert worker.path is None and "Q2" not in manifest.subjects
+
+    manifest.apply(pickle.loads(pickle.dumps(worker.changed)))
+    manifest.flush()
+    reloaded = RunManifest(tmp_path / "manifest.json")
+    assert reloaded.is_current("Q1", "h1") and reloaded.is_current("Q2", "h2")
+
+
+def test_metrics_merge():
+    worker = metrics.Registry()
+    worker.inc("subjects_total", 2, status="ok")
+    worker.observe("stage_seconds", 0.3, stage="filter")
+    parent = metrics.Registry()
+    parent.inc("subjects_total", 1, status="ok")
+    parent.observe("stage_seconds", 1.0, stage="filter")
+    parent.merge(pickle.loads(pickle.dumps(worker.dump())))
+    snap = parent.snapshot()
+    assert snap["counters"]["subjects_total"] == [{"labels": {"status": "ok"}, "value": 3}]
+    h = snap["histograms"]["stage_seconds"][0]
+    assert h["count"] == 2 and h["sum"] == 1.3 and h["max"] == 1.0
+
+
+def test_resume_reads_journal(tmp_path):
+    out = tmp_path / "Q1.ttl"
+    out.write_text("", encoding="utf-8")
+    manifest = RunManifest(tmp_path / "manifest.json", flush_every=1)
+    manifest.record("Q1", OK, h="h1", outputs=[out])
+    manifest.flush()
+    manifest.record("Q2", OK, h="h2", outputs=[out])   # corrida interrumpida: solo en el diario
+    assert (tmp_path / "manifest.json.journal").exists()
+
+    resumed = RunManifest(tmp_path / "manifest.json")
+    assert resumed.is_current("Q1", "h1") and resumed.is_current("Q2", "h2")
+    assert not (tmp_path / "manifest.json.journal").exists()   # compactado al cargar
+    data = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert set(data["subjects"]) == {"Q1", "Q2"}
+
+
+def test_record_cost_does_not_grow_with_manifest(tmp_path):
+    manifest = RunManifest(tmp_path / "manifest.json")
+    t0 = time.perf_counter()
+    for i in range(100_000):
+        manifest.record(f"Q{i}", OK, h="h")
+    assert time.perf_counter() - t0 < 10
+    manifest.flush()
+    assert len(RunManifest(tmp_path / "manifest.json").subjects) == 100_000
@@ -0,0 +1,63 @@
+# tests/test_places.py
+import re
+import sqlite3
+import time
+
+import pytest
+
+from kg.wd import places
+from kg.wd.places import PlaceIndex
+
+WD, WDT = "http://www.wikidata.org/entity/", "http://www.wikidata.org/prop/direct/"
+
+
+@pytest.fixture
+def world(monkeypatch):
+    """Q1 (persona) --P131--> Q10 --P131--> Q20 --P17--> Q30; cuenta las entidades consultadas."""
+    facts = {1: [(131, 10)], 10: [(131, 20)], 20: [(17, 30)]}
+    asked: list[int] = []
+
+    def run(query, **kw):
+        xs = [int(x) for x in re.findall(r"wd:Q(\d+)", query)]
+        asked.extend(xs)
+        return {"results": {"bindings": [
+            {"x": {"value": f"{WD}Q{x}"}, "p": {"value": f"{WDT}P{p}"}, "y": {"value": f"{WD}Q{y}"}}
+            for x in xs for p, y in facts.get(x, [])]}}
+
+    monkeypatch.setattr(places, "run_sparql", run)
+    return facts, asked
+
+
+def test_ttl_refetches_old_facts(tmp_path, world):
+    facts, asked = world
+    path = tmp_path / "p.sqlite"
+    assert PlaceIndex(path, ttl_s=0.3).located_in(["Q1"], "Q30", (131,)) == {"Q1"}
+    n = len(asked)
+    assert PlaceIndex(path, ttl_s=0.3).located_in(["Q1"], "Q30", (131,)) == {"Q1"}
+    assert len(asked) == n
+    time.sleep(0.4)
+    facts[20] = [(17, 96)]   # Q20 cambió de país
+    assert PlaceIndex(path, ttl_s=0.3).located_in(["Q1"], "Q30", (131,)) == set()
+    assert len(asked) > n
+
+
+def test_old_schema_is_migrated_and_clear(tmp_path, world):
+    facts, asked = world
+    path = tmp_path / "p.sqlite"
+    c = sqlite3.connect(path)
+    c.executescript("""
+    CREATE TABLE fetched (qid INTEGER PRIMARY KEY, updated REAL NOT NULL);
+    CREATE TABLE inside (country INTEGER NOT NULL, qid INTEGER NOT NULL, value INTEGER NOT NULL,
+                         PRIMARY KEY (country, qid)) WITHOUT ROWID;
+    INSERT INTO inside VALUES (30, 10, 1);
+    """)
+    c.commit()
+    c.close()
+    # sin TTL se usa el veredicto viejo; con TTL, al no tener fecha, cuenta como vencido
+    assert PlaceIndex(path).inside_many([10], 30) == {10: True}
+    assert asked == []
+    assert PlaceIndex(path, ttl_s=3600).inside_many([10], 30) == {10: True}
+    assert asked
+    index = PlaceIndex(path)
+    index.clear("Q30")
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM inside").fetchone()[0] == 0
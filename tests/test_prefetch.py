@@ -0,0 +1,86 @@
+# tests/test_prefetch.py
+import re
+
+import pytest
+
+from kg.pipeline import prefetch
+from kg.wd import batching, entity_cache, label_store, utils
+from kg.wd.cache import SQLiteCache
+from kg.wd.label_store import LabelStore
+from kg.wd.truthy import truthy_edges_batch
+from kg.wd.verdicts import PASS_DIRECT, VerdictStore
+
+WD, WDT = "http://www.wikidata.org/entity/", "http://www.wikidata.org/prop/direct/"
+
+
+@pytest.fixture
+def world(tmp_path, monkeypatch):
+    """Sujetos Q1..Q4: Qi --P19--> Q10i y todos --P27--> Q200 (el único objeto en Q30)."""
+    monkeypatch.setattr(utils, "_CACHE", SQLiteCache(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(batching, "_BATCHERS", {})
+    verdicts, labels = VerdictStore(tmp_path / "v.sqlite"), LabelStore(tmp_path / "l.sqlite")
+    monkeypatch.setattr(prefetch, "get_verdict_store", lambda: verdicts)
+    monkeypatch.setattr(prefetch, "get_label_store", lambda: labels)
+
+    def truthy_sparql(query, **kw):
+        return {"results": {"bindings": [
+            {"s": {"value": WD + q}, "p": {"value": WDT + p}, "o": {"value": WD + o}}
+            for q in re.findall(r"wd:(Q\d+)", query) for p, o in (("P19", f"Q10{q[1:]}"), ("P27", "Q200"))]}}
+
+    def label_sparql(query, **kw):
+        return {"results": {"bindings": [
+            {"x": {"value": WD + x}, "l": {"value": f"etiqueta {x}", "xml:lang": "es"}}
+            for x in re.findall(r"wd:(Q\d+)", query)]}}
+
+    monkeypatch.setattr(entity_cache, "run_sparql", truthy_sparql)
+    monkeypatch.setattr(label_store, "run_sparql", label_sparql)
+    fail = set()
+
+    def filter_by_countries(objs, countries, batch_p1=400):
+        if fail & set(objs):
+            raise RuntimeError("timeout")
+        for c in countries:
+            verdicts.put_many([o for o in objs if o == "Q200"], c, True, PASS_DIRECT)
+            verdicts.put_many([o for o in objs if o != "Q200"], c, False, PASS_DIRECT)
+        return {c: {o for o in objs if o == "Q200"} for c in countries}
+
+    monkeypatch.setattr(prefetch, "filter_by_countries", filter_by_countries)
+    # ya guardado antes del prefetch: aristas de Q1, veredicto de Q101 y etiqueta de Q1
+    truthy_edges_batch(["Q1"])
+    verdicts.put_many(["Q101"], "Q30", False, PASS_DIRECT)
+    labels.prefetch(["Q1"], "es")
+    return fail
+
+
+def _counts(report, layer):
+    r = report[layer]
+    return r["needed"], r["before"], r["projected"], r["achieved"]
+
+
+def test_coverage_before_projected_achieved(world):
+    report = prefetch.prefetch_subjects(["Q1", "Q2", "Q3", "Q4", "Q2"], ["Q30"], "es", window=2, progress=False)
+    assert _counts(report, "truthy") == (4, 1, 4, 4)
+    # objetos: Q101..Q104 y Q200, un país
+    assert _counts(report, "verdicts") == (5, 1, 5, 5)
+    # etiquetas: los sujetos y Q200 (el único objeto que queda en el país)
+    assert _counts(report, "labels") == (5, 1, 5, 5)
+    assert report["truthy"]["before_pct"] == 25.0
+    assert report["windows"] == 2 and report["offline_ready"]
+
+
+def test_failed_window_shows_in_achieved(world):
+    world.add("Q103")
+    report = prefetch.prefetch_subjects(["Q1", "Q2", "Q3", "Q4"], ["Q30"], "es", window=2, progress=False)
+    # la proyección cuenta todos los objetos descubiertos; lo logrado, solo lo que quedó guardado
+    needed, before, projected, achieved = _counts(report, "verdicts")
+    assert (needed, projected) == (5, 5)
+    assert achieved == 3   # Q101, Q102 y Q200 de la primera ventana
+    assert not report["offline_ready"]
+
+
+def test_skipped_windows_are_not_projected(world):
+    report = prefetch.prefetch_subjects(["Q1", "Q2", "Q3"], ["Q30"], "es", window=1,
+                                        max_minutes=1e-9, progress=False)
+    assert report["windows_skipped"] == 3
+    assert _counts(report, "truthy") == (3, 1, 1, 1)
+    assert not report["offline_ready"]
@@ -0,0 +1,8 @@
+# tests/test_run_wd.py
+from kg.pipeline.run_wd import _unique_countries
+
+
+def test_duplicate_countries_keep_first_occurrence_order():
+    a, b = ("usa", "Q30", "usa"), ("germany", "Q183", "germany")
+    assert _unique_countries([a, b, ("Q30", "Q30", "q30")]) == [a, b]
+    assert _unique_countries([b, a, b]) == [b, a]
@@ -0,0 +1,84 @@
+# tests/test_sample_subjects.py
+import csv
+import json
+import re
+
+import pytest
+
+from kg.pipeline import sample_subjects as ss
+
+ENT = "http://www.wikidata.org/entity/"
+CLASSES = {"politicos": {"ocupaciones": ["Q82955"]}, "artistas": {"ocupaciones": ["Q483501"]}}
+
+
+def _fake_pages(fail_on: str | None = None):
+    people = {"Q82955": [f"Q{100 + i}" for i in range(20)], "Q483501": [f"Q{200 + i}" for i in range(20)]}
+
+    def fetch(occ, after, country_qid, wiki_lang, size, timeout_s, retries):
+        if occ == fail_on:
+            raise KeyboardInterrupt   # corrida interrumpida a mitad de la clase
+        iris = [ENT + q for q in people[occ] if ENT + q > after]
+        return [(iri, iri.rsplit("/", 1)[-1], f"T{iri[-3:]}") for iri in iris[:size]]
+    return fetch
+
+
+def _rows(path):
+    with path.open(encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def _done_classes(out):
+    data = json.loads((out.parent / (out.name + ".ckpt.json")).read_text(encoding="utf-8"))
+    return {k for k, v in data["classes"].items() if v["done"]}
+
+
+def test_restart_ignores_interrupted_checkpoint(tmp_path, monkeypatch):
+    out = tmp_path / "subjects.csv"
+    monkeypatch.setattr(ss, "load_classes", lambda: CLASSES)
+    monkeypatch.setattr(ss, "active_dump", lambda: None)
+
+    # 1) corrida interrumpida: "politicos" queda completa en el checkpoint, "artistas" no
+    monkeypatch.setattr(ss, "_fetch_page", _fake_pages(fail_on="Q483501"))
+    with pytest.raises(KeyboardInterrupt):
+        ss.sample_per_class("Q30", out_csv=out, limit_per_class=5, page_size=5, workers=1)
+    assert _done_classes(out) == {"politicos"}
+
+    # 2) --restart: CSV y checkpoint desde cero, todas las clases completas
+    monkeypatch.setattr(ss, "_fetch_page", _fake_pages())
+    counts = ss.sample_per_class("Q30", out_csv=out, limit_per_class=5, page_size=5, workers=1, resume=False)
+    assert counts == {"politicos": 5, "artistas": 5}
+    rows = _rows(out)
+    assert [r["qid"] for r in rows if r["clase"] == "politicos"] == [f"Q{100 + i}" for i in range(5)]
+    assert [r["qid"] for r in rows if r["clase"] == "artistas"] == [f"Q{200 + i}" for i in range(5)]
+    assert not (tmp_path / "subjects.csv.ckpt.json").exists()
+
+
+def test_keyset_pages_follow_string_order(tmp_path, monkeypatch):
+    # Q1..Q25: en orden de texto Q10 va antes que Q9 (el cursor es STR(?person))
+    people = sorted(ENT + f"Q{i}" for i in range(1, 26))
+    seen_queries = []
+
+    def run_sparql(query, timeout_s=130, retries=6):
+        seen_queries.append(query)
+        after = re.search(r'STR\(\?person\) > "([^"]*)"', query).group(1)
+        limit = int(re.search(r"LIMIT (\d+)", query).group(1))
+        page = [p for p in people if p > after][:limit]
+        return {"results": {"bindings": [{"person": {"value": p}} for p in page]}}
+
+    monkeypatch.setattr(ss, "load_classes", lambda: {"politicos": {"ocupaciones": ["Q82955"]}})
+    monkeypatch.setattr(ss, "active_dump", lambda: None)
+    monkeypatch.setattr(ss, "run_sparql", run_sparql)
+    out = tmp_path / "subjects.csv"
+    counts = ss.sample_per_class("Q30", out_csv=out, limit_per_class=25, page_size=4, workers=1)
+    assert counts == {"politicos": 25}
+    qids = [r["qid"] for r in _rows(out)]
+    assert len(set(qids)) == 25
+    assert qids.index("Q10") < qids.index("Q9")          # sin saltos ni repetidos en el borde Q9/Q10
+    assert all("ORDER BY STR(?person)" in q for q in seen_queries)
+
+
+def test_positional_args_keep_baseline_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(TypeError):
+        ss.sample_per_class("Q30", "en")                  # sin out_csv no escribe un CSV llamado "en"
+    assert not (tmp_path / "en").exists()
@@ -0,0 +1,173 @@
+# tests/test_throttle.py
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from kg.wd import throttle
+from kg.wd.client import SparqlClient
+from kg.wd.throttle import (FATAL, THROTTLED, TIMEOUT, TRANSIENT, SparqlTimeout, ThrottlePolicy,
+                            classify, retry_after_s)
+
+
+def _http_error(code: int, retry_after: str | None = None, body: bytes = b"") -> requests.HTTPError:
+    resp = requests.Response()
+    resp.status_code = code
+    resp._content = body
+    if retry_after is not None:
+        resp.headers["Retry-After"] = retry_after
+    return requests.HTTPError(f"{code}", response=resp)
+
+
+class FakeEndpoint:
+    """fn para ThrottlePolicy.call: lanza los errores dados en orden y después responde."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"ok": True}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # el backoff entre reintentos no se duerme (las pausas de Retry-After y breaker sí corren)
+    monkeypatch.setattr(throttle.random, "uniform", lambda a, b: 0.0)
+    sleeps = []
+    real_sleep = time.sleep
+    monkeypatch.setattr(throttle.time, "sleep", lambda s: sleeps.append(s) or real_sleep(min(s, 0.01)))
+    return sleeps
+
+
+def test_classify():
+    assert classify(_http_error(429)) == THROTTLED
+    assert classify(_http_error(503)) == THROTTLED
+    assert classify(_http_error(502)) == TRANSIENT
+    assert classify(_http_error(400)) == FATAL
+    assert classify(_http_error(404)) == FATAL
+    assert classify(_http_error(504)) == TIMEOUT
+    assert classify(_http_error(500, body=b"java.util.concurrent.TimeoutException")) == TIMEOUT
+    assert classify(requests.Timeout()) == TIMEOUT
+    assert classify(requests.ConnectionError()) == TRANSIENT
+    assert classify(requests.ReadTimeout()) == TIMEOUT
+    assert classify(ReadTimeoutError(None, "/sparql", "Read timed out.")) == TIMEOUT
+    assert classify(requests.ConnectionError(ReadTimeoutError(None, "/sparql", "Read timed out."))) == TIMEOUT
+    assert classify(ValueError("bug")) == FATAL
+    assert retry_after_s(_http_error(429, "3")) == 3.0
+    assert retry_after_s(_http_error(429)) is None
+
+
+class _StallingHandler(BaseHTTPRequestHandler):
+    """Manda las cabeceras y el comienzo del JSON, y después se queda callado."""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/sparql-results+json")
+        self.send_header("Content-Length", "1000")
+        self.end_headers()
+        self.wfile.write(b'{"head": {"vars": ["s"]}, "results": {"bindings": [')
+        self.wfile.flush()
+        threading.Event().wait(1.0)   # no time.sleep: no_backoff lo acorta
+
+    def log_message(self, *args):
+        pass
+
+
+def test_read_timeout_while_streaming_body_is_timeout():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StallingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = SparqlClient(endpoint=f"http://127.0.0.1:{server.server_port}/sparql")
+        with pytest.raises(Exception) as info:
+            client.query_json("SELECT * WHERE {}", timeout=0.2)
+        assert classify(info.value) == TIMEOUT
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_429_cuts_rate_and_honours_retry_after():
+    policy = ThrottlePolicy(start_rps=8, cut_every_s=0)
+    fn = FakeEndpoint(_http_error(429, "0.3"))
+    t0 = time.monotonic()
+    assert policy.call(fn) == {"ok": True}
+    assert fn.calls == 2
+    assert time.monotonic() - t0 >= 0.3          # el reintento esperó el Retry-After
+    assert policy.rate < 8 * 0.5 + 0.5           # recortado a la mitad (+ un aumento aditivo)
+
+
+def test_rate_cuts_are_spaced_and_bounded():
+    policy = ThrottlePolicy(start_rps=8, min_rps=1, cut_every_s=60)
+    policy.failure(THROTTLED)
+    policy.failure(THROTTLED)                    # dentro de cut_every_s: no vuelve a recortar
+    assert policy.rate == 4
+    policy.cut_every_s = 0
+    policy._cut_at = 0.0
+    policy.failure(TIMEOUT)
+    assert policy.rate == pytest.approx(3.2)     # un timeout recorta menos (×0.8)
+    for _ in range(10):
+        policy._cut_at = 0.0
+        policy.failure(THROTTLED)
+    assert policy.rate == 1                      # nunca por debajo de min_rps
+
+
+def test_fatal_errors_are_not_retried(no_backoff):
+    policy = ThrottlePolicy(start_rps=100)
+    fn = FakeEndpoint(_http_error(400))
+    with pytest.raises(requests.HTTPError):
+        policy.call(fn, retries=5)
+    assert fn.calls == 1
+    assert no_backoff == []
+    assert policy.stats()["consecutive_failures"] == 0
+
+
+def test_transient_errors_retry_until_exhausted():
+    policy = ThrottlePolicy(start_rps=100, breaker_after=100)
+    fn = FakeEndpoint(*[_http_error(500) for _ in range(3)])
+    with pytest.raises(requests.HTTPError):
+        policy.call(fn, retries=3)
+    assert fn.calls == 3
+    fn = FakeEndpoint(_http_error(502), requests.ConnectionError())
+    assert policy.call(fn, retries=3) == {"ok": True}
+    assert fn.calls == 3
+
+
+def test_timeouts():
+    policy = ThrottlePolicy(start_rps=10, cut_every_s=0)
+    fn = FakeEndpoint(requests.Timeout("read timeout"))
+    with pytest.raises(SparqlTimeout):
+        policy.call(fn, retry_timeouts=False)    # el llamador parte el lote
+    assert fn.calls == 1
+    assert policy.rate == pytest.approx(8.0)
+    fn = FakeEndpoint(requests.Timeout("read timeout"))
+    assert policy.call(fn, retry_timeouts=True) == {"ok": True}
+    assert fn.calls == 2
+
+
+def test_breaker_opens_probes_and_closes():
+    policy = ThrottlePolicy(start_rps=100, breaker_after=2, breaker_s=0.2, breaker_max_s=1.0)
+    policy.failure(TRANSIENT)
+    assert policy.state == "closed"
+    policy.failure(TRANSIENT)
+    assert policy.state == "open"
+
+    t0 = time.monotonic()
+    assert policy._wait_turn() is True           # tras breaker_s pasa una sola consulta de prueba
+    assert time.monotonic() - t0 >= 0.2
+    assert policy.state == "half-open"
+    policy.failure(TRANSIENT)                    # la prueba falla: se reabre con el doble de espera
+    policy._probing = False
+    assert policy.state == "open" and policy._open_s == pytest.approx(0.4)
+
+    fn = FakeEndpoint()
+    assert policy.call(fn) == {"ok": True}       # la prueba responde: se cierra
+    assert policy.state == "closed"
+    assert policy._open_s == pytest.approx(0.2)
+    assert policy.stats()["consecutive_failures"] == 0
@@ -0,0 +1,67 @@
+# tests/test_tiles.py
+import gzip
+import json
+
+import numpy as np
+
+from kg.viz.plot_graph import GraphData
+from kg.viz.tiles import _cells, assign_levels, export_tiles
+
+
+def _graph(n=300):
+    # estrella Q1 + cadena: grados distintos y muchas celdas
+    edges = [("Q1", "P1", f"Q{i}") for i in range(2, n)]
+    edges += [(f"Q{i}", "P2", f"Q{i + 1}") for i in range(2, n - 1)]
+    return GraphData(edges, {"Q1": "centro"})
+
+
+def _read_tiles(out):
+    tiles = {}
+    for p in sorted((out / "tiles").rglob("*.json.gz")):
+        z = int(p.parent.name)
+        x, y = map(int, p.name.removesuffix(".json.gz").split("_"))
+        tiles[(z, x, y)] = json.loads(gzip.decompress(p.read_bytes()))
+    return tiles
+
+
+def test_cells_cover_bounds():
+    pos = np.array([[-1.0, -1.0], [1.0, 1.0], [0.0, -1.0], [-0.01, 0.99]])
+    assert _cells(pos, 0).tolist() == [0, 0, 0, 0]
+    assert _cells(pos, 1).tolist() == [0, 3, 1, 2]
+
+
+def test_levels_take_top_degree_per_cell():
+    rng = np.random.default_rng(0)
+    pos = rng.uniform(-1, 1, size=(500, 2))
+    deg = rng.integers(1, 100, size=500)
+    level = assign_levels(pos, deg, per_tile=10, max_level=3)
+    assert set(level.tolist()) <= {0, 1, 2, 3}
+    assert (level == 0).sum() == 10
+    assert deg[level == 0].min() >= deg[level > 0].max()
+    for z in range(3):
+        ix = np.flatnonzero(level == z)
+        assert np.bincount(_cells(pos[ix], z)).max() <= 10
+
+
+def test_export_places_each_node_once(tmp_path):
+    data = _graph()
+    m = export_tiles(data, tmp_path / "out", per_tile=20, max_level=3, layout="spring", iterations=5)
+    tiles = _read_tiles(tmp_path / "out")
+    nodes = [row[0] for t in tiles.values() for row in t["nodes"]]
+    assert sorted(nodes) == sorted(data.nodes)
+    assert sum(len(t["edges"]) for t in tiles.values()) == len(data.edges) == m["stats"]["edges"]
+    for (z, _, _), t in tiles.items():
+        if z < 3:
+            assert len(t["nodes"]) <= 20
+    assert {(int(z), x, y) for z, rows in m["tiles"].items() for x, y, _, _ in rows} == set(tiles)
+    assert tiles[(0, 0, 0)]["nodes"][0][0] == "Q1"   # el de mayor grado va primero en el nivel 0
+    assert (tmp_path / "out" / "index.html").exists()
+
+
+def test_export_is_reproducible(tmp_path):
+    data = _graph(120)
+    for name in ("a", "b"):
+        export_tiles(data, tmp_path / name, per_tile=15, max_level=2, layout="spring", iterations=5)
+    a = {p.relative_to(tmp_path / "a"): p.read_bytes() for p in (tmp_path / "a" / "tiles").rglob("*.gz")}
+    b = {p.relative_to(tmp_path / "b"): p.read_bytes() for p in (tmp_path / "b" / "tiles").rglob("*.gz")}
+    assert a == b
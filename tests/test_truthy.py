@@ -0,0 +1,49 @@
+# tests/test_truthy.py
+import re
+
+import pytest
+
+from kg.wd import batching, entity_cache
+from kg.wd.truthy import truthy_edges_batch
+
+WD, WDT = "http://www.wikidata.org/entity/", "http://www.wikidata.org/prop/direct/"
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    """WDQS falso: 10 aristas por sujeto (salvo los que terminan en 0, sin aristas)."""
+    batches: list[list[str]] = []
+
+    def run_sparql(query, **kw):
+        qids = re.findall(r"wd:(Q\d+)", query)
+        batches.append(qids)
+        return {"results": {"bindings": [
+            {"s": {"type": "uri", "value": WD + q}, "p": {"type": "uri", "value": f"{WDT}P{i}"},
+             "o": {"type": "uri", "value": f"{WD}Q{i}"}}
+            for q in qids if not q.endswith("0") for i in range(10)]}}
+
+    monkeypatch.setattr(entity_cache, "run_sparql", run_sparql)
+    monkeypatch.setattr(batching, "_BATCHERS", {})
+    return batches
+
+
+def test_batches_follow_rows_per_subject(endpoint):
+    qids = [f"Q7{i:03d}" for i in range(1, 21)]
+    out = truthy_edges_batch(qids, max_rows=40, batch_size=8, max_batch=8)
+    # primer lote con el tamaño inicial; después ~10 filas/sujeto → 4 sujetos por lote
+    assert [len(b) for b in endpoint] == [8, 4, 4, 4]
+    assert [q for b in endpoint for q in b] == qids
+    assert list(out) == qids
+    assert out["Q7001"] == [(f"P{i}", f"Q{i}") for i in range(10)]
+    assert out["Q7010"] == []
+
+
+def test_merges_duplicates_and_skips_invalid_ids(endpoint):
+    out = truthy_edges_batch(["Q8001", "Q8001", "P31", "", "Q8002"], batch_size=50)
+    assert endpoint == [["Q8001", "Q8002"]]
+    assert list(out) == ["Q8001", "Q8002"]
+    assert len(out["Q8001"]) == len(out["Q8002"]) == 10
+    # los sujetos ya vistos salen del caché por entidad: solo Q8003 viaja
+    out = truthy_edges_batch(["Q8002", "Q8003"], batch_size=50)
+    assert endpoint[1:] == [["Q8003"]]
+    assert len(out["Q8002"]) == len(out["Q8003"]) == 10
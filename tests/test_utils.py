@@ -0,0 +1,148 @@
+# tests/test_utils.py
+import threading
+import time
+
+import pytest
+
+from kg.wd import utils
+from kg.wd.throttle import SparqlTimeout, ThrottlePolicy
+
+
+def _slow_fetch(calls, outcome):
+    def fetch(query, key, cache, retries, retry_timeouts, kind):
+        calls.append(query)
+        time.sleep(0.2)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+    return fetch
+
+
+def _run_concurrently(n, query, **kw):
+    results = [None] * n
+
+    def run(i):
+        try:
+            results[i] = utils.run_sparql(query, use_cache=False, **kw)
+        except BaseException as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_followers_share_leader_result(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "_fetch", _slow_fetch(calls, {"ok": 1}))
+    results = _run_concurrently(3, "SELECT * WHERE { ?s ?p ?o } # share")
+    assert calls == ["SELECT * WHERE { ?s ?p ?o } # share"]
+    assert results == [{"ok": 1}] * 3
+
+
+def test_followers_get_leader_error(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "_fetch", _slow_fetch(calls, RuntimeError("400 Bad Request")))
+    results = _run_concurrently(3, "SELECT * WHERE { ?s ?p ?o } # error")
+    assert len(calls) == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert not utils._FLIGHTS
+
+
+def test_follower_retrying_timeouts_runs_again(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "_fetch", _slow_fetch(calls, SparqlTimeout("timeout")))
+    query = "SELECT * WHERE { ?s ?p ?o } # timeout"
+    leader = threading.Thread(target=lambda: pytest.raises(SparqlTimeout, utils.run_sparql, query,
+                                                           use_cache=False, retry_timeouts=False))
+    leader.start()
+    time.sleep(0.05)
+    # el líder no reintenta timeouts; este llamador sí, así que consulta por su cuenta
+    with pytest.raises(SparqlTimeout):
+        utils.run_sparql(query, use_cache=False, retry_timeouts=True)
+    leader.join()
+    assert len(calls) == 2
+
+
+class _RacedCache:
+    """Caché cuyo dueño anterior guardó la respuesta justo antes de soltar el lease."""
+
+    def __init__(self):
+        self.released = []
+
+    def acquire_lease(self, key, ttl_s):
+        return True
+
+    def peek(self, key):
+        return {"ok": 2}
+
+    def release_lease(self, key):
+        self.released.append(key)
+
+
+def test_leased_call_checks_cache_before_fetching(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "_fetch", _slow_fetch(calls, {"ok": 1}))
+    cache = _RacedCache()
+    assert utils._run_leased("q", "k", cache, 1, True, "test") == {"ok": 2}
+    assert calls == [] and cache.released == ["k"]
+
+
+class _CountingClient:
+    """Cliente falso que mide cuántas requests hay en vuelo a la vez."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.inflight = self.peak = self.calls = 0
+
+    def _request(self):
+        with self.lock:
+            self.calls += 1
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.inflight -= 1
+
+    def query_json(self, query, timeout=120):
+        self._request()
+        return {"results": {"bindings": []}}, 2
+
+    def query_raw(self, query, timeout=120):
+        self._request()
+        return b'{"results": {"bindings": []}}'
+
+
+def test_budget_is_shared_by_all_threads(monkeypatch):
+    client = _CountingClient()
+    monkeypatch.setattr(utils, "get_client", lambda: client)
+    monkeypatch.setattr(utils, "_BUDGET", ThrottlePolicy(max_inflight=2, start_rps=1000))
+    threads = [threading.Thread(target=utils.run_sparql, args=(f"SELECT * WHERE {{}} # budget {i}",),
+                                kwargs={"use_cache": False}) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert client.calls == 8
+    assert client.peak == 2
+
+
+def test_budget_rate_ceiling(monkeypatch):
+    client = _CountingClient(delay=0)
+    monkeypatch.setattr(utils, "get_client", lambda: client)
+    budget = utils.configure_budget(max_inflight=5, max_rps=20)
+    try:
+        assert utils.get_budget() is budget
+        t0 = time.monotonic()
+        for i in range(11):
+            utils.run_sparql(f"SELECT * WHERE {{}} # rps {i}", use_cache=False)
+        # 11 turnos a 20/s: al menos 10 intervalos de 50 ms entre el primero y el último
+        assert time.monotonic() - t0 >= 0.5
+        assert budget.rate <= 20
+    finally:
+        utils.configure_budget()
@@ -0,0 +1,27 @@
+# tests/test_validate.py
+from kg.pipeline.validate import DEFAULT_SHAPES, validate_paths
+
+WD, WDT = "http://www.wikidata.org/entity/", "http://www.wikidata.org/prop/direct/"
+
+
+def _person(path, qid, country):
+    path.write_text(f"<{WD}{qid}> <{WDT}P31> <{WD}Q5> .\n<{WD}{qid}> <{WDT}P27> <{WD}{country}> .\n",
+                    encoding="utf-8")
+    return path
+
+
+def test_shapes_follow_country(tmp_path):
+    us = _person(tmp_path / "Q1.ttl", "Q1", "Q30")
+    mx = _person(tmp_path / "Q2.ttl", "Q2", "Q96")
+
+    assert validate_paths([us], DEFAULT_SHAPES, country_qid="Q30", workers=1, progress=False)["conforms"]
+    assert validate_paths([mx], DEFAULT_SHAPES, country_qid="Q96", workers=1, progress=False)["conforms"]
+    report = validate_paths([mx], DEFAULT_SHAPES, country_qid="Q30", workers=1, progress=False)
+    assert not report["conforms"] and report["by_constraint"]
+
+
+def test_no_country_skips_country_constraint(tmp_path):
+    mx = _person(tmp_path / "Q2.ttl", "Q2", "Q96")
+    report = validate_paths([mx], DEFAULT_SHAPES, workers=1, progress=False)
+    assert report["conforms"]
+    assert any("TargetCountry" in w for w in report["warnings"])
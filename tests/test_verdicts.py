@@ -0,0 +1,40 @@
+# tests/test_verdicts.py
+import sqlite3
+import time
+
+from kg.wd.verdicts import PASS_DIRECT, PASS_P131, VerdictStore
+
+
+def test_ttl_hides_old_verdicts(tmp_path):
+    store = VerdictStore(tmp_path / "v.sqlite", ttl_s=0.2)
+    store.put_many(["Q1", "Q2"], "Q30", True, PASS_DIRECT)
+    assert store.get_many(["Q1", "Q2", "Q3"], "Q30") == {"Q1": (True, 1), "Q2": (True, 1)}
+    time.sleep(0.3)
+    store.put_many(["Q2"], "Q30", False, PASS_P131)
+    assert store.get_many(["Q1", "Q2"], "Q30") == {"Q2": (False, 2)}
+    assert VerdictStore(tmp_path / "v.sqlite").get_many(["Q1"], "Q30") == {"Q1": (True, 1)}
+
+
+def test_old_schema_is_migrated(tmp_path):
+    path = tmp_path / "v.sqlite"
+    c = sqlite3.connect(path)
+    c.execute("CREATE TABLE verdicts (obj TEXT NOT NULL, country TEXT NOT NULL, in_country INTEGER NOT NULL, "
+              "pass INTEGER NOT NULL, updated REAL NOT NULL, PRIMARY KEY (obj, country)) WITHOUT ROWID")
+    c.execute("INSERT INTO verdicts VALUES ('Q1', 'Q30', 1, 1, ?)", (time.time(),))
+    c.commit()
+    c.close()
+    store = VerdictStore(path, ttl_s=3600)
+    assert store.get_many(["Q1"], "Q30") == {"Q1": (True, 1)}
+    store.put_many(["Q2"], "Q30", False, PASS_DIRECT)
+    assert store.get_many(["Q2"], "Q30") == {"Q2": (False, 1)}
+
+
+def test_refresh_clears_country(tmp_path, monkeypatch):
+    from kg.pipeline import run_wd
+    store = VerdictStore(tmp_path / "v.sqlite")
+    store.put_many(["Q1"], "Q30", True, PASS_DIRECT)
+    store.put_many(["Q1"], "Q183", False, PASS_DIRECT)
+    monkeypatch.setattr(run_wd, "get_verdict_store", lambda: store)
+    run_wd.refresh_stores(["Q30"])
+    assert store.get_many(["Q1"], "Q30") == {}
+    assert store.get_many(["Q1"], "Q183") == {"Q1": (False, 1)}
@@ -0,0 +1,84 @@
+# tests/test_writer.py
+import gzip
+import random
+
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+from kg.wd.build import build_degree1_graph
+from kg.wd.writer import StreamWriter, render_ntriples, render_turtle, write_turtle
+
+WD, WDT = "http://www.wikidata.org/entity/", "http://www.wikidata.org/prop/direct/"
+LABEL, XSD = "http://www.w3.org/2000/01/rdf-schema#label", "http://www.w3.org/2001/XMLSchema#string"
+
+EDGES = [("P27", "Q30"), ("P106", "Q82955"), ("P27", "Q9"), ("P31", "Q5")]
+LABELS = {"Q1": 'Ana "la" Pérez', "Q30": "Estados Unidos", "Q5": "humano\tser"}
+
+TURTLE = """@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix wd: <http://www.wikidata.org/entity/> .
+@prefix wdt: <http://www.wikidata.org/prop/direct/> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+
+wd:Q1 rdfs:label "Ana \\"la\\" Pérez"^^xsd:string ;
+    wdt:P27 wd:Q9,
+        wd:Q30 ;
+    wdt:P31 wd:Q5 ;
+    wdt:P106 wd:Q82955 .
+
+wd:Q5 rdfs:label "humano\\tser"^^xsd:string .
+
+wd:Q30 rdfs:label "Estados Unidos"^^xsd:string .
+
+"""
+
+
+def test_turtle_is_byte_identical():
+    assert render_turtle("Q1", EDGES, LABELS) == TURTLE
+    shuffled = EDGES * 2
+    random.Random(7).shuffle(shuffled)
+    assert render_turtle("Q1", shuffled, dict(reversed(list(LABELS.items())))) == TURTLE
+
+
+def test_turtle_matches_rdflib_graph():
+    expected = build_degree1_graph("Q1", EDGES, LABELS)
+    assert isomorphic(Graph().parse(data=render_turtle("Q1", EDGES, LABELS), format="turtle"), expected)
+    assert isomorphic(Graph().parse(data=render_ntriples("Q1", EDGES, LABELS), format="nt"), expected)
+
+
+def test_ntriples_and_nquads_lines():
+    nt = render_ntriples("Q1", EDGES, LABELS).splitlines()
+    assert nt[0] == f'<{WD}Q1> <{LABEL}> "Ana \\"la\\" Pérez"^^<{XSD}> .'
+    assert nt[1:5] == [f"<{WD}Q1> <{WDT}{p}> <{WD}{q}> ." for p, q in
+                       [("P27", "Q9"), ("P27", "Q30"), ("P31", "Q5"), ("P106", "Q82955")]]
+    assert nt[5:] == [f'<{WD}Q5> <{LABEL}> "humano\\tser"^^<{XSD}> .',
+                      f'<{WD}Q30> <{LABEL}> "Estados Unidos"^^<{XSD}> .']
+    nq = render_ntriples("Q1", EDGES, LABELS, graph="urn:hfkg:subject:Q1").splitlines()
+    assert nq == [line[:-2] + " <urn:hfkg:subject:Q1> ." for line in nt]
+
+
+def test_stream_writer_output_is_reproducible(tmp_path):
+    subjects = [("Q1", EDGES), ("Q2", [("P31", "Q5")]), ("Q3", [])]
+    outs = []
+    for name in ("a.nq.gz", "b.nq.gz"):
+        with StreamWriter(tmp_path / name, fmt="nq", compress=True) as w:
+            for root, edges in subjects:
+                w.write(root, edges, LABELS)
+        outs.append((tmp_path / name).read_bytes())
+    assert outs[0] == outs[1]   # gzip sin fecha ni nombre de archivo
+    expected = "".join(render_ntriples(r, e, LABELS, graph=f"urn:hfkg:subject:{r}") for r, e in subjects)
+    assert gzip.decompress(outs[0]).decode("utf-8") == expected
+    assert not list(tmp_path.glob("*.tmp"))
+
+    a = write_turtle(tmp_path / "x" / "Q1.ttl.gz", "Q1", EDGES, LABELS, compress=True).read_bytes()
+    b = write_turtle(tmp_path / "y" / "Q1.ttl.gz", "Q1", list(reversed(EDGES)), LABELS, compress=True).read_bytes()
+    assert a == b and gzip.decompress(a).decode("utf-8") == TURTLE
+
+
+def test_aborted_stream_is_not_published(tmp_path):
+    try:
+        with StreamWriter(tmp_path / "out.nt") as w:
+            w.write("Q1", EDGES)
+            raise RuntimeError("fallo a mitad")
+    except RuntimeError:
+        pass
+    assert list(tmp_path.iterdir()) == []